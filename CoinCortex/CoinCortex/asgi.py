@@ -3,6 +3,11 @@ ASGI config for CoinCortex project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The ASGI application also serves the realtime chat stream
+(``main.views.chat_stream``), e.g.::
+
+    uvicorn CoinCortex.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
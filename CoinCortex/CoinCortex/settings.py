@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +89,47 @@ DATABASES = {
     }
 }
 
+# Кеш: фрагменты страниц (main.fragments), индекс автодополнения, граф друзей.
+# Бэкенд выбирается переменной окружения CACHE_BACKEND:
+#   locmem — память процесса (по умолчанию, только для одного процесса);
+#   file   — каталог CACHE_LOCATION (по умолчанию BASE_DIR / 'cache'), общий для процессов;
+#   redis  — Redis или совместимый сервер (Valkey, KeyDB) по адресу CACHE_LOCATION,
+#            нужен пакет redis.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', '')
+_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_LOCATION or 'coincortex',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+    },
+}
+if CACHE_BACKEND not in _CACHE_BACKENDS:
+    raise ImproperlyConfigured(f'CACHE_BACKEND должен быть одним из: {", ".join(_CACHE_BACKENDS)}')
+CACHES = {'default': _CACHE_BACKENDS[CACHE_BACKEND]}
+
+# Кеши, которые сбрасываются сигналами, в locmem сбрасываются только в
+# текущем процессе: остальные процессы сервера видят старые данные до
+# истечения таймаута. Поэтому с locmem таймауты короткие, а длинные —
+# только с общим бэкендом (file, redis).
+SHARED_CACHE = CACHE_BACKEND != 'locmem'
+
+# Сколько секунд хранится множество друзей пользователя (main.friends)
+FRIEND_IDS_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE else 60
+
+# Сколько секунд хранится отрендеренный фрагмент (main.fragments);
+# 0 — не кешировать фрагменты. С locmem — минута, см. SHARED_CACHE
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24 if SHARED_CACHE else 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -131,6 +176,21 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загрузки хранятся по sha256 содержимого с подсчётом ссылок (main.storage);
+# осиротевшие файлы удаляет manage.py collect_media
+STORAGES = {
+    'default': {'BACKEND': 'main.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Потоков для построения вариантов изображений (main.images);
+# 0 — обрабатывать сразу после коммита в том же процессе
+IMAGE_WORKERS = 2
+
+# Потоков для фонового пересчёта рекомендаций друзей при открытии страницы
+# друзей (main.recommendations.refresh_later); 0 — сразу после коммита
+RECOMMENDATION_WORKERS = 1
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -139,3 +199,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
 LOGIN_URL = 'login'
+
+# Уведомления доставляются через очередь (main.notifications).
+# Очередь разбирает `python manage.py run_notification_worker`;
+# False — создавать уведомления синхронно в обработчике запроса.
+NOTIFICATION_OUTBOX = True
+
+# Брокер событий чата в реальном времени (main.realtime).
+# InProcessBroker работает в пределах одного процесса; для нескольких
+# процессов ASGI-сервера используйте 'main.realtime.DatabaseBroker'.
+REALTIME_BROKER = 'main.realtime.InProcessBroker'
+
+# Бюджеты SQL-запросов по имени URL (main.middleware.QueryBudgetMiddleware).
+# Превышение пишется в лог main.queries; 'raise' — бросать исключение
+# (для тестов и разработки).
+QUERY_BUDGETS = {
+    'index': 15,
+    'chat': 10,
+    'chat_detail': 10,
+    'chat_messages': 8,
+    'autocomplete': 6,
+    # До main.interactions.MAX_OPERATIONS операций по ~10 запросов
+    'interactions': 110,
+    'friends': 12,
+    'notifications': 10,
+    'profile': 12,
+    'user_profile': 12,
+    'communities': 8,
+    'groups_list': 12,
+    'group_detail': 18,
+    'group_subscribers': 10,
+    'my_groups': 10,
+}
+QUERY_BUDGET_ACTION = 'warn'
+# Запросы дольше стольких миллисекунд попадают в лог main.queries
+SLOW_REQUEST_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(name)s %(levelname)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'main.queries': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
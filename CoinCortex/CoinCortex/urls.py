@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from main.views import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('main.urls')),  # ← подключи URLs приложения main
@@ -11,4 +13,4 @@ urlpatterns = [
 
 # Для разработки: обслуживание медиа-файлов
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
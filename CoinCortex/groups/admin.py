@@ -8,6 +8,7 @@ class GroupAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     search_fields = ('name', 'description', 'creator__username')
     readonly_fields = ('created',)
+    list_select_related = ('stats',)
     
     def get_subscribers_count(self, obj):
         return obj.get_subscribers_count()
@@ -0,0 +1,61 @@
+"""
+Роли и подписки пользователя в сообществах.
+
+MembershipResolver загружает строки GroupMember и GroupSubscription
+пользователя сразу для набора групп (два запроса) и привязывается к
+объектам Group, так что Group.is_member/is_editor/can_post/is_subscribed
+для страницы списка не делают отдельных запросов на каждую группу.
+"""
+
+EDITOR_ROLES = ('owner', 'editor')
+POSTER_ROLES = ('owner', 'editor', 'member')
+
+
+class MembershipResolver:
+    """Роли и подписки одного пользователя для набора групп"""
+
+    def __init__(self, user, groups=()):
+        self.user = user
+        self.roles = {}
+        self.subscribed = set()
+        self._loaded = set()
+        self.load(groups)
+
+    def load(self, groups):
+        """Подгрузить данные для групп, которых ещё нет, и привязаться к ним"""
+        from .models import GroupMember, GroupSubscription
+
+        groups = list(groups)
+        missing = {group.pk for group in groups} - self._loaded
+        if missing and self.user.is_authenticated:
+            self.roles.update(
+                GroupMember.objects.filter(user=self.user, group_id__in=missing)
+                .values_list('group_id', 'role')
+            )
+            self.subscribed.update(
+                GroupSubscription.objects.filter(
+                    user=self.user, group_id__in=missing, is_subscribed=True
+                ).values_list('group_id', flat=True)
+            )
+        self._loaded |= missing
+        for group in groups:
+            group._membership = self
+        return self
+
+    def covers(self, group, user):
+        return group.pk in self._loaded and getattr(user, 'pk', None) == self.user.pk
+
+    def role(self, group):
+        return self.roles.get(group.pk)
+
+    def is_member(self, group):
+        return group.pk in self.roles
+
+    def is_editor(self, group):
+        return self.role(group) in EDITOR_ROLES
+
+    def can_post(self, group):
+        return self.role(group) in POSTER_ROLES
+
+    def is_subscribed(self, group):
+        return group.pk in self.subscribed
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+
+def fill_stats(apps, schema_editor):
+    Group = apps.get_model('groups', 'Group')
+    GroupStats = apps.get_model('groups', 'GroupStats')
+    groups = Group.objects.annotate(
+        subscribers=Count('subscriptions', filter=Q(subscriptions__is_subscribed=True), distinct=True),
+        up=Count('ratings', filter=Q(ratings__rating=True), distinct=True),
+        down=Count('ratings', filter=Q(ratings__rating=False), distinct=True),
+    ).values_list('id', 'subscribers', 'up', 'down')
+    GroupStats.objects.bulk_create(
+        [
+            GroupStats(
+                group_id=group_id,
+                subscribers_count=subscribers,
+                rating_up=up,
+                rating_down=down,
+                score=up - down,
+            )
+            for group_id, subscribers, up, down in groups.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0004_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='groups.group', verbose_name='Группа')),
+                ('subscribers_count', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('rating_up', models.IntegerField(default=0, verbose_name='Положительных оценок')),
+                ('rating_down', models.IntegerField(default=0, verbose_name='Отрицательных оценок')),
+                ('score', models.IntegerField(default=0, verbose_name='Рейтинг')),
+            ],
+            options={
+                'verbose_name': 'Статистика группы',
+                'verbose_name_plural': 'Статистика групп',
+                'indexes': [models.Index(fields=['-score'], name='groups_stats_score_idx'), models.Index(fields=['-subscribers_count'], name='groups_stats_subscribers_idx')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
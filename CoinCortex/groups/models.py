@@ -1,6 +1,23 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Count, Case, When, IntegerField
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from main.engagement import EngagementQuerySet
+
+from .membership import MembershipResolver
+
+
+class GroupQuerySet(models.QuerySet):
+    """QuerySet групп с материализованной статистикой"""
+
+    def with_stats(self):
+        """Добавить subscribers_count, total_rating и rating_count из GroupStats"""
+        return self.annotate(
+            subscribers_count=Coalesce(F('stats__subscribers_count'), 0),
+            total_rating=Coalesce(F('stats__score'), 0),
+            rating_count=Coalesce(F('stats__rating_up') + F('stats__rating_down'), 0),
+        )
 
 
 class Group(models.Model):
@@ -24,6 +41,9 @@ class Group(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_groups', verbose_name='Создатель')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     avatar = models.ImageField(upload_to='groups/avatars/', null=True, blank=True, verbose_name='Аватар')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Варианты изображения')
+    
+    objects = GroupQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created']
@@ -33,54 +53,51 @@ class Group(models.Model):
     def __str__(self):
         return self.name
     
+    def _stats(self):
+        try:
+            return self.stats
+        except GroupStats.DoesNotExist:
+            return GroupStats(group=self)
+
     def get_total_rating(self):
         """Получить общий рейтинг группы (положительные - отрицательные)"""
-        # Оптимизированный запрос с использованием агрегации
-        ratings = GroupRating.objects.filter(group=self).aggregate(
-            positive=Count(Case(When(rating=True, then=1), output_field=IntegerField())),
-            negative=Count(Case(When(rating=False, then=1), output_field=IntegerField()))
-        )
-        return (ratings.get('positive', 0) or 0) - (ratings.get('negative', 0) or 0)
+        return self._stats().score
     
     def get_rating_count(self):
         """Получить количество оценок"""
-        return GroupRating.objects.filter(group=self).count()
+        stats = self._stats()
+        return stats.rating_up + stats.rating_down
     
     def get_subscribers_count(self):
         """Получить количество подписчиков"""
-        return GroupSubscription.objects.filter(group=self, is_subscribed=True).count()
-    
+        return self._stats().subscribers_count
+    
+    def _membership_for(self, user):
+        """Роли и подписки пользователя (один раз на объект, если не загружены списком)"""
+        resolver = getattr(self, '_membership', None)
+        if resolver is None or not resolver.covers(self, user):
+            resolver = MembershipResolver(user, [self])
+        return resolver
+
     def is_owner(self, user):
         """Проверить, является ли пользователь владельцем группы"""
-        return self.creator == user
+        return self.creator_id == getattr(user, 'pk', None)
     
     def is_editor(self, user):
         """Проверить, является ли пользователь редактором группы"""
-        return GroupMember.objects.filter(
-            group=self,
-            user=user,
-            role__in=['owner', 'editor']
-        ).exists()
+        return self._membership_for(user).is_editor(self)
     
     def can_post(self, user):
         """Проверить, может ли пользователь публиковать посты"""
-        return self.is_editor(user) or GroupMember.objects.filter(
-            group=self,
-            user=user,
-            role='member'
-        ).exists()
+        return self._membership_for(user).can_post(self)
     
     def is_member(self, user):
         """Проверить, является ли пользователь членом группы"""
-        return GroupMember.objects.filter(group=self, user=user).exists()
+        return self._membership_for(user).is_member(self)
     
     def is_subscribed(self, user):
         """Проверить, подписан ли пользователь на группу"""
-        return GroupSubscription.objects.filter(
-            group=self,
-            user=user,
-            is_subscribed=True
-        ).exists()
+        return self._membership_for(user).is_subscribed(self)
 
 
 class GroupMember(models.Model):
@@ -117,15 +134,20 @@ class GroupPost(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='group_posts', verbose_name='Автор')
     content = models.TextField(verbose_name='Содержание')
     image = models.ImageField(upload_to='groups/posts/images/', null=True, blank=True, verbose_name='Изображение')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Варианты изображения')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    likes_count = models.IntegerField(default=0, editable=False, verbose_name='Лайков')
+    comments_count = models.IntegerField(default=0, editable=False, verbose_name='Комментариев')
+
+    objects = EngagementQuerySet.as_manager()
     
     def get_likes_count(self):
         """Получить количество лайков"""
-        return GroupPostLike.objects.filter(post=self).count()
+        return self.likes_count
     
     def get_comments_count(self):
         """Получить количество комментариев"""
-        return GroupPostComment.objects.filter(post=self).count()
+        return self.comments_count
     
     def get_total_engagement(self):
         """Получить общую активность (лайки + комментарии)"""
@@ -161,6 +183,13 @@ class GroupRating(models.Model):
         unique_together = ('group', 'user')
         verbose_name = 'Рейтинг группы'
         verbose_name_plural = 'Рейтинги групп'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значение из базы — чтобы при сохранении изменить GroupStats на разницу
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
     
     def __str__(self):
         rating_text = "👍" if self.rating else "👎"
@@ -178,6 +207,13 @@ class GroupSubscription(models.Model):
         unique_together = ('group', 'user')
         verbose_name = 'Подписка на группу'
         verbose_name_plural = 'Подписки на группы'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значение из базы — чтобы при сохранении изменить GroupStats на разницу
+        instance._loaded_is_subscribed = instance.__dict__.get('is_subscribed')
+        return instance
     
     def __str__(self):
         status = "подписан" if self.is_subscribed else "не подписан"
@@ -205,6 +241,9 @@ class GroupPostComment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='group_post_comments', verbose_name='Автор')
     content = models.TextField(verbose_name='Содержание')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    likes_count = models.IntegerField(default=0, editable=False, verbose_name='Лайков')
+
+    objects = EngagementQuerySet.as_manager()
     
     class Meta:
         ordering = ['created']
@@ -220,7 +259,7 @@ class GroupPostComment(models.Model):
     
     def get_likes_count(self):
         """Получить количество лайков"""
-        return GroupPostCommentLike.objects.filter(comment=self).count()
+        return self.likes_count
     
     def is_liked_by(self, user):
         """Проверить, лайкнул ли пользователь комментарий"""
@@ -241,4 +280,23 @@ class GroupPostCommentLike(models.Model):
         verbose_name_plural = 'Лайки комментариев групп'
     
     def __str__(self):
-        return f"{self.user.username} лайкнул комментарий группы {self.comment.id}"
\ No newline at end of file
+        return f"{self.user.username} лайкнул комментарий группы {self.comment.id}"
+
+class GroupStats(models.Model):
+    """Материализованная статистика группы (поддерживается сигналами, см. groups.stats)"""
+    group = models.OneToOneField(Group, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name='Группа')
+    subscribers_count = models.IntegerField(default=0, verbose_name='Подписчиков')
+    rating_up = models.IntegerField(default=0, verbose_name='Положительных оценок')
+    rating_down = models.IntegerField(default=0, verbose_name='Отрицательных оценок')
+    score = models.IntegerField(default=0, verbose_name='Рейтинг')
+
+    class Meta:
+        verbose_name = 'Статистика группы'
+        verbose_name_plural = 'Статистика групп'
+        indexes = [
+            models.Index(fields=['-score'], name='groups_stats_score_idx'),
+            models.Index(fields=['-subscribers_count'], name='groups_stats_subscribers_idx'),
+        ]
+
+    def __str__(self):
+        return f'Статистика {self.group_id}'
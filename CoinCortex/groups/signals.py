@@ -0,0 +1,48 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import stats
+from .models import Group, GroupRating, GroupStats, GroupSubscription
+
+
+# --- Материализованная статистика групп ---
+
+@receiver(post_save, sender=Group)
+def create_group_stats(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=GroupSubscription)
+def count_subscription(sender, instance, created, **kwargs):
+    before = False if created else getattr(instance, '_loaded_is_subscribed', None)
+    if before is not None and before != instance.is_subscribed:
+        stats.bump(instance.group_id, subscribers=1 if instance.is_subscribed else -1)
+    instance._loaded_is_subscribed = instance.is_subscribed
+
+
+@receiver(post_delete, sender=GroupSubscription)
+def uncount_subscription(sender, instance, **kwargs):
+    if instance.is_subscribed:
+        stats.bump(instance.group_id, subscribers=-1)
+
+
+@receiver(post_save, sender=GroupRating)
+def count_rating(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, '_loaded_rating', None)
+    if created:
+        up, down = stats.rating_delta(instance.rating)
+    elif before is not None and before != instance.rating:
+        old_up, old_down = stats.rating_delta(before, -1)
+        new_up, new_down = stats.rating_delta(instance.rating)
+        up, down = old_up + new_up, old_down + new_down
+    else:
+        up = down = 0
+    stats.bump(instance.group_id, up=up, down=down)
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=GroupRating)
+def uncount_rating(sender, instance, **kwargs):
+    up, down = stats.rating_delta(instance.rating, -1)
+    stats.bump(instance.group_id, up=up, down=down)
@@ -0,0 +1,81 @@
+"""
+Материализованная статистика групп (GroupStats).
+
+Подписчики и оценки группы хранятся в одной строке GroupStats и
+изменяются атомарным ``UPDATE ... SET x = x ± 1`` при сохранении и
+удалении GroupSubscription/GroupRating, поэтому сортировка по рейтингу и
+список популярных групп читают индекс по score/subscribers_count, а не
+агрегируют подписки и оценки. ``reconcile_counters`` пересчитывает
+статистику и исправляет расхождения.
+"""
+from django.db.models import Count, F, Q
+
+from main import fragments
+
+from .models import Group, GroupRating, GroupStats, GroupSubscription
+
+
+def bump(group_id, subscribers=0, up=0, down=0):
+    """Атомарно изменить статистику группы"""
+    changes = {}
+    if subscribers:
+        changes['subscribers_count'] = F('subscribers_count') + subscribers
+    if up:
+        changes['rating_up'] = F('rating_up') + up
+    if down:
+        changes['rating_down'] = F('rating_down') + down
+    if up or down:
+        changes['score'] = F('score') + (up - down)
+    if changes:
+        GroupStats.objects.filter(group_id=group_id).update(**changes)
+
+
+def rating_delta(rating, sign=1):
+    """Изменение (up, down) для одной оценки"""
+    return (sign, 0) if rating else (0, sign)
+
+
+def reconcile(start, stop):
+    """
+    Пересчитать статистику групп с id в [start, stop).
+    Возвращает количество исправленных строк.
+    """
+    subscribers = dict(
+        GroupSubscription.objects.filter(group_id__gte=start, group_id__lt=stop, is_subscribed=True)
+        .order_by()
+        .values_list('group_id')
+        .annotate(total=Count('pk'))
+    )
+    ratings = {
+        group_id: (up, down)
+        for group_id, up, down in GroupRating.objects.filter(group_id__gte=start, group_id__lt=stop)
+        .order_by()
+        .values_list('group_id')
+        .annotate(up=Count('pk', filter=Q(rating=True)), down=Count('pk', filter=Q(rating=False)))
+    }
+    existing = GroupStats.objects.filter(group_id__gte=start, group_id__lt=stop).in_bulk()
+
+    stale, missing = [], []
+    for group_id in Group.objects.filter(id__gte=start, id__lt=stop).values_list('id', flat=True):
+        up, down = ratings.get(group_id, (0, 0))
+        expected = GroupStats(
+            group_id=group_id,
+            subscribers_count=subscribers.get(group_id, 0),
+            rating_up=up,
+            rating_down=down,
+            score=up - down,
+        )
+        current = existing.get(group_id)
+        if current is None:
+            missing.append(expected)
+        elif (current.subscribers_count, current.rating_up, current.rating_down, current.score) != (
+            expected.subscribers_count, expected.rating_up, expected.rating_down, expected.score
+        ):
+            stale.append(expected)
+    if missing:
+        GroupStats.objects.bulk_create(missing, ignore_conflicts=True)
+    if stale:
+        GroupStats.objects.bulk_update(stale, ['subscribers_count', 'rating_up', 'rating_down', 'score'])
+    # Счётчики выводятся в кешированной шапке группы
+    fragments.bump([('group', stats.group_id) for stats in stale + missing])
+    return len(stale) + len(missing)
@@ -1,3 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from main import benchmarks
+
+GROUP_VIEWS = ['groups_list', 'group_detail']
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class GroupViewBenchmarkTests(TestCase):
+    """Страницы групп на синтетических данных: N+1 и бюджеты запросов"""
+
+    def test_hot_views(self):
+        # Время зависит от машины — здесь проверяются только запросы
+        results = benchmarks.run(views=GROUP_VIEWS, repeat=1)
+        problems = benchmarks.regressions(results, benchmarks.load_baseline(), threshold=None)
+        self.assertEqual(problems, [], '\n' + benchmarks.format_table(results))
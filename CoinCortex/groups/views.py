@@ -1,10 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count, F
 from django.core.paginator import Paginator
-from .models import Group, GroupPost, GroupMember, GroupRating, GroupSubscription, GroupPostLike, GroupPostComment, GroupPostCommentLike
-from main.models import Notification
+from .models import Group, GroupPost, GroupMember, GroupRating, GroupSubscription
+from main import interactions, search
+from main.engagement import post_item
+from .membership import MembershipResolver
 from django.contrib.auth.models import User
 
 
@@ -15,40 +16,37 @@ def groups_list(request):
     theme_filter = request.GET.get('theme', '')
     sort_by = request.GET.get('sort', 'created')  # created, rating
     
-    groups = Group.objects.annotate(
-        subscribers_count=Count('subscriptions', filter=Q(subscriptions__is_subscribed=True)),
-        rating_positive=Count('ratings', filter=Q(ratings__rating=True)),
-        rating_negative=Count('ratings', filter=Q(ratings__rating=False)),
-        total_rating=F('rating_positive') - F('rating_negative')
-    )
+    # Счётчики берутся из материализованной статистики (GroupStats)
+    groups = Group.objects.with_stats()
     
     # Фильтрация по тематике
     if theme_filter:
         groups = groups.filter(theme=theme_filter)
     
-    # Поиск
-    if search_query:
-        groups = groups.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
-    
     # Сортировка
     if sort_by == 'rating':
-        groups = groups.order_by('-total_rating', '-created')
+        groups = groups.order_by('-stats__score', '-created')
     else:
         groups = groups.order_by('-created')
     
-    # Добавляем информацию о подписке для каждой группы
-    for group in groups:
-        group.user_is_subscribed = group.is_subscribed(request.user)
-        group.user_is_member = group.is_member(request.user)
-        group.user_can_post = group.can_post(request.user)
+    # Поиск (без сортировки по рейтингу — по релевантности)
+    if search_query:
+        found = search.filter(groups, search_query)
+        groups = found.order_by('-stats__score', '-created') if sort_by == 'rating' else found
     
     paginator = Paginator(groups, 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # Подписки и роли — только для групп текущей страницы
+    page_groups = list(page_obj.object_list)
+    membership = MembershipResolver(request.user, page_groups)
+    for group in page_groups:
+        group.user_is_subscribed = membership.is_subscribed(group)
+        group.user_is_member = membership.is_member(group)
+        group.user_can_post = membership.can_post(group)
+    page_obj.object_list = page_groups
+    
     return render(request, 'groups/groups_list.html', {
         'groups': page_obj,
         'search_query': search_query,
@@ -114,7 +112,7 @@ def group_create(request):
 @login_required
 def group_detail(request, group_id):
     """Детальная страница группы"""
-    group = get_object_or_404(Group, id=group_id)
+    group = get_object_or_404(Group.objects.select_related('stats'), id=group_id)
     
     # Обработка POST запросов
     if request.method == 'POST':
@@ -150,76 +148,8 @@ def group_detail(request, group_id):
                     post.save()
             return redirect('group_detail', group_id=group.id)
         
-        # Лайк поста группы
-        elif 'like_group_post' in request.POST:
-            post_id = request.POST.get('like_group_post')
-            try:
-                post = GroupPost.objects.get(id=post_id, group=group)
-                like, created = GroupPostLike.objects.get_or_create(post=post, user=request.user)
-                if not created:
-                    like.delete()
-                else:
-                    # Уведомление
-                    if post.author != request.user:
-                        Notification.objects.create(
-                            user=post.author,
-                            notification_type='group_like',
-                            from_user=request.user,
-                            group_post=post
-                        )
-            except GroupPost.DoesNotExist:
-                messages.error(request, 'Пост не найден')
-            referer = request.META.get('HTTP_REFERER', 'group_detail')
-            if 'group_detail' in referer:
-                return redirect('group_detail', group_id=group.id)
-            return redirect(referer)
-        
-        # Комментарий к посту группы
-        elif 'comment_group_post' in request.POST:
-            post_id = request.POST.get('comment_group_post')
-            comment_text = request.POST.get('comment_text', '').strip()
-            if comment_text:
-                try:
-                    post = GroupPost.objects.get(id=post_id, group=group)
-                    comment = GroupPostComment.objects.create(
-                        post=post,
-                        author=request.user,
-                        content=comment_text
-                    )
-                    # Уведомление
-                    if post.author != request.user:
-                        Notification.objects.create(
-                            user=post.author,
-                            notification_type='group_comment',
-                            from_user=request.user,
-                            group_post=post
-                        )
-                except GroupPost.DoesNotExist:
-                    messages.error(request, 'Пост не найден')
-            referer = request.META.get('HTTP_REFERER', 'group_detail')
-            if 'group_detail' in referer:
-                return redirect('group_detail', group_id=group.id)
-            return redirect(referer)
-        
-        # Лайк комментария группы
-        elif 'like_group_comment' in request.POST:
-            comment_id = request.POST.get('like_group_comment')
-            try:
-                comment = GroupPostComment.objects.get(id=comment_id, post__group=group)
-                like, created = GroupPostCommentLike.objects.get_or_create(comment=comment, user=request.user)
-                if not created:
-                    like.delete()
-                else:
-                    # Уведомление
-                    if comment.author != request.user:
-                        Notification.objects.create(
-                            user=comment.author,
-                            notification_type='group_comment_like',
-                            from_user=request.user,
-                            group_comment=comment
-                        )
-            except GroupPostComment.DoesNotExist:
-                messages.error(request, 'Комментарий не найден')
+        # Лайки и комментарии
+        elif interactions.handle_form(request, group=group):
             referer = request.META.get('HTTP_REFERER', 'group_detail')
             if 'group_detail' in referer:
                 return redirect('group_detail', group_id=group.id)
@@ -299,7 +229,12 @@ def group_detail(request, group_id):
                 return redirect('my_groups')
     
     # Получаем посты группы
-    posts = GroupPost.objects.filter(group=group).select_related('author', 'group').order_by('-created')
+    posts = (
+        GroupPost.objects.filter(group=group)
+        .select_related('author', 'group')
+        .order_by('-created')
+        .with_engagement(request.user, comments=10)
+    )
     
     # Информация о группе
     group.total_rating = group.get_total_rating()
@@ -333,29 +268,11 @@ def group_detail(request, group_id):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Добавляем информацию о правах удаления, лайках и комментариях для каждого поста
-    posts_with_permissions = []
-    for post in page_obj:
-        comments = post.comments.select_related('author').all()
-        # Добавляем информацию о лайках для каждого комментария
-        comments_with_likes = []
-        for comment in comments[:10]:
-            comments_with_likes.append({
-                'comment': comment,
-                'is_liked': comment.is_liked_by(request.user),
-                'likes_count': comment.get_likes_count(),
-            })
-        # Самый популярный комментарий (первый по дате)
-        top_comment = comments.first() if comments.exists() else None
-        posts_with_permissions.append({
-            'post': post,
-            'can_delete': post.can_delete(request.user),
-            'is_liked': post.is_liked_by(request.user),
-            'likes_count': post.get_likes_count(),
-            'comments_count': post.get_comments_count(),
-            'comments': comments_with_likes,
-            'top_comment': top_comment
-        })
+    # Добавляем информацию о правах удаления (лайки и комментарии уже загружены)
+    posts_with_permissions = [
+        post_item(post, can_delete=post.author_id == request.user.id or group.user_is_editor)
+        for post in page_obj
+    ]
     
     return render(request, 'groups/group_detail.html', {
         'group': group,
@@ -371,25 +288,19 @@ def group_detail(request, group_id):
 def my_groups(request):
     """Сообщества пользователя (созданные, редактируемые, подписанные)"""
     # Сообщества, созданные пользователем
-    created_groups = Group.objects.filter(creator=request.user).annotate(
-        subscribers_count=Count('subscriptions', filter=Q(subscriptions__is_subscribed=True))
-    ).order_by('-created')
+    created_groups = Group.objects.filter(creator=request.user).with_stats().order_by('-created')
     
     # Сообщества, где пользователь является редактором
     edited_groups = Group.objects.filter(
         members__user=request.user,
         members__role__in=['owner', 'editor']
-    ).exclude(creator=request.user).annotate(
-        subscribers_count=Count('subscriptions', filter=Q(subscriptions__is_subscribed=True))
-    ).distinct().order_by('-created')
+    ).exclude(creator=request.user).with_stats().distinct().order_by('-created')
     
     # Сообщества, на которые подписан пользователь
     subscribed_groups = Group.objects.filter(
         subscriptions__user=request.user,
         subscriptions__is_subscribed=True
-    ).annotate(
-        subscribers_count=Count('subscriptions', filter=Q(subscriptions__is_subscribed=True))
-    ).distinct().order_by('-created')
+    ).with_stats().distinct().order_by('-created')
     
     return render(request, 'groups/my_groups.html', {
         'created_groups': created_groups,
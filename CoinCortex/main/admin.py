@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Post, PostLike, PostComment, Profile, Friendship,
-    Chat, Message, Notification, Community
+    Chat, ChatParticipant, Message, Notification, Community
 )
 
 
@@ -36,21 +36,27 @@ class FriendshipAdmin(admin.ModelAdmin):
     list_filter = ('accepted', 'created')
 
 
+class ChatParticipantInline(admin.TabularInline):
+    model = ChatParticipant
+    extra = 0
+    raw_id_fields = ('user',)
+
+
 @admin.register(Chat)
 class ChatAdmin(admin.ModelAdmin):
     list_display = ('id', 'created', 'updated')
-    filter_horizontal = ('participants',)
+    inlines = [ChatParticipantInline]
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('chat', 'sender', 'created', 'read')
-    list_filter = ('read', 'created')
+    list_display = ('chat', 'sender', 'created')
+    list_filter = ('created',)
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'notification_type', 'from_user', 'created', 'read')
+    list_display = ('user', 'notification_type', 'from_user', 'actors_count', 'updated', 'read')
     list_filter = ('notification_type', 'read', 'created')
     search_fields = ('user__username', 'from_user__username')
 
@@ -0,0 +1,147 @@
+"""
+Автодополнение ников, имён пользователей и названий групп.
+
+Все ключи (ник, имя, фамилия, "имя фамилия", слова названия группы)
+лежат в памяти процесса в одном отсортированном списке, поэтому поиск
+по префиксу — это bisect и короткий проход вперёд без обращения к базе.
+Сигналы (main.signals) только увеличивают номер версии в кеше Django и
+только при изменении полей из INDEXED_FIELDS (вход пользователя, который
+сохраняет last_login, индекс не трогает). Индекс перечитывается лениво
+при следующем запросе, но не чаще
+REBUILD_INTERVAL, так что серия регистраций не пересобирает его на
+каждом нажатии клавиши.
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+# Сколько подсказок возвращает один запрос
+RESULT_LIMIT = 8
+
+# Не пересобирать индекс чаще, чем раз в столько секунд
+REBUILD_INTERVAL = 5
+
+VERSION_KEY = 'autocomplete:version'
+
+# Модель -> поля, от которых зависит индекс
+INDEXED_FIELDS = {
+    'auth.User': ('username', 'is_active'),
+    'main.Profile': ('first_name', 'last_name'),
+    'groups.Group': ('name',),
+}
+
+Entry = namedtuple('Entry', ['type', 'id', 'label', 'detail'])
+
+
+def normalize(text):
+    """Ключ для сравнения: без регистра, "ё" как "е" """
+    return text.casefold().replace('ё', 'е').strip()
+
+
+class PrefixIndex:
+    """Отсортированные ключи и параллельный список записей"""
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.entries = [entry for _, entry in pairs]
+
+    def lookup(self, prefix, types=None, limit=RESULT_LIMIT, allowed=None):
+        """
+        Записи, у которых есть ключ с префиксом prefix.
+        allowed — необязательная функция Entry -> bool.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        position = bisect.bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            entry = self.entries[position]
+            position += 1
+            key = (entry.type, entry.id)
+            if key in seen or (types and entry.type not in types):
+                continue
+            if allowed is not None and not allowed(entry):
+                continue
+            seen.add(key)
+            results.append(entry)
+            if len(results) >= limit:
+                break
+        return results
+
+
+def _user_pairs():
+    from django.contrib.auth.models import User
+
+    rows = User.objects.filter(is_active=True).values_list(
+        'id', 'username', 'profile__first_name', 'profile__last_name'
+    )
+    for user_id, username, first_name, last_name in rows.iterator():
+        full_name = f"{first_name or ''} {last_name or ''}".strip()
+        entry = Entry('user', user_id, username, full_name)
+        keys = {username, first_name, last_name, full_name, f"{last_name or ''} {first_name or ''}"}
+        for key in keys:
+            if key and key.strip():
+                yield normalize(key), entry
+
+
+def _group_pairs():
+    from groups.models import Group
+
+    for group_id, name in Group.objects.values_list('id', 'name').iterator():
+        entry = Entry('group', group_id, name, '')
+        words = name.split()
+        # Полное название и каждое следующее слово ("клуб любителей кофе" → "кофе")
+        for start in range(len(words)):
+            yield normalize(' '.join(words[start:])), entry
+
+
+_lock = threading.Lock()
+_state = {'index': None, 'version': None, 'built_at': 0.0}
+
+
+def invalidate():
+    """Отметить индекс устаревшим во всех процессах"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def get_index():
+    """Индекс текущей версии (перестраивается лениво)"""
+    version = cache.get(VERSION_KEY, 0)
+    now = time.monotonic()
+    index = _state['index']
+    if index is not None and (
+        _state['version'] == version or now - _state['built_at'] < REBUILD_INTERVAL
+    ):
+        return index
+    with _lock:
+        if _state['index'] is index:
+            _state['index'] = PrefixIndex([*_user_pairs(), *_group_pairs()])
+            _state['version'] = version
+            _state['built_at'] = now
+        return _state['index']
+
+
+def lookup(prefix, types=None, limit=RESULT_LIMIT, allowed=None):
+    return get_index().lookup(prefix, types=types, limit=limit, allowed=allowed)
+
+
+def find_user_id(username):
+    """id пользователя по нику: точное совпадение без учёта регистра, иначе первый по префиксу"""
+    wanted = normalize(username)
+    matches = lookup(
+        username,
+        types={'user'},
+        allowed=lambda entry: normalize(entry.label).startswith(wanted),
+    )
+    for entry in matches:
+        if normalize(entry.label) == wanted:
+            return entry.id
+    return matches[0].id if matches else None
@@ -0,0 +1,228 @@
+"""
+Бенчмарк горячих страниц через тестовый клиент Django.
+
+Для каждого размера данных ``run()`` генерирует данные командой
+seed_load_data внутри точки сохранения, выбирает самого активного
+зрителя и его окружение, прогревает кеши одним запросом и
+затем REPEAT раз открывает каждую страницу из VIEWS, записывая время и
+число SQL-запросов. После замеров точка сохранения откатывается, так что
+база остаётся прежней.
+
+``regressions()`` сравнивает результаты между размерами и с сохранённым
+базовым уровнем (JSON, см. BASELINE_PATH):
+
+* число повторяющихся запросов (одна и та же форма SQL, см.
+  main.middleware.sql_shape) не должно расти вместе с объёмом данных —
+  иначе это N+1. Общее число запросов между размерами не сравнивается:
+  на малых данных часть ветвей (заявки, комментарии) может не выполняться;
+* число запросов не должно превышать базовое — данные детерминированы,
+  поэтому на том же размере оно должно совпадать точно;
+* p95 не должен превышать базовый больше чем на LATENCY_THRESHOLD
+  (с запасом LATENCY_SLACK_MS против шума на быстрых страницах).
+  Время зависит от машины, поэтому тесты main/groups передают
+  threshold=None и проверяют только запросы; время сравнивает команда
+  ``manage.py benchmark_views``.
+"""
+import io
+import json
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .middleware import sql_shape
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# Размеры (число пользователей) для тестов; команда принимает свои
+SIZES = (60, 240)
+# Замеров на страницу после прогрева
+REPEAT = 10
+# Допустимый рост p95 относительно базового уровня (1.0 = вдвое)
+LATENCY_THRESHOLD = 1.0
+LATENCY_SLACK_MS = 20.0
+
+# Прогон очищает кеш и наполняет его синтетическими данными, поэтому
+# работает со своим кешем в памяти, а не с общим (CACHE_BACKEND=file/redis)
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmarks',
+    },
+}
+
+# Страница -> функция (контекст) -> kwargs для reverse()
+VIEWS = {
+    'index': lambda ctx: {},
+    'profile': lambda ctx: {},
+    'user_profile': lambda ctx: {'username': ctx.friend.username},
+    'chat': lambda ctx: {},
+    'chat_detail': lambda ctx: {'chat_id': ctx.chat_id},
+    'friends': lambda ctx: {},
+    'notifications': lambda ctx: {},
+    'groups_list': lambda ctx: {},
+    'group_detail': lambda ctx: {'group_id': ctx.group_id},
+}
+
+
+@dataclass
+class Context:
+    viewer: User
+    friend: User
+    chat_id: int
+    group_id: int
+
+
+def pick_context():
+    """Самый активный пользователь, его самый активный друг, чат и группа"""
+    from groups.models import Group
+    from main.models import ChatParticipant, Friendship
+
+    # Зритель с самыми "полными" страницами: иначе на малых данных часть
+    # запросов (комментарии, авторы уведомлений) просто не выполняется
+    viewer = User.objects.annotate(
+        notifications_total=Count('notifications', distinct=True),
+        wall_total=Count('wall_posts', distinct=True),
+    ).order_by('-notifications_total', '-wall_total', 'pk').first()
+    friendships = Friendship.objects.filter(accepted=True).filter(
+        Q(from_user=viewer) | Q(to_user=viewer)
+    ).values_list('from_user_id', 'to_user_id')
+    friend_ids = {a if b == viewer.pk else b for a, b in friendships}
+    friend = User.objects.filter(pk__in=friend_ids).annotate(
+        posts_total=Count('wall_posts')
+    ).order_by('-posts_total', 'pk').first()
+    chat_id = ChatParticipant.objects.filter(user=viewer).annotate(
+        messages_total=Count('chat__messages')
+    ).order_by('-messages_total', 'chat_id').values_list('chat_id', flat=True).first()
+    group_id = Group.objects.order_by('-stats__subscribers_count', 'pk').values_list('pk', flat=True).first()
+    return Context(viewer=viewer, friend=friend or viewer, chat_id=chat_id, group_id=group_id)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def repeated_queries(captured):
+    """Сколько запросов повторяют уже выполненную форму SQL (точки сохранения не в счёт)"""
+    shapes = [
+        sql_shape(query['sql']) for query in captured
+        if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))
+    ]
+    return len(shapes) - len(set(shapes))
+
+
+def measure(client, url, repeat=REPEAT):
+    """Прогрев и repeat замеров одной страницы"""
+    response = client.get(url)
+    if response.status_code != 200:
+        raise AssertionError(f'{url}: HTTP {response.status_code}')
+    timings, queries, repeated = [], [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+        repeated.append(repeated_queries(captured.captured_queries))
+    return {
+        'queries': max(queries),
+        'repeated': max(repeated),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+
+
+def run_size(users, views=None, repeat=REPEAT, seed=1):
+    """Замеры страниц на свежих данных из users пользователей"""
+    views = views or list(VIEWS)
+    results = {}
+    with transaction.atomic():
+        savepoint = transaction.savepoint()
+        try:
+            # id после отката используются заново — кешированные данные были бы чужими
+            cache.clear()
+            call_command('seed_load_data', users=users, seed=seed, stdout=io.StringIO())
+            ctx = pick_context()
+            client = Client()
+            client.force_login(ctx.viewer)
+            for name in views:
+                url = reverse(name, kwargs=VIEWS[name](ctx))
+                results[name] = measure(client, url, repeat)
+        finally:
+            transaction.savepoint_rollback(savepoint)
+            cache.clear()
+    return results
+
+
+def run(sizes=SIZES, views=None, repeat=REPEAT):
+    """{размер: {страница: {queries, repeated, p50_ms, p95_ms}}}; ключи — строки, как в JSON"""
+    with override_settings(CACHES=BENCHMARK_CACHES):
+        return {str(size): run_size(size, views, repeat) for size in sizes}
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True, ensure_ascii=False) + '\n', encoding='utf-8')
+
+
+def regressions(results, baseline=None, threshold=LATENCY_THRESHOLD, slack_ms=LATENCY_SLACK_MS):
+    """Список описаний регрессий (пустой — всё в порядке); threshold=None — без проверки времени"""
+    problems = []
+    sizes = sorted(results, key=int)
+    smallest = results[sizes[0]]
+    for size in sizes[1:]:
+        for name, stats in results[size].items():
+            if name in smallest and stats['repeated'] > smallest[name]['repeated']:
+                problems.append(
+                    f'{name}: {stats["repeated"]} повторных запросов на {size} пользователях '
+                    f'против {smallest[name]["repeated"]} на {sizes[0]} — число запросов растёт с данными'
+                )
+    for size, views in results.items():
+        for name, stats in views.items():
+            base = (baseline or {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            if stats['queries'] > base['queries']:
+                problems.append(
+                    f'{name}@{size}: {stats["queries"]} запросов, базовый уровень {base["queries"]}'
+                )
+            if threshold is None:
+                continue
+            limit = base['p95_ms'] * (1 + threshold) + slack_ms
+            if stats['p95_ms'] > limit:
+                problems.append(
+                    f'{name}@{size}: p95 {stats["p95_ms"]} мс, допустимо до {limit:.1f} мс '
+                    f'(базовый уровень {base["p95_ms"]} мс)'
+                )
+    return problems
+
+
+def format_table(results):
+    lines = [f'{"страница":<16}{"размер":>8}{"запросов":>10}{"повторов":>10}{"p50, мс":>10}{"p95, мс":>10}']
+    for size in sorted(results, key=int):
+        for name, stats in results[size].items():
+            lines.append(
+                f'{name:<16}{size:>8}{stats["queries"]:>10}{stats["repeated"]:>10}'
+                f'{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}'
+            )
+    return '\n'.join(lines)
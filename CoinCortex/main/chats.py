@@ -0,0 +1,139 @@
+"""
+Выборки для чатов.
+
+Список чатов строится фиксированным числом запросов независимо от
+количества чатов и длины переписки: последнее сообщение находится
+подзапросом по индексу chat_id, а собеседник подгружается prefetch-ем
+участников.
+
+Прочитанность хранится не в сообщениях, а отметкой last_read_id у
+участника (ChatParticipant): всё, что не новее отметки, прочитано.
+Открытие чата — запись одной строки, а непрочитанные — подсчёт
+диапазона ``id > last_read_id`` по индексу chat_id.
+
+История переписки читается keyset-пагинацией по id сообщения: страница
+чата показывает последние CHAT_PAGE_SIZE сообщений, более ранние
+подгружаются по ``before=<id>``, новые — по ``after=<id>``.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import realtime
+
+CHAT_PAGE_SIZE = 50
+
+# Максимум новых сообщений за один запрос after=<id>
+CHAT_AFTER_LIMIT = 200
+
+
+class ChatQuerySet(models.QuerySet):
+    """QuerySet чатов с данными для списка диалогов"""
+
+    def for_inbox(self, user):
+        """
+        Чаты пользователя с last_message_id, unread_count и
+        other_participants (собеседники с профилями).
+        """
+        from .models import Message
+
+        last_message = (
+            Message.objects.filter(chat=OuterRef('pk'))
+            .order_by('-id')
+            .values('id')[:1]
+        )
+        unread = (
+            Message.objects.filter(chat=OuterRef('pk'), id__gt=OuterRef('last_read_id'))
+            .exclude(sender=user)
+            .order_by()
+            .values('chat')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        others = User.objects.exclude(id=user.id).select_related('profile')
+        return (
+            self.filter(memberships__user=user)
+            .annotate(last_read_id=F('memberships__last_read_id'))
+            .annotate(
+                last_message_id=Subquery(last_message),
+                unread_count=Coalesce(Subquery(unread), Value(0)),
+            )
+            .prefetch_related(
+                Prefetch('participants', queryset=others, to_attr='other_participants')
+            )
+        )
+
+
+def inbox_items(user):
+    """Список словарей {chat, other_user, unread_count, last_message} для chat.html"""
+    from .models import Chat, Message
+
+    chats = list(Chat.objects.for_inbox(user).order_by('-updated'))
+    last_messages = Message.objects.in_bulk(
+        [chat.last_message_id for chat in chats if chat.last_message_id]
+    )
+    return [
+        {
+            'chat': chat,
+            'other_user': chat.other_participants[0] if chat.other_participants else None,
+            'unread_count': chat.unread_count,
+            'last_message': last_messages.get(chat.last_message_id),
+        }
+        for chat in chats
+    ]
+
+
+def history_page(chat, before=None, limit=CHAT_PAGE_SIZE):
+    """
+    Последние limit сообщений чата (старше before, если указан) в
+    хронологическом порядке и признак того, что есть более ранние.
+    """
+    qs = chat.messages.order_by('-id')
+    if before:
+        qs = qs.filter(id__lt=before)
+    rows = list(qs[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def messages_after(chat, after, limit=CHAT_AFTER_LIMIT):
+    """Сообщения чата новее after в хронологическом порядке"""
+    return list(chat.messages.filter(id__gt=after).order_by('id')[:limit])
+
+
+def mark_read(chat, user, message_id):
+    """Сдвинуть отметку прочтения пользователя до message_id (только вперёд)"""
+    from .models import ChatParticipant
+
+    if not message_id:
+        return 0
+    updated = ChatParticipant.objects.filter(
+        chat=chat, user=user, last_read_id__lt=message_id
+    ).update(last_read_id=message_id)
+    if updated:
+        realtime.publish_read(chat.id, user.id, message_id)
+    return updated
+
+
+def read_up_to(chat, user):
+    """До какого сообщения собеседник прочитал чат (для отметок ✓✓)"""
+    from .models import ChatParticipant
+
+    marks = ChatParticipant.objects.filter(chat=chat).exclude(user=user)
+    return max(marks.values_list('last_read_id', flat=True), default=0)
+
+
+def message_dict(message, user, read_id=0):
+    """Сообщение в виде JSON для страницы чата"""
+    return {
+        'id': message.id,
+        'text': message.text,
+        'created': message.created.isoformat(),
+        'time': timezone.localtime(message.created).strftime('%H:%M'),
+        'sent': message.sender_id == user.id,
+        'read': message.id <= read_id,
+    }
@@ -1,13 +1,8 @@
-from .models import Notification
-
 
 def unread_notifications(request):
-    """Context processor для непрочитанных уведомлений"""
+    """Context processor для непрочитанных уведомлений (денормализованный счётчик профиля)"""
     if request.user.is_authenticated:
         return {
-            'unread_notifications': Notification.objects.filter(
-                user=request.user, read=False
-            ).count()
+            'unread_notifications': request.user.profile.unread_notifications_count
         }
     return {'unread_notifications': 0}
-
@@ -0,0 +1,91 @@
+"""
+Денормализованные счётчики лайков, комментариев и непрочитанных уведомлений.
+
+Счётчики хранятся в колонках родительских моделей и обновляются атомарным
+``UPDATE ... SET x = x ± 1`` в той же транзакции, что и вставка/удаление
+лайка или комментария. Счётчик непрочитанных уведомлений
+живёт в Profile.unread_notifications_count. Команда ``reconcile_counters``
+пересчитывает все счётчики и исправляет расхождения.
+"""
+from django.apps import apps
+from django.db.models import Count, F
+
+# (модель-источник, FK на родителя, колонка-счётчик у родителя)
+COUNTERS = [
+    ('main.PostLike', 'post', 'likes_count'),
+    ('main.PostComment', 'post', 'comments_count'),
+    ('main.PostCommentLike', 'comment', 'likes_count'),
+    ('groups.GroupPostLike', 'post', 'likes_count'),
+    ('groups.GroupPostComment', 'post', 'comments_count'),
+    ('groups.GroupPostCommentLike', 'comment', 'likes_count'),
+]
+
+
+def counter_specs():
+    """Список (модель-источник, имя FK, модель-родитель, колонка)"""
+    specs = []
+    for label, fk_name, field in COUNTERS:
+        model = apps.get_model(label)
+        parent = model._meta.get_field(fk_name).related_model
+        specs.append((model, fk_name, parent, field))
+    return specs
+
+
+def bump(parent, pk, field, delta):
+    """Атомарно изменить счётчик родителя на delta"""
+    parent.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def reconcile(model, fk_name, parent, field, start, stop):
+    """
+    Пересчитать счётчик для родителей с pk в [start, stop).
+    Возвращает количество исправленных строк.
+    """
+    actual = dict(
+        model.objects.filter(**{f'{fk_name}__gte': start, f'{fk_name}__lt': stop})
+        .order_by()
+        .values_list(fk_name)
+        .annotate(total=Count('pk'))
+    )
+    stale = []
+    rows = parent.objects.filter(pk__gte=start, pk__lt=stop).values_list('pk', field)
+    for pk, value in rows:
+        expected = actual.get(pk, 0)
+        if value != expected:
+            obj = parent(pk=pk)
+            setattr(obj, field, expected)
+            stale.append(obj)
+    if stale:
+        parent.objects.bulk_update(stale, [field])
+    return len(stale)
+
+
+def bump_unread(user_id, delta):
+    """Атомарно изменить счётчик непрочитанных уведомлений пользователя"""
+    Profile = apps.get_model('main', 'Profile')
+    Profile.objects.filter(user_id=user_id).update(
+        unread_notifications_count=F('unread_notifications_count') + delta
+    )
+
+
+def reconcile_unread(start, stop):
+    """Пересчитать непрочитанные уведомления для профилей с user_id в [start, stop)"""
+    Notification = apps.get_model('main', 'Notification')
+    Profile = apps.get_model('main', 'Profile')
+    actual = dict(
+        Notification.objects.filter(user_id__gte=start, user_id__lt=stop, read=False)
+        .order_by()
+        .values_list('user_id')
+        .annotate(total=Count('pk'))
+    )
+    stale = []
+    rows = Profile.objects.filter(user_id__gte=start, user_id__lt=stop).values_list(
+        'pk', 'user_id', 'unread_notifications_count'
+    )
+    for pk, user_id, value in rows:
+        expected = actual.get(user_id, 0)
+        if value != expected:
+            stale.append(Profile(pk=pk, unread_notifications_count=expected))
+    if stale:
+        Profile.objects.bulk_update(stale, ['unread_notifications_count'])
+    return len(stale)
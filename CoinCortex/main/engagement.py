@@ -0,0 +1,68 @@
+"""
+Пакетная загрузка лайков и комментариев.
+
+Вместо вызова is_liked_by() для каждого объекта лента строится через
+``Model.objects.with_engagement(user)``: отметка "лайкнул я" и первые N
+комментариев (со своими лайками) подтягиваются фиксированным числом
+запросов независимо от размера страницы. Сами счётчики лайков и
+комментариев денормализованы в колонки likes_count/comments_count
+(см. main.counters).
+"""
+from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Value
+
+
+class EngagementQuerySet(models.QuerySet):
+    """QuerySet постов и комментариев с пакетной загрузкой активности"""
+
+    def with_engagement(self, user, comments=5):
+        """
+        Добавить is_liked и (для постов) preview_comments — первые
+        ``comments`` комментариев с их лайками.
+        """
+        likes = self.model.likes.rel
+        if user.is_authenticated:
+            liked = likes.related_model.objects.filter(
+                **{likes.field.name: OuterRef('pk'), 'user': user}
+            )
+            qs = self.annotate(is_liked=Exists(liked))
+        else:
+            qs = self.annotate(is_liked=Value(False))
+
+        comments_descriptor = getattr(self.model, 'comments', None)
+        if comments_descriptor is not None:
+            comments_rel = comments_descriptor.rel
+            if comments:
+                preview = (
+                    comments_rel.related_model.objects.with_engagement(user)
+                    .select_related('author')
+                    .order_by('created', 'id')[:comments]
+                )
+                qs = qs.prefetch_related(
+                    Prefetch('comments', queryset=preview, to_attr='preview_comments')
+                )
+        return qs
+
+
+def comment_item(comment):
+    """Словарь комментария для шаблонов"""
+    return {
+        'comment': comment,
+        'is_liked': comment.is_liked,
+        'likes_count': comment.likes_count,
+    }
+
+
+def post_item(post, **extra):
+    """Словарь поста для шаблонов ленты (post, счётчики, комментарии)"""
+    preview = getattr(post, 'preview_comments', [])
+    item = {
+        'post': post,
+        'is_liked': post.is_liked,
+        'likes_count': post.likes_count,
+        'comments_count': post.comments_count,
+        'comments': [comment_item(c) for c in preview],
+        'top_comment': preview[0] if preview else None,
+    }
+    item.update(extra)
+    return item
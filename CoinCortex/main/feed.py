@@ -0,0 +1,261 @@
+"""
+Материализованная лента (fan-out on write) и постраничное чтение ленты.
+
+Каждый новый пост сразу раскладывается по лентам получателей в таблицу
+FeedEntry, поэтому главная страница читает только последние N записей
+своей ленты по индексу (user, -created).
+
+Страница ленты собирается ленивым слиянием нескольких потоков,
+упорядоченных по убыванию (created, type, id), через heapq.merge: из
+каждого источника читается не больше строк, чем нужно для страницы, а
+позиция "загрузить ещё" передаётся непрозрачным курсором.
+"""
+import base64
+import heapq
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .engagement import post_item
+from .friends import friend_ids
+from .models import FeedEntry, Post
+
+# Сколько последних постов переносится в ленту при добавлении друга
+# или подписке на сообщество
+FEED_BACKFILL_LIMIT = 200
+
+
+def _post_entries(user_ids, post):
+    return [
+        FeedEntry(user_id=user_id, post_id=post.id, created=post.created)
+        for user_id in user_ids
+    ]
+
+
+def _group_post_entries(user_ids, group_post):
+    return [
+        FeedEntry(user_id=user_id, group_post_id=group_post.id, created=group_post.created)
+        for user_id in user_ids
+    ]
+
+
+def fan_out_post(post):
+    """Разложить пост по лентам автора и друзей автора/владельца стены"""
+    recipients = {post.author_id}
+    recipients |= friend_ids(post.author_id)
+    if post.wall_owner_id != post.author_id:
+        recipients |= friend_ids(post.wall_owner_id)
+    FeedEntry.objects.bulk_create(_post_entries(recipients, post), ignore_conflicts=True)
+
+
+def fan_out_group_post(group_post):
+    """Разложить пост сообщества по лентам подписчиков"""
+    from groups.models import GroupSubscription
+
+    recipients = GroupSubscription.objects.filter(
+        group_id=group_post.group_id, is_subscribed=True
+    ).values_list("user_id", flat=True)
+    FeedEntry.objects.bulk_create(
+        _group_post_entries(recipients, group_post), ignore_conflicts=True
+    )
+
+
+def backfill_friend(user_id, friend_id, limit=FEED_BACKFILL_LIMIT):
+    """Добавить в ленту пользователя последние посты нового друга"""
+    posts = (
+        Post.objects.filter(Q(author_id=friend_id) | Q(wall_owner_id=friend_id))
+        .only("id", "created")
+        .order_by("-created")[:limit]
+    )
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, post_id=p.id, created=p.created) for p in posts],
+        ignore_conflicts=True,
+    )
+
+
+def remove_friend(user_id, friend_id):
+    """Убрать из ленты посты бывшего друга, которые больше ничем не оправданы"""
+    friends = friend_ids(user_id)
+    (
+        FeedEntry.objects.filter(user_id=user_id)
+        .filter(Q(post__author_id=friend_id) | Q(post__wall_owner_id=friend_id))
+        .exclude(post__author_id=user_id)
+        .exclude(post__author_id__in=friends)
+        .exclude(post__wall_owner_id__in=friends)
+        .delete()
+    )
+
+
+def backfill_group(user_id, group_id, limit=FEED_BACKFILL_LIMIT):
+    """Добавить в ленту последние посты сообщества после подписки"""
+    from groups.models import GroupPost
+
+    posts = (
+        GroupPost.objects.filter(group_id=group_id)
+        .only("id", "created")
+        .order_by("-created")[:limit]
+    )
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, group_post_id=p.id, created=p.created) for p in posts],
+        ignore_conflicts=True,
+    )
+
+
+def remove_group(user_id, group_id):
+    """Убрать из ленты посты сообщества после отписки"""
+    FeedEntry.objects.filter(user_id=user_id, group_post__group_id=group_id).delete()
+
+
+def _insert_entries(user_id, posts, column):
+    """
+    INSERT ... SELECT: записи ленты прямо из запроса постов (id, created),
+    без загрузки строк в Python — пересборка всех лент упирается в это.
+    """
+    sql, params = posts.values("id", "created").query.sql_with_params()
+    # WHERE нужен SQLite, чтобы отличить ON CONFLICT от условия соединения
+    with connections[FeedEntry.objects.db].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FeedEntry._meta.db_table} (user_id, {column}, created) "
+            f"SELECT %s, feed.id, feed.created FROM ({sql}) AS feed "
+            f"WHERE feed.id IS NOT NULL ON CONFLICT DO NOTHING",
+            [user_id, *params],
+        )
+
+
+def rebuild_timeline(user_id, limit=FEED_BACKFILL_LIMIT):
+    """Пересобрать ленту пользователя с нуля"""
+    from groups.models import GroupPost, GroupSubscription
+
+    friends = friend_ids(user_id)
+    posts = Post.objects.filter(
+        Q(author_id__in=friends) | Q(wall_owner_id__in=friends) | Q(author_id=user_id)
+    ).order_by("-created")[:limit]
+    group_ids = GroupSubscription.objects.filter(
+        user_id=user_id, is_subscribed=True
+    ).values_list("group_id", flat=True)
+    group_posts = GroupPost.objects.filter(group_id__in=group_ids).order_by("-created")[:limit]
+
+    with transaction.atomic():
+        FeedEntry.objects.filter(user_id=user_id).delete()
+        _insert_entries(user_id, posts, "post_id")
+        _insert_entries(user_id, group_posts, "group_post_id")
+
+
+# --- Слияние потоков и keyset-пагинация ---
+
+FEED_PAGE_SIZE = 50
+
+FeedKey = namedtuple('FeedKey', ['created', 'type', 'id'])
+
+
+class FeedSource:
+    """Источник ленты: QuerySet одного типа постов, читаемый по убыванию (created, id)"""
+
+    def __init__(self, queryset, post_type, id_field='id'):
+        self.queryset = queryset
+        self.type = post_type
+        self.id_field = id_field
+
+    def _after(self, key):
+        """Условие "строго после курсора" в порядке убывания (created, type, id)"""
+        if self.type < key.type:
+            return Q(created__lte=key.created)
+        if self.type > key.type:
+            return Q(created__lt=key.created)
+        return Q(created__lt=key.created) | Q(created=key.created, **{f'{self.id_field}__lt': key.id})
+
+    def stream(self, cursor, chunk_size):
+        """Ленивый генератор FeedKey; запрос выполняется только при чтении"""
+        ordered = self.queryset.order_by('-created', f'-{self.id_field}')
+        key = cursor
+        while True:
+            qs = ordered.filter(self._after(key)) if key else ordered
+            rows = list(qs.values_list('created', self.id_field)[:chunk_size])
+            for created, obj_id in rows:
+                key = FeedKey(created, self.type, obj_id)
+                yield key
+            if len(rows) < chunk_size:
+                return
+
+
+def encode_cursor(key):
+    raw = f'{key.created.isoformat()}|{key.type}|{key.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Разобрать курсор; некорректный курсор означает начало ленты"""
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        created, post_type, obj_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return FeedKey(datetime.fromisoformat(created), post_type, int(obj_id))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def timeline_sources(user):
+    """Посты друзей и посты сообществ из материализованной ленты пользователя"""
+    entries = FeedEntry.objects.filter(user=user)
+    return [
+        FeedSource(entries.filter(post__isnull=False), 'user', 'post_id'),
+        FeedSource(entries.filter(group_post__isnull=False), 'group', 'group_post_id'),
+    ]
+
+
+def group_sources(group_ids):
+    """По потоку на каждое сообщество (для гостевой ленты популярных групп)"""
+    from groups.models import GroupPost
+
+    return [
+        FeedSource(GroupPost.objects.filter(group_id=group_id), 'group')
+        for group_id in group_ids
+    ]
+
+
+def merge_keys(sources, cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    Слить источники и вернуть (ключи страницы, курсор следующей страницы).
+    Каждый источник читает не больше limit + 1 строк.
+    """
+    streams = [source.stream(cursor, limit + 1) for source in sources]
+    merged = heapq.merge(*streams, reverse=True)
+    keys = list(islice(merged, limit + 1))
+    next_cursor = encode_cursor(keys[limit - 1]) if len(keys) > limit else None
+    return keys[:limit], next_cursor
+
+
+def build_page(sources, user, cursor=None, limit=FEED_PAGE_SIZE):
+    """Страница ленты: элементы post_item() в порядке ленты и курсор "загрузить ещё" """
+    from groups.models import GroupPost
+
+    keys, next_cursor = merge_keys(sources, cursor, limit)
+    post_ids = [key.id for key in keys if key.type == 'user']
+    group_post_ids = [key.id for key in keys if key.type == 'group']
+
+    posts = {}
+    if post_ids:
+        posts.update(
+            (('user', post.id), post)
+            for post in Post.objects.filter(id__in=post_ids)
+            .select_related('author__profile', 'wall_owner')
+            .with_engagement(user)
+        )
+    if group_post_ids:
+        posts.update(
+            (('group', post.id), post)
+            for post in GroupPost.objects.filter(id__in=group_post_ids)
+            .select_related('group', 'author')
+            .with_engagement(user)
+        )
+
+    items = [
+        post_item(posts[key.type, key.id], type=key.type)
+        for key in keys
+        if (key.type, key.id) in posts
+    ]
+    return items, next_cursor
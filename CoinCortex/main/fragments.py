@@ -0,0 +1,110 @@
+"""
+Кеш отрендеренных фрагментов страниц (карточки постов, комментарии, шапка группы).
+
+Фрагмент зависит от нескольких объектов, у каждого из которых в кеше
+лежит номер версии: ``fragment:version:<вид>:<id>``. Какие версии нужны
+для отрисовки объекта, описывает RENDERS (пост — сам пост и профиль
+автора). Ключ фрагмента собирается из его имени и текущих версий всех
+зависимостей, поэтому изменение объекта не удаляет старые фрагменты, а
+просто делает их недостижимыми — они вытесняются кешем по таймауту.
+
+Версии увеличивают сигналы (main.signals) после коммита — по
+DEPENDENCIES: какая модель какие версии меняет. Во фрагменты не попадает
+ничего, что зависит от зрителя (лайкнул ли он, csrf-токен, кнопки
+владельца), поэтому один фрагмент безопасно отдавать всем пользователям.
+
+В шаблоне: ``{% load fragments %}`` и
+``{% fragment "post_card" item.post item.top_comment %}...{% endfragment %}``
+(см. main.templatetags.fragments).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_PREFIX = 'fragment:version:'
+
+# Модель -> функция (объект) -> [(вид, id)], версии которых меняет сохранение или удаление
+DEPENDENCIES = {
+    'main.Post': lambda obj: [('post', obj.pk)],
+    'main.PostLike': lambda obj: [('post', obj.post_id)],
+    'main.PostComment': lambda obj: [('comment', obj.pk), ('post', obj.post_id)],
+    'main.PostCommentLike': lambda obj: [('comment', obj.comment_id)],
+    'main.Profile': lambda obj: [('profile', obj.user_id)],
+    'groups.Group': lambda obj: [('group', obj.pk)],
+    'groups.GroupSubscription': lambda obj: [('group', obj.group_id)],
+    'groups.GroupRating': lambda obj: [('group', obj.group_id)],
+    'groups.GroupPost': lambda obj: [('group_post', obj.pk)],
+    'groups.GroupPostLike': lambda obj: [('group_post', obj.post_id)],
+    'groups.GroupPostComment': lambda obj: [('group_comment', obj.pk), ('group_post', obj.post_id)],
+    'groups.GroupPostCommentLike': lambda obj: [('group_comment', obj.comment_id)],
+}
+
+
+# Модель -> функция (объект) -> [(вид, id)], от версий которых зависит его отрисовка
+RENDERS = {
+    'main.Post': lambda obj: [('post', obj.pk), ('profile', obj.author_id)],
+    'main.PostComment': lambda obj: [('comment', obj.pk)],
+    'groups.Group': lambda obj: [('group', obj.pk)],
+    'groups.GroupPost': lambda obj: [('group_post', obj.pk), ('group', obj.group_id)],
+    'groups.GroupPostComment': lambda obj: [('group_comment', obj.pk)],
+}
+
+
+def _version_key(kind, pk):
+    return f'{VERSION_PREFIX}{kind}:{pk}'
+
+
+def _fresh_version():
+    # Если ключ версии вытеснили, новая версия не должна совпасть со старой
+    return time.time_ns()
+
+
+def timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def versions(deps):
+    """Текущие версии [(вид, id)]; отсутствующие создаются"""
+    keys = [_version_key(kind, pk) for kind, pk in deps]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(deps):
+    """Сделать устаревшими фрагменты, зависящие от [(вид, id)]"""
+    for kind, pk in deps:
+        if pk is None:
+            continue
+        key = _version_key(kind, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def bump_for(instance):
+    """Увеличить версии, которые зависят от instance (см. DEPENDENCIES)"""
+    dependencies = DEPENDENCIES.get(instance._meta.label)
+    if dependencies is not None:
+        bump(dependencies(instance))
+
+
+def fragment_key(name, objects):
+    """Ключ фрагмента name, отрисованного из objects (None — объекта нет)"""
+    deps, parts = [], []
+    for obj in objects:
+        if obj is None:
+            parts.append('-')
+            continue
+        obj_deps = RENDERS[obj._meta.label](obj)
+        deps.extend(obj_deps)
+        parts.append(','.join(f'{kind}:{pk}' for kind, pk in obj_deps))
+    parts.extend(str(version) for version in versions(deps))
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'fragment:{name}:{digest}'
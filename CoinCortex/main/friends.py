@@ -0,0 +1,107 @@
+"""
+Граф друзей.
+
+Множество id друзей пользователя хранится в кеше Django и сбрасывается
+сигналами Friendship (см. main.signals), поэтому проверки "друзья ли
+мы", общие друзья и друзья друзей не обращаются к базе, пока граф не
+изменился.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Friendship
+
+FRIEND_IDS_TIMEOUT = 60 * 60
+
+
+def _timeout():
+    # С locmem сброс по сигналу не доходит до других процессов (см. settings)
+    return getattr(settings, 'FRIEND_IDS_CACHE_TIMEOUT', FRIEND_IDS_TIMEOUT)
+
+
+def _key(user_id):
+    return f'friends:{user_id}'
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def _load(user_ids):
+    """Прочитать друзей для user_ids одним запросом"""
+    result = {user_id: set() for user_id in user_ids}
+    pairs = Friendship.objects.filter(
+        Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids), accepted=True
+    ).values_list('from_user_id', 'to_user_id')
+    for a, b in pairs:
+        if a in result:
+            result[a].add(b)
+        if b in result:
+            result[b].add(a)
+    cache.set_many(
+        {_key(user_id): sorted(ids) for user_id, ids in result.items()},
+        _timeout(),
+    )
+    return result
+
+
+def friend_ids(user):
+    """Множество id принятых друзей пользователя (user или id)"""
+    user_id = _user_id(user)
+    cached = cache.get(_key(user_id))
+    if cached is not None:
+        return set(cached)
+    return _load([user_id])[user_id]
+
+
+def friend_ids_many(users):
+    """{id пользователя: множество id друзей} для нескольких пользователей"""
+    user_ids = [_user_id(user) for user in users]
+    cached = cache.get_many([_key(user_id) for user_id in user_ids])
+    result = {}
+    missing = []
+    for user_id in user_ids:
+        ids = cached.get(_key(user_id))
+        if ids is None:
+            missing.append(user_id)
+        else:
+            result[user_id] = set(ids)
+    if missing:
+        result.update(_load(missing))
+    return result
+
+
+def are_friends(user, other):
+    return _user_id(other) in friend_ids(user)
+
+
+def mutual_friend_ids(user, other):
+    """id общих друзей двух пользователей"""
+    both = friend_ids_many([user, other])
+    return both[_user_id(user)] & both[_user_id(other)]
+
+
+def friends_of_friends(user):
+    """
+    Counter {id: число общих друзей} для друзей друзей пользователя
+    (без него самого и его друзей).
+    """
+    user_id = _user_id(user)
+    friends = friend_ids(user_id)
+    counts = Counter()
+    for ids in friend_ids_many(friends).values():
+        counts.update(ids)
+    for excluded in friends | {user_id}:
+        counts.pop(excluded, None)
+    return counts
+
+
+def invalidate(*user_ids):
+    """Сбросить кеш друзей (сейчас и ещё раз после фиксации транзакции)"""
+    keys = [_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
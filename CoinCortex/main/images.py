@@ -0,0 +1,214 @@
+"""
+Варианты загруженных изображений (аватары, картинки постов).
+
+После сохранения объекта с новой картинкой сигнал (main.signals) ставит
+её обработку в пул потоков — вне запроса и только после коммита. Pillow
+поворачивает снимок по EXIF, уменьшает его до размеров из VARIANTS и
+сохраняет каждый вариант в WebP и JPEG без метаданных. Пути вариантов
+записываются в JSON-поле ``image_variants``:
+
+    {"source": "posts/images/a.jpg",
+     "feed": {"webp": "variants/...", "jpeg": "variants/...", "width": 680, "height": 453}}
+
+Шаблоны берут нужный размер фильтром ``variant`` (main.templatetags.images);
+пока варианты не готовы, отдаётся оригинал. ``manage.py process_images``
+обрабатывает картинки, загруженные раньше.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import fragments
+
+logger = logging.getLogger(__name__)
+
+# Размеры: (ширина, высота, обрезать до квадрата)
+AVATAR_VARIANTS = {
+    'avatar_sm': (96, 96, True),
+    'avatar': (256, 256, True),
+}
+POST_VARIANTS = {
+    'feed': (680, 1360, False),
+    'full': (1600, 1600, False),
+}
+
+# Модель -> (поле с картинкой, набор вариантов)
+VARIANTS = {
+    'main.Profile': ('avatar', AVATAR_VARIANTS),
+    'main.Community': ('avatar', AVATAR_VARIANTS),
+    'groups.Group': ('avatar', AVATAR_VARIANTS),
+    'main.Post': ('image', POST_VARIANTS),
+    'groups.GroupPost': ('image', POST_VARIANTS),
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_executor = None
+
+
+def spec_for(model):
+    """(поле, варианты) для модели или None"""
+    return VARIANTS.get(model._meta.label)
+
+
+def needs_processing(instance):
+    """Картинка объекта изменилась с момента последней обработки"""
+    field_name, _ = spec_for(type(instance))
+    name = getattr(instance, field_name).name or ''
+    return (instance.image_variants or {}).get('source', '') != name
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS, thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def schedule(instance):
+    """Обработать картинку объекта после коммита (в пуле или сразу, если IMAGE_WORKERS = 0)"""
+    label, pk = instance._meta.label, instance.pk
+
+    def submit():
+        if settings.IMAGE_WORKERS:
+            _get_executor().submit(_process_in_worker, label, pk)
+        else:
+            process(label, pk)
+
+    transaction.on_commit(submit)
+
+
+def _process_in_worker(label, pk):
+    close_old_connections()
+    try:
+        process(label, pk)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s #%s', label, pk)
+    finally:
+        close_old_connections()
+
+
+def _resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        if image.mode != 'RGB':
+            # У JPEG нет прозрачности — подкладываем белый фон
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    # exif/icc не передаются в save(), поэтому метаданные не сохраняются
+    return buffer.getvalue()
+
+
+def build_variants(field_file, variants):
+    """Сохранить варианты картинки в хранилище и вернуть словарь для image_variants"""
+    storage = field_file.storage
+    with field_file.open('rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    stem = os.path.splitext(field_file.name)[0]
+    result = {'source': field_file.name}
+    for name, (width, height, crop) in variants.items():
+        resized = _resize(image, width, height, crop)
+        entry = {'width': resized.width, 'height': resized.height}
+        for fmt, ext in (('webp', 'webp'), ('jpeg', 'jpg')):
+            path = storage.save(f'variants/{stem}_{name}.{ext}', ContentFile(_encode(resized, fmt)))
+            entry[fmt] = path
+        result[name] = entry
+    return result
+
+
+def variant_paths(image_variants):
+    """Все пути файлов вариантов"""
+    return [
+        path
+        for entry in (image_variants or {}).values()
+        if isinstance(entry, dict)
+        for key, path in entry.items()
+        if key in ('webp', 'jpeg')
+    ]
+
+
+def delete_variants(storage, image_variants):
+    for path in variant_paths(image_variants):
+        try:
+            storage.delete(path)
+        except OSError:
+            logger.warning('Не удалось удалить вариант %s', path)
+
+
+def process(label, pk):
+    """Построить варианты картинки объекта; старые варианты удаляются"""
+    from .storage import acquire  # storage сам импортирует images
+
+    model = apps.get_model(label)
+    field_name, variants = VARIANTS[label]
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or not needs_processing(instance):
+        return
+    field_file = getattr(instance, field_name)
+    if field_file:
+        try:
+            new_variants = build_variants(field_file, variants)
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+            logger.warning('Не удалось обработать %s: %s', field_file.name, exc)
+            # Запоминаем source, чтобы не обрабатывать битый файл снова
+            new_variants = {'source': field_file.name}
+    else:
+        new_variants = {}
+
+    # Картинку могли заменить, пока шла обработка
+    if field_file.name:
+        same_image = Q(**{field_name: field_file.name})
+    else:
+        same_image = Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    storage = field_file.storage
+    with transaction.atomic():
+        updated = model._default_manager.filter(same_image, pk=pk).update(image_variants=new_variants)
+        if updated:
+            # update() не отправляет сигналов — ссылки на варианты берём сами,
+            # а новых вариантов, не попавших в базу, никто не держит
+            for path in variant_paths(new_variants):
+                acquire(storage, path)
+            delete_variants(storage, instance.image_variants)
+    if updated:
+        # Закешированные фрагменты с оригиналом тоже обновляем сами
+        fragments.bump_for(instance)
+
+
+def variant_url(instance, name, fmt='webp'):
+    """URL варианта name или оригинала, если вариантов ещё нет"""
+    spec = spec_for(type(instance))
+    if spec is None:
+        return ''
+    field_file = getattr(instance, spec[0])
+    if not field_file:
+        return ''
+    entry = (instance.image_variants or {}).get(name)
+    if entry and (instance.image_variants.get('source') == field_file.name) and entry.get(fmt):
+        return field_file.storage.url(entry[fmt])
+    return field_file.url
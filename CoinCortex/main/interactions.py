@@ -0,0 +1,233 @@
+"""
+Лайки и комментарии постов (Post, GroupPost) и комментариев к ним.
+
+Одна реализация для всех страниц: перечисленные в TARGETS объекты
+лайкаются и комментируются одинаково, отличаются только модели и типы
+уведомлений. perform() выполняет одну операцию и возвращает новые
+значения счётчиков, apply() — пачку операций за один запрос. JSON-точка
+``interactions/`` (main.views.interactions_view) отдаёт только счётчики,
+поэтому лайк из JavaScript стоит нескольких запросов к базе, а не
+перерисовки всей ленты. Обычные HTML-формы без JavaScript обрабатывает
+handle_form() — те же операции, после которых страница перезагружается.
+
+Операция: ``{"op": "like" | "comment", "target": "post" | "group_post" |
+"comment" | "group_comment", "id": 1, "text": "..."}``.
+"""
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.contrib import messages
+from django.db import transaction
+
+from .notifications import notify, cancel_notification
+
+# Сколько операций можно передать в одном запросе
+MAX_OPERATIONS = 10
+
+
+class InteractionError(Exception):
+    """Операцию нельзя выполнить; текст показывается пользователю"""
+
+
+@dataclass(frozen=True)
+class Target:
+    model: str
+    like_model: str
+    # FK лайка (и комментария) на объект
+    fk_name: str
+    # Тип уведомления о лайке и поле цели уведомления
+    like_type: str
+    notify_field: str
+    # Комментарии к объекту (у комментариев их нет)
+    comment_model: str = None
+    comment_type: str = None
+    # Путь до группы — чтобы ограничить операции одной группой
+    group_path: str = None
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+
+TARGETS = {
+    'post': Target(
+        'main.Post', 'main.PostLike', 'post', 'like', 'post',
+        comment_model='main.PostComment', comment_type='comment',
+    ),
+    'comment': Target(
+        'main.PostComment', 'main.PostCommentLike', 'comment', 'comment_like', 'comment',
+    ),
+    'group_post': Target(
+        'groups.GroupPost', 'groups.GroupPostLike', 'post', 'group_like', 'group_post',
+        comment_model='groups.GroupPostComment', comment_type='group_comment',
+        group_path='group',
+    ),
+    'group_comment': Target(
+        'groups.GroupPostComment', 'groups.GroupPostCommentLike', 'comment',
+        'group_comment_like', 'group_comment', group_path='post__group',
+    ),
+}
+
+# Поле HTML-формы -> (операция, цель)
+FORM_FIELDS = {
+    'like_post': ('like', 'post'),
+    'comment_post': ('comment', 'post'),
+    'like_comment': ('like', 'comment'),
+    'like_group_post': ('like', 'group_post'),
+    'comment_group_post': ('comment', 'group_post'),
+    'like_group_comment': ('like', 'group_comment'),
+}
+
+# Главная страница помечает объекты групп префиксом "group_"
+GROUP_PREFIX = 'group_'
+GROUP_TARGETS = {'post': 'group_post', 'comment': 'group_comment'}
+
+NOT_FOUND = {
+    'post': 'Пост не найден',
+    'group_post': 'Пост не найден',
+    'comment': 'Комментарий не найден',
+    'group_comment': 'Комментарий не найден',
+}
+
+
+def operation_from_form(data):
+    """Операция из полей обычной формы или None, если форма не о лайках и комментариях"""
+    for field, (op, target) in FORM_FIELDS.items():
+        if field not in data:
+            continue
+        value = data.get(field, '')
+        if value.startswith(GROUP_PREFIX) and target in GROUP_TARGETS:
+            value = value[len(GROUP_PREFIX):]
+            target = GROUP_TARGETS[target]
+        return {'op': op, 'target': target, 'id': value, 'text': data.get('comment_text', '')}
+    return None
+
+
+def _get_object(target_name, pk, group=None):
+    target = TARGETS.get(target_name)
+    if target is None:
+        raise InteractionError('Неизвестный тип объекта')
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InteractionError(NOT_FOUND[target_name])
+    queryset = target.get_model().objects.select_related('author')
+    if group is not None:
+        if target.group_path is None:
+            raise InteractionError(NOT_FOUND[target_name])
+        queryset = queryset.filter(**{target.group_path: group})
+    obj = queryset.filter(pk=pk).first()
+    if obj is None:
+        raise InteractionError(NOT_FOUND[target_name])
+    return target, obj
+
+
+def _likes_count(obj):
+    return type(obj).objects.filter(pk=obj.pk).values_list('likes_count', flat=True).first() or 0
+
+
+def toggle_like(user, target_name, pk, group=None):
+    """Поставить или снять лайк; возвращает {'is_liked', 'likes_count'}"""
+    target, obj = _get_object(target_name, pk, group)
+    like_model = apps.get_model(target.like_model)
+    with transaction.atomic():
+        like, created = like_model.objects.get_or_create(
+            user=user, **{target.fk_name: obj}
+        )
+        notify_target = {target.notify_field: obj}
+        if created:
+            notify(obj.author, target.like_type, user, **notify_target)
+        else:
+            like.delete()
+            cancel_notification(obj.author, target.like_type, user, **notify_target)
+    return {'is_liked': created, 'likes_count': _likes_count(obj)}
+
+
+def add_comment(user, target_name, pk, text, group=None):
+    """Добавить комментарий; возвращает {'comment_id', 'comments_count'}"""
+    text = (text or '').strip()
+    if not text:
+        raise InteractionError('Комментарий не может быть пустым')
+    target, obj = _get_object(target_name, pk, group)
+    if target.comment_model is None:
+        raise InteractionError('Этот объект нельзя комментировать')
+    comment_model = apps.get_model(target.comment_model)
+    with transaction.atomic():
+        comment = comment_model.objects.create(
+            author=user, content=text, **{target.fk_name: obj}
+        )
+        notify(obj.author, target.comment_type, user, **{target.notify_field: obj})
+    comments_count = (
+        type(obj).objects.filter(pk=obj.pk).values_list('comments_count', flat=True).first() or 0
+    )
+    return {'comment_id': comment.pk, 'comments_count': comments_count}
+
+
+def _operation_id(value):
+    # bool — подкласс int, а 1.9 не должен превращаться в 1
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    raise InteractionError('Некорректный id')
+
+
+def perform(user, operation, group=None):
+    """
+    Выполнить одну операцию (см. описание модуля). group ограничивает
+    операцию объектами одной группы. Ошибки, в том числе неверные типы
+    полей из JSON, — InteractionError.
+    """
+    if not isinstance(operation, dict):
+        raise InteractionError('Некорректная операция')
+    op = operation.get('op')
+    target_name = operation.get('target')
+    if not isinstance(target_name, str) or target_name not in TARGETS:
+        raise InteractionError('Неизвестный тип объекта')
+    pk = _operation_id(operation.get('id'))
+    if op == 'like':
+        return toggle_like(user, target_name, pk, group)
+    if op == 'comment':
+        text = operation.get('text')
+        if text is not None and not isinstance(text, str):
+            raise InteractionError('Текст комментария должен быть строкой')
+        return add_comment(user, target_name, pk, text, group)
+    raise InteractionError('Неизвестная операция')
+
+
+def apply(user, operations):
+    """
+    Выполнить пачку операций. Каждая выполняется независимо: ошибка одной
+    не отменяет остальные. Возвращает список результатов в том же порядке:
+    ``{'ok': True, 'target': ..., 'id': ..., <счётчики>}`` или
+    ``{'ok': False, ..., 'error': ...}``.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise InteractionError('Нет операций')
+    if len(operations) > MAX_OPERATIONS:
+        raise InteractionError(f'Не больше {MAX_OPERATIONS} операций за запрос')
+    results = []
+    for operation in operations:
+        result = {}
+        if isinstance(operation, dict):
+            result = {'target': operation.get('target'), 'id': operation.get('id')}
+        try:
+            result.update(perform(user, operation), ok=True)
+        except InteractionError as exc:
+            result.update(ok=False, error=str(exc))
+        results.append(result)
+    return results
+
+
+def handle_form(request, group=None):
+    """
+    Лайк или комментарий из обычной формы (запасной путь без JavaScript).
+    Возвращает False, если форма не о них; ошибки показываются через messages.
+    """
+    operation = operation_from_form(request.POST)
+    if operation is None:
+        return False
+    try:
+        perform(request.user, operation, group)
+    except InteractionError as exc:
+        messages.error(request, str(exc))
+    return True
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from main import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Замерить время и число запросов горячих страниц на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(benchmarks.SIZES),
+                            help='Количество пользователей в каждом прогоне')
+        parser.add_argument('--views', nargs='+', default=None,
+                            help=f'Только эти страницы ({", ".join(benchmarks.VIEWS)})')
+        parser.add_argument('--repeat', type=int, default=benchmarks.REPEAT,
+                            help='Замеров на страницу после прогрева')
+        parser.add_argument('--baseline', default=str(benchmarks.BASELINE_PATH),
+                            help='JSON с базовым уровнем')
+        parser.add_argument('--threshold', type=float, default=benchmarks.LATENCY_THRESHOLD,
+                            help='Допустимый рост p95 (1.0 = вдвое)')
+        parser.add_argument('--save', action='store_true',
+                            help='Записать результаты как новый базовый уровень')
+
+    def handle(self, *args, **options):
+        unknown = set(options['views'] or []) - set(benchmarks.VIEWS)
+        if unknown:
+            raise CommandError(f'Неизвестные страницы: {", ".join(sorted(unknown))}')
+
+        # Отдельная тестовая база: рабочие данные не трогаем
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = benchmarks.run(options['sizes'], options['views'], options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        self.stdout.write(benchmarks.format_table(results))
+
+        if options['save']:
+            benchmarks.save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Базовый уровень записан в {options["baseline"]}'))
+            return
+
+        problems = benchmarks.regressions(
+            results, benchmarks.load_baseline(options['baseline']), options['threshold']
+        )
+        if problems:
+            raise CommandError('Регрессии:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
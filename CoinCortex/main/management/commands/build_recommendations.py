@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Profile
+from main.recommendations import build_dirty
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать рекомендации друзей (только для изменившихся пользователей)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать рекомендации всех пользователей')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Сколько пользователей рассчитывать за раз')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Profile.objects.update(recommendations_dirty=True)
+        total = build_dirty(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано пользователей: {total}'))
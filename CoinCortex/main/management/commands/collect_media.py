@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from main.storage import ContentAddressedStorage, GC_GRACE_PERIOD, recount
+
+
+class Command(BaseCommand):
+    help = 'Удалить медиафайлы, на которые больше нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float,
+                            default=GC_GRACE_PERIOD.total_seconds() / 3600,
+                            help='Не трогать блобы, изменённые позже, чем столько часов назад')
+        parser.add_argument('--recount', action='store_true',
+                            help='Сначала пересчитать ссылки по всем моделям')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, сколько будет удалено')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('Хранилище по умолчанию не ContentAddressedStorage')
+
+        if options['recount']:
+            fixed = recount()
+            self.stdout.write(f'Исправлено счётчиков ссылок: {fixed}')
+
+        count, freed = default_storage.collect_garbage(
+            grace=timedelta(hours=options['grace_hours']), dry_run=options['dry_run']
+        )
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {count} ({freed / 1024 / 1024:.1f} МБ)'
+        ))
@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from main import images
+
+
+class Command(BaseCommand):
+    help = 'Построить варианты изображений, которые ещё не обработаны'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перестроить варианты всех изображений')
+
+    def handle(self, *args, **options):
+        total = 0
+        for label, (field_name, _) in images.VARIANTS.items():
+            model = apps.get_model(label)
+            objects = model._default_manager.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            )
+            count = 0
+            for instance in objects.only('pk', field_name, 'image_variants').iterator():
+                if options['all']:
+                    # Сбрасываем source, чтобы process() построил варианты заново
+                    model._default_manager.filter(pk=instance.pk).update(
+                        image_variants={**instance.image_variants, 'source': ''}
+                    )
+                elif not images.needs_processing(instance):
+                    continue
+                images.process(label, instance.pk)
+                count += 1
+            total += count
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {total}'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать полнотекстовый поисковый индекс (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*',
+                            help='Только указанные виды документов: '
+                                 + ', '.join(index.kind for index in search.INDEXES))
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Сколько объектов индексировать за раз')
+
+    def handle(self, *args, **options):
+        kinds = set(options['kinds'])
+        unknown = kinds - {index.kind for index in search.INDEXES}
+        if unknown:
+            raise CommandError(f'Неизвестные виды документов: {", ".join(sorted(unknown))}')
+
+        try:
+            available = search.create_table()
+        except DatabaseError as exc:
+            raise CommandError(f'Не удалось создать таблицу FTS5: {exc}')
+        if not available:
+            self.stdout.write(self.style.WARNING(
+                'База не поддерживает FTS5, поиск работает через icontains'
+            ))
+            return
+
+        for index in search.INDEXES:
+            if kinds and index.kind not in kinds:
+                continue
+            with transaction.atomic():
+                count = search.rebuild(index, chunk_size=options['chunk_size'])
+            self.stdout.write(f'{index.kind}: {count}')
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
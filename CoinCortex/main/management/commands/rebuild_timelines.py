@@ -0,0 +1,33 @@
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.feed import FEED_BACKFILL_LIMIT, rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать материализованные ленты пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Только для указанных пользователей')
+        parser.add_argument('--limit', type=int, default=FEED_BACKFILL_LIMIT,
+                            help='Сколько последних постов каждого типа переносить в ленту')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Сколько лент пересобирать в одной транзакции')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        count = 0
+        user_ids = users.order_by('id').values_list('id', flat=True).iterator()
+        # Одна транзакция на пачку: коммит на каждого пользователя в SQLite дорог
+        while chunk := list(islice(user_ids, options['chunk_size'])):
+            with transaction.atomic():
+                for user_id in chunk:
+                    rebuild_timeline(user_id, limit=options['limit'])
+            count += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {count}'))
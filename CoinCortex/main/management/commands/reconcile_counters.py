@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from django.contrib.auth.models import User
+
+from groups import stats as group_stats
+from groups.models import Group
+from main.counters import counter_specs, reconcile, reconcile_unread
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать денормализованные счётчики лайков, комментариев, уведомлений и статистику сообществ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Сколько родительских строк пересчитывать за раз')
+
+    def handle(self, *args, **options):
+        chunk = options['chunk_size']
+        total_fixed = 0
+
+        for model, fk_name, parent, field in counter_specs():
+            max_pk = parent.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+            fixed = 0
+            for start in range(0, max_pk + 1, chunk):
+                with transaction.atomic():
+                    fixed += reconcile(model, fk_name, parent, field, start, start + chunk)
+            total_fixed += fixed
+            self.stdout.write(f'{parent.__name__}.{field}: исправлено {fixed}')
+
+        max_pk = User.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        fixed = 0
+        for start in range(0, max_pk + 1, chunk):
+            with transaction.atomic():
+                fixed += reconcile_unread(start, start + chunk)
+        total_fixed += fixed
+        self.stdout.write(f'Profile.unread_notifications_count: исправлено {fixed}')
+
+        max_pk = Group.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        fixed = 0
+        for start in range(0, max_pk + 1, chunk):
+            with transaction.atomic():
+                fixed += group_stats.reconcile(start, start + chunk)
+        total_fixed += fixed
+        self.stdout.write(f'GroupStats: исправлено {fixed}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, исправлено строк: {total_fixed}'))
@@ -0,0 +1,44 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.notifications import process_outbox
+
+logger = logging.getLogger('main.notifications')
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди уведомлений (outbox)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько событий разбирать за один проход')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать текущую очередь и завершиться')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        try:
+            while True:
+                try:
+                    processed = process_outbox(batch_size)
+                except Exception:
+                    if options['once']:
+                        raise
+                    # Например, база временно заблокирована: пробуем позже
+                    logger.exception('Ошибка обработчика очереди уведомлений')
+                    time.sleep(options['interval'])
+                    continue
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Обработано событий: {total}'))
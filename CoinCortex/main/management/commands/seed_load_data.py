@@ -0,0 +1,442 @@
+"""
+Синтетические данные для нагрузочного тестирования.
+
+Все строки создаются через bulk_create пачками, поэтому сигналы не
+срабатывают: денормализованные счётчики, статистика групп, ленты,
+рекомендации и поисковый индекс пересобираются командами в конце
+(их можно пропустить флагом --skip-rebuild). Генератор детерминирован:
+одинаковые --seed и размеры дают одинаковые данные; меняются только
+даты — они отсчитываются назад от момента запуска.
+
+Граф друзей строится предпочтительным присоединением (модель
+Барабаши — Альберт), поэтому степени распределены по степенному закону:
+у большинства пара десятков друзей, у немногих — тысячи. Популярность
+групп, число лайков и комментариев тоже имеют тяжёлый хвост (Ципф/Парето).
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from groups.models import (
+    Group, GroupMember, GroupPost, GroupPostComment, GroupPostCommentLike, GroupPostLike,
+    GroupRating, GroupSubscription,
+)
+from main import autocomplete
+from main.models import (
+    Chat, ChatParticipant, Friendship, Message, Notification, Post, PostComment,
+    PostCommentLike, PostLike, Profile,
+)
+from main.notifications import LAST_ACTORS
+
+FIRST_NAMES = [
+    'Александр', 'Мария', 'Дмитрий', 'Анна', 'Иван', 'Елена', 'Сергей', 'Ольга',
+    'Андрей', 'Наталья', 'Михаил', 'Татьяна', 'Алексей', 'Ирина', 'Никита', 'Светлана',
+]
+LAST_NAMES = [
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов',
+    'Михайлов', 'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев',
+]
+WORDS = (
+    'биткоин эфир блокчейн рынок курс токен кошелёк майнинг биржа стейкинг '
+    'новости анализ прогноз рост падение график сделка портфель риск доход '
+    'сегодня завтра неделя идея вопрос ответ мнение думаю кажется отлично'
+).split()
+
+# Диапазон дат создания контента
+HISTORY_DAYS = 365
+
+
+@contextmanager
+def explicit_timestamps(*model_classes):
+    """Временно отключить auto_now/auto_now_add, чтобы задать даты вручную"""
+    saved = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.DateField) and (field.auto_now or field.auto_now_add):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Сгенерировать синтетические данные для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора')
+        parser.add_argument('--friends', type=int, default=10,
+                            help='Сколько друзей заводит каждый новый пользователь (средняя степень вдвое больше)')
+        parser.add_argument('--groups', type=int, default=None,
+                            help='Количество групп (по умолчанию users / 50)')
+        parser.add_argument('--posts', type=float, default=5,
+                            help='Постов на пользователя в среднем')
+        parser.add_argument('--chats', type=float, default=2,
+                            help='Чатов на пользователя в среднем')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Размер пачки bulk_create')
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Не пересчитывать счётчики, ленты, рекомендации и индекс')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.prefix = f"load{options['seed']}_"
+        n_users = options['users']
+        n_groups = options['groups'] if options['groups'] is not None else max(1, n_users // 50)
+        if n_users < 2:
+            raise CommandError('Нужно хотя бы 2 пользователя')
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже созданы; укажите другой --seed'
+            )
+
+        started = time.monotonic()
+        timestamped = (
+            Friendship, Post, PostComment, PostLike, PostCommentLike, Chat, Message,
+            Notification, Group, GroupMember, GroupPost, GroupPostComment, GroupPostLike,
+            GroupPostCommentLike, GroupRating, GroupSubscription,
+        )
+        with explicit_timestamps(*timestamped):
+            users = self.create_users(n_users)
+            friends = self.create_friendships(users, options['friends'])
+            groups = self.create_groups(users, n_groups)
+            posts = self.create_posts(users, friends, options['posts'])
+            comments = self.create_comments(PostComment, posts, users)
+            self.create_likes(PostLike, 'post', posts, users)
+            self.create_likes(PostCommentLike, 'comment', comments, users)
+            group_posts = self.create_group_posts(groups)
+            group_comments = self.create_comments(GroupPostComment, group_posts, users)
+            self.create_likes(GroupPostLike, 'post', group_posts, users)
+            self.create_likes(GroupPostCommentLike, 'comment', group_comments, users)
+            self.create_chats(users, friends, options['chats'])
+            self.create_notifications(posts)
+        autocomplete.invalidate()
+        self.stdout.write(f'Данные созданы за {time.monotonic() - started:.1f} с')
+
+        if not options['skip_rebuild']:
+            for command, args in (
+                ('reconcile_counters', []),
+                ('rebuild_timelines', []),
+                ('build_recommendations', ['--all']),
+                ('rebuild_search_index', []),
+            ):
+                self.stdout.write(f'manage.py {command}')
+                call_command(command, *args, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с (пароль пользователей: load)'
+        ))
+
+    # --- Вспомогательные функции ---
+
+    def bulk(self, model, objects):
+        """bulk_create из генератора пачками; возвращает id новых строк по порядку"""
+        watermark = model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+        count = 0
+        iterator = iter(objects)
+        with transaction.atomic():
+            while True:
+                batch = list(islice(iterator, self.batch_size))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+                count += len(batch)
+        self.stdout.write(f'{model._meta.label}: {count}')
+        return list(
+            model.objects.filter(pk__gt=watermark).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def past(self, days=HISTORY_DAYS, after=None):
+        """Случайный момент в прошлом (но не раньше after)"""
+        start = after or self.now - timedelta(days=days)
+        span = max((self.now - start).total_seconds(), 1)
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def pareto(self, mean, cap):
+        """Целое с тяжёлым хвостом и примерно заданным средним"""
+        alpha = 2.0
+        value = (self.rng.paretovariate(alpha) - 1) * mean * (alpha - 1)
+        return min(int(value), cap)
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high))).capitalize()
+
+    # --- Пользователи и граф друзей ---
+
+    def create_users(self, n):
+        password = make_password('load')
+        joined = [self.past() for _ in range(n)]
+        ids = self.bulk(User, (
+            User(
+                username=f'{self.prefix}{i}',
+                password=password,
+                date_joined=joined[i],
+                is_active=True,
+            )
+            for i in range(n)
+        ))
+        self.bulk(Profile, (
+            Profile(
+                user_id=user_id,
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                recommendations_dirty=True,
+            )
+            for user_id in ids
+        ))
+        return ids
+
+    def create_friendships(self, users, m):
+        """Предпочтительное присоединение: новая вершина связывается с m вершинами пропорционально степени"""
+        m = max(1, min(m, len(users) - 1))
+        # Каждая вершина встречается в repeated столько раз, какова её степень
+        repeated = list(users[:m])
+        edges = []
+        for user_id in users[m:]:
+            chosen = set()
+            while len(chosen) < m:
+                chosen.add(self.rng.choice(repeated))
+            edges.extend((user_id, friend_id) for friend_id in chosen)
+            repeated.extend(chosen)
+            repeated.extend([user_id] * m)
+
+        friends = {user_id: [] for user_id in users}
+        objects = []
+        for from_id, to_id in edges:
+            # Небольшая доля заявок ещё не принята
+            accepted = self.rng.random() > 0.05
+            if accepted:
+                friends[from_id].append(to_id)
+                friends[to_id].append(from_id)
+            objects.append(Friendship(
+                from_user_id=from_id, to_user_id=to_id, accepted=accepted, created=self.past(),
+            ))
+        self.bulk(Friendship, objects)
+        return friends
+
+    # --- Группы ---
+
+    def create_groups(self, users, n):
+        themes = [code for code, _ in Group.THEME_CHOICES]
+        creators = [self.rng.choice(users) for _ in range(n)]
+        created = [self.past() for _ in range(n)]
+        ids = self.bulk(Group, (
+            Group(
+                name=f'{self.text(1, 3)} {i}',
+                description=self.text(5, 30),
+                theme=self.rng.choice(themes),
+                creator_id=creators[i],
+                created=created[i],
+            )
+            for i in range(n)
+        ))
+        self.bulk(GroupMember, (
+            GroupMember(group_id=group_id, user_id=creator, role='owner', joined=when)
+            for group_id, creator, when in zip(ids, creators, created)
+        ))
+
+        # Популярность групп по закону Ципфа: k-я группа в k раз менее популярна первой
+        weights = [1 / (rank + 1) for rank in range(n)]
+        order = ids[:]
+        self.rng.shuffle(order)
+        cum_weights = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            cum_weights.append(total)
+
+        subscriptions, ratings = [], []
+        for user_id in users:
+            count = min(self.pareto(3, 50), n)
+            picked = set(self.rng.choices(order, cum_weights=cum_weights, k=count))
+            for group_id in picked:
+                when = self.past()
+                subscriptions.append(GroupSubscription(
+                    group_id=group_id, user_id=user_id, is_subscribed=True, subscribed_at=when,
+                ))
+                if self.rng.random() < 0.3:
+                    ratings.append(GroupRating(
+                        group_id=group_id, user_id=user_id,
+                        rating=self.rng.random() < 0.8, created=when,
+                    ))
+        # Создатель всегда подписан на свою группу
+        picked_pairs = {(s.group_id, s.user_id) for s in subscriptions}
+        subscriptions += [
+            GroupSubscription(group_id=group_id, user_id=creator, is_subscribed=True, subscribed_at=when)
+            for group_id, creator, when in zip(ids, creators, created)
+            if (group_id, creator) not in picked_pairs
+        ]
+        self.bulk(GroupSubscription, subscriptions)
+        self.bulk(GroupRating, ratings)
+
+        self.group_subscribers = {}
+        for subscription in subscriptions:
+            self.group_subscribers.setdefault(subscription.group_id, []).append(subscription.user_id)
+        self.group_creators = dict(zip(ids, creators))
+        return ids
+
+    # --- Посты, комментарии, лайки ---
+
+    def create_posts(self, users, friends, per_user):
+        objects = []
+        for user_id in users:
+            for _ in range(self.pareto(per_user, 500)):
+                wall_owner = user_id
+                if friends[user_id] and self.rng.random() < 0.1:
+                    # Пост на стене друга
+                    wall_owner = self.rng.choice(friends[user_id])
+                objects.append(Post(
+                    author_id=user_id, wall_owner_id=wall_owner,
+                    content=self.text(3, 60), created=self.past(),
+                ))
+        ids = self.bulk(Post, objects)
+        return [(post_id, obj.author_id, obj.created) for post_id, obj in zip(ids, objects)]
+
+    def create_group_posts(self, groups):
+        objects = []
+        for group_id in groups:
+            subscribers = self.group_subscribers.get(group_id, [])
+            # Активность группы растёт с числом подписчиков
+            for _ in range(self.pareto(2 + len(subscribers) / 10, 2000)):
+                author = self.group_creators[group_id]
+                if subscribers and self.rng.random() < 0.3:
+                    author = self.rng.choice(subscribers)
+                objects.append(GroupPost(
+                    group_id=group_id, author_id=author, content=self.text(3, 60), created=self.past(),
+                ))
+        ids = self.bulk(GroupPost, objects)
+        return [(post_id, obj.author_id, obj.created) for post_id, obj in zip(ids, objects)]
+
+    def create_comments(self, comment_model, parents, users):
+        objects = []
+        for post_id, _, created in parents:
+            for _ in range(self.pareto(2, 300)):
+                objects.append(comment_model(
+                    post_id=post_id,
+                    author_id=self.rng.choice(users),
+                    content=self.text(1, 25),
+                    created=self.past(after=created),
+                ))
+        ids = self.bulk(comment_model, objects)
+        return [(comment_id, obj.author_id, obj.created) for comment_id, obj in zip(ids, objects)]
+
+    def create_likes(self, like_model, fk_name, parents, users):
+        def generate():
+            for parent_id, _, created in parents:
+                count = min(self.pareto(4, 1000), len(users))
+                for user_id in self.rng.sample(users, count):
+                    yield like_model(
+                        **{f'{fk_name}_id': parent_id},
+                        user_id=user_id,
+                        created=self.past(after=created),
+                    )
+        self.bulk(like_model, generate())
+
+    # --- Чаты и уведомления ---
+
+    def create_chats(self, users, friends, per_user):
+        pairs = set()
+        for user_id in users:
+            if not friends[user_id]:
+                continue
+            for _ in range(self.pareto(per_user, 50)):
+                friend_id = self.rng.choice(friends[user_id])
+                pairs.add((min(user_id, friend_id), max(user_id, friend_id)))
+        pairs = sorted(pairs)
+
+        timelines = []
+        for _ in pairs:
+            started = self.past()
+            timelines.append((started, sorted(
+                self.past(after=started) for _ in range(self.pareto(20, 2000) + 1)
+            )))
+        chat_ids = self.bulk(Chat, (
+            Chat(min_user_id=low, max_user_id=high, created=started, updated=moments[-1])
+            for (low, high), (started, moments) in zip(pairs, timelines)
+        ))
+
+        message_chat_ids = []
+        messages = []
+        for chat_id, (low, high), (_, moments) in zip(chat_ids, pairs, timelines):
+            for moment in moments:
+                sender = self.rng.choice((low, high))
+                message_chat_ids.append(chat_id)
+                messages.append(Message(
+                    chat_id=chat_id, sender_id=sender, text=self.text(1, 20), created=moment,
+                ))
+        message_ids = self.bulk(Message, messages)
+        del messages
+
+        # Один участник прочитал всё, второй — случайную часть переписки
+        per_chat = {}
+        for message_id, chat_id in zip(message_ids, message_chat_ids):
+            per_chat.setdefault(chat_id, []).append(message_id)
+        participants = []
+        for chat_id, (low, high) in zip(chat_ids, pairs):
+            ids = per_chat[chat_id]
+            readers = [low, high]
+            self.rng.shuffle(readers)
+            participants.append(ChatParticipant(chat_id=chat_id, user_id=readers[0], last_read_id=ids[-1]))
+            participants.append(ChatParticipant(
+                chat_id=chat_id, user_id=readers[1], last_read_id=ids[self.rng.randrange(len(ids))],
+            ))
+        self.bulk(ChatParticipant, participants)
+
+    def create_notifications(self, posts):
+        """
+        Уведомления о лайках и комментариях к постам, схлопнутые по посту,
+        как это делает main.notifications; большая часть уже прочитана.
+        """
+        post_authors = {post_id: author_id for post_id, author_id, _ in posts}
+        first_post = posts[0][0] if posts else 0
+
+        def generate():
+            for notification_type, model, actor_field in (
+                ('like', PostLike, 'user_id'),
+                ('comment', PostComment, 'author_id'),
+            ):
+                rows = (
+                    model.objects.filter(post_id__gte=first_post)
+                    .order_by('post_id', 'created')
+                    .values_list('post_id', actor_field, 'created')
+                    .iterator(chunk_size=self.batch_size)
+                )
+                for post_id, group in groupby(rows, key=itemgetter(0)):
+                    owner = post_authors.get(post_id)
+                    events = [(actor_id, created) for _, actor_id, created in group if actor_id != owner]
+                    if owner is None or not events:
+                        continue
+                    # Последние авторы — первыми, без повторов
+                    latest = []
+                    for actor_id, _ in reversed(events):
+                        if actor_id not in latest:
+                            latest.append(actor_id)
+                        if len(latest) == LAST_ACTORS:
+                            break
+                    yield Notification(
+                        user_id=owner,
+                        notification_type=notification_type,
+                        from_user_id=latest[0],
+                        post_id=post_id,
+                        created=events[0][1],
+                        updated=events[-1][1],
+                        read=self.rng.random() < 0.7,
+                        actors_count=len({actor_id for actor_id, _ in events}),
+                        last_actors=latest,
+                    )
+        self.bulk(Notification, generate())
@@ -0,0 +1,115 @@
+"""
+Учёт SQL-запросов на каждый HTTP-запрос.
+
+QueryBudgetMiddleware через ``connection.execute_wrapper`` считает
+запросы и время в базе. Каждый запрос сводится к "форме": параметры уже
+вынесены драйвером, а списки ``IN (%s, %s, ...)`` схлопываются. Повторы
+одной формы — признак N+1. Результат уходит:
+
+* в заголовок ``Server-Timing`` (db, app) — его видно во вкладке Network браузера;
+* в лог ``main.queries`` одной JSON-строкой, если запрос медленнее
+  SLOW_REQUEST_MS или превысил бюджет;
+* в проверку бюджета QUERY_BUDGETS (имя URL -> максимум запросов). При
+  QUERY_BUDGET_ACTION = 'raise' превышение бросает QueryBudgetExceeded —
+  удобно в тестах и при разработке.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('main.queries')
+
+# Сколько самых частых форм запросов попадает в отчёт
+TOP_SHAPES = 5
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def sql_shape(sql):
+    """Форма запроса без конкретных значений"""
+    shape = _IN_LIST_RE.sub('IN (...)', sql)
+    return _NUMBER_RE.sub('N', shape)
+
+
+class QueryRecorder:
+    """execute_wrapper: количество, время и формы запросов"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated(self, limit=TOP_SHAPES):
+        return [
+            {'sql': shape, 'count': count}
+            for shape, count in self.shapes.most_common(limit)
+            if count > 1
+        ]
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.action = getattr(settings, 'QUERY_BUDGET_ACTION', 'warn')
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+            f'app;dur={total_ms - db_ms:.1f}'
+        )
+
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        budget = self.budgets.get(url_name)
+        over_budget = budget is not None and recorder.count > budget
+
+        if over_budget or total_ms >= self.slow_ms:
+            report = {
+                'event': 'over_budget' if over_budget else 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'url_name': url_name,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'budget': budget,
+                'db_ms': round(db_ms, 1),
+                'total_ms': round(total_ms, 1),
+                'repeated': recorder.repeated(),
+            }
+            logger.warning(json.dumps(report, ensure_ascii=False))
+            if over_budget and self.action == 'raise':
+                raise QueryBudgetExceeded(
+                    f'{url_name}: {recorder.count} запросов при бюджете {budget}'
+                )
+        return response
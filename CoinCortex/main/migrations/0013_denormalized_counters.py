@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:19
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = [
+    ('Post', 'PostLike', 'post', 'likes_count'),
+    ('Post', 'PostComment', 'post', 'comments_count'),
+    ('PostComment', 'PostCommentLike', 'comment', 'likes_count'),
+]
+
+
+def fill_counters(apps, schema_editor):
+    for parent_name, child_name, fk_name, field in COUNTERS:
+        parent = apps.get_model('main', parent_name)
+        child = apps.get_model('main', child_name)
+        counted = (
+            child.objects.filter(**{fk_name: OuterRef('pk')})
+            .order_by()
+            .values(fk_name)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        parent.objects.update(
+            **{field: Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Лайков'),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Лайков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
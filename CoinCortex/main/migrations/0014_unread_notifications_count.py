@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:20
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_unread(apps, schema_editor):
+    Profile = apps.get_model('main', 'Profile')
+    Notification = apps.get_model('main', 'Notification')
+    unread = (
+        Notification.objects.filter(user_id=OuterRef('user_id'), read=False)
+        .order_by()
+        .values('user_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Profile.objects.update(
+        unread_notifications_count=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifications_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Непрочитанных уведомлений'),
+        ),
+        migrations.RunPython(fill_unread, migrations.RunPython.noop),
+    ]
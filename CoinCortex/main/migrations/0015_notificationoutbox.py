@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('groups', '0004_denormalized_counters'),
+        ('main', '0014_unread_notifications_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('add', 'Создать'), ('cancel', 'Отменить')], default='add', max_length=10, verbose_name='Действие')),
+                ('notification_type', models.CharField(choices=[('like', 'Лайк'), ('comment', 'Комментарий'), ('comment_like', 'Лайк на комментарий'), ('group_like', 'Лайк в группе'), ('group_comment', 'Комментарий в группе'), ('group_comment_like', 'Лайк на комментарий в группе'), ('friend_request', 'Заявка в друзья'), ('friend_accepted', 'Заявка принята')], max_length=20, verbose_name='Тип уведомления')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Обработать после')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.postcomment', verbose_name='Комментарий')),
+                ('from_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='От пользователя')),
+                ('group_comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='groups.grouppostcomment', verbose_name='Комментарий группы')),
+                ('group_post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='groups.grouppost', verbose_name='Пост группы')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Событие уведомления',
+                'verbose_name_plural': 'Очередь уведомлений',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['available_at', 'id'], name='main_outbox_available_idx')],
+            },
+        ),
+    ]
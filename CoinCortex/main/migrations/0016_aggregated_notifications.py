@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:24
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_aggregates(apps, schema_editor):
+    Notification = apps.get_model('main', 'Notification')
+    Notification.objects.update(updated=F('created'))
+    batch = []
+    for notification in Notification.objects.filter(from_user__isnull=False).only('id', 'from_user_id').iterator():
+        notification.last_actors = [notification.from_user_id]
+        batch.append(notification)
+        if len(batch) >= 1000:
+            Notification.objects.bulk_update(batch, ['last_actors'])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ['last_actors'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notification',
+            options={'ordering': ['-updated'], 'verbose_name': 'Уведомление', 'verbose_name_plural': 'Уведомления'},
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='actors_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='Количество авторов'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='last_actors',
+            field=models.JSONField(blank=True, default=list, verbose_name='Последние авторы'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='updated',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последнее событие'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-updated'], name='main_notif_user_updated_idx'),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_watermarks(apps, schema_editor):
+    ChatParticipant = apps.get_model('main', 'ChatParticipant')
+    Message = apps.get_model('main', 'Message')
+    batch = []
+    for member in ChatParticipant.objects.all().iterator():
+        incoming = Message.objects.filter(chat_id=member.chat_id).exclude(sender_id=member.user_id)
+        first_unread = incoming.filter(read=False).order_by('id').values_list('id', flat=True).first()
+        if first_unread is not None:
+            member.last_read_id = first_unread - 1
+        else:
+            member.last_read_id = (
+                Message.objects.filter(chat_id=member.chat_id)
+                .order_by('-id').values_list('id', flat=True).first() or 0
+            )
+        batch.append(member)
+        if len(batch) >= 1000:
+            ChatParticipant.objects.bulk_update(batch, ['last_read_id'])
+            batch = []
+    if batch:
+        ChatParticipant.objects.bulk_update(batch, ['last_read_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0016_aggregated_notifications'),
+    ]
+
+    operations = [
+        # Промежуточная модель поверх уже существующей таблицы M2M
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ChatParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='main.chat')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'main_chat_participants',
+                        'unique_together': {('chat', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='chat',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='chats', through='main.ChatParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0, verbose_name='Последнее прочитанное сообщение'),
+        ),
+        migrations.RunPython(fill_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='read',
+        ),
+    ]
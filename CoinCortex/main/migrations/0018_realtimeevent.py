@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_chat_read_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealtimeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=100, verbose_name='Канал')),
+                ('payload', models.JSONField(verbose_name='Данные')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Событие реального времени',
+                'verbose_name_plural': 'События реального времени',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['channel', 'id'], name='main_realtime_channel_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_pair_keys(apps, schema_editor):
+    Chat = apps.get_model('main', 'Chat')
+    ChatParticipant = apps.get_model('main', 'ChatParticipant')
+    Message = apps.get_model('main', 'Message')
+
+    members = {}
+    for chat_id, user_id in ChatParticipant.objects.values_list('chat_id', 'user_id'):
+        members.setdefault(chat_id, set()).add(user_id)
+
+    by_pair = {}
+    for chat_id in sorted(members):
+        users = members[chat_id]
+        if 1 <= len(users) <= 2:
+            by_pair.setdefault((min(users), max(users)), []).append(chat_id)
+
+    for (low, high), chat_ids in by_pair.items():
+        keep, duplicates = chat_ids[0], chat_ids[1:]
+        if duplicates:
+            # Дубликаты, созданные параллельными запросами, сливаем в первый чат
+            Message.objects.filter(chat_id__in=duplicates).update(chat_id=keep)
+            for member in ChatParticipant.objects.filter(chat_id=keep):
+                marks = ChatParticipant.objects.filter(
+                    chat_id__in=chat_ids, user_id=member.user_id
+                ).values_list('last_read_id', flat=True)
+                member.last_read_id = min(marks)
+                member.save(update_fields=['last_read_id'])
+            Chat.objects.filter(id__in=duplicates).delete()
+        Chat.objects.filter(id=keep).update(min_user_id=low, max_user_id=high)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0018_realtimeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='max_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='min_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_pair_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('min_user', 'max_user'), name='main_chat_unique_pair'),
+        ),
+    ]
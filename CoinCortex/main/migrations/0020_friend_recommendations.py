@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0019_chat_pair_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='recommendations_dirty',
+            field=models.BooleanField(db_index=True, default=True, editable=False, verbose_name='Пересчитать рекомендации'),
+        ),
+        migrations.CreateModel(
+            name='FriendRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('common_groups', models.JSONField(blank=True, default=list, verbose_name='Общие сообщества')),
+                ('mutual_friends_count', models.PositiveIntegerField(default=0, verbose_name='Общих друзей')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кандидат')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_recommendations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация друга',
+                'verbose_name_plural': 'Рекомендации друзей',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['user', '-score'], name='main_friendrec_user_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='friendrecommendation',
+            constraint=models.UniqueConstraint(fields=('user', 'candidate'), name='main_friendrec_unique'),
+        ),
+    ]
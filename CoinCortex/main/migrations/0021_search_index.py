@@ -0,0 +1,55 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Документы: (код вида в rowid, SELECT id, title, body)
+DOCUMENTS = [
+    (0, "SELECT u.id AS id, "
+        "u.username || ' ' || COALESCE(p.first_name, '') || ' ' || COALESCE(p.last_name, '') AS title, "
+        "'' AS body "
+        "FROM auth_user u LEFT JOIN main_profile p ON p.user_id = u.id"),
+    (1, "SELECT id, name AS title, description AS body FROM groups_group"),
+    (2, "SELECT id, name AS title, description AS body FROM main_community"),
+    (3, "SELECT id, '' AS title, content AS body FROM main_post"),
+    (4, "SELECT id, '' AS title, content AS body FROM groups_grouppost"),
+]
+
+
+def _normalize(column):
+    return f"REPLACE(REPLACE({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        # Без FTS5 поиск работает через icontains
+        return
+    try:
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS main_search_index USING fts5('
+            'title, body, tokenize = "unicode61 remove_diacritics 2")'
+        )
+    except OperationalError:
+        # SQLite собран без FTS5
+        return
+    for code, select in DOCUMENTS:
+        schema_editor.execute(
+            'INSERT INTO main_search_index (rowid, title, body) '
+            f'SELECT id * 8 + {code}, {_normalize("title")}, {_normalize("body")} '
+            f'FROM ({select})'
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS main_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_friend_recommendations'),
+        ('groups', '0005_group_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
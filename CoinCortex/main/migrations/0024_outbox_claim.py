@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='claimed_by',
+            field=models.CharField(blank=True, db_index=True, max_length=32, verbose_name='Обработчик'),
+        ),
+    ]
@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.db.models import Avg
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from django.utils import timezone
 
+from .chats import ChatQuerySet
+from .engagement import EngagementQuerySet
+
 
 class Community(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Название")
@@ -12,6 +15,7 @@ class Community(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_communities', verbose_name="Создатель")
     members = models.ManyToManyField(User, related_name='joined_communities', blank=True, verbose_name="Участники")
     avatar = models.ImageField(upload_to='communities/', null=True, blank=True, verbose_name="Аватар")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Варианты изображения')
     created = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     
     class Meta:
@@ -25,9 +29,14 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
     image = models.ImageField(upload_to='posts/images/', null=True, blank=True, verbose_name='Изображение')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Варианты изображения')
     created = models.DateTimeField(auto_now_add=True)
     wall_owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wall_posts')
     community = models.ForeignKey(Community, on_delete=models.CASCADE, null=True, blank=True, related_name='posts', verbose_name="Сообщество")
+    likes_count = models.IntegerField(default=0, editable=False, verbose_name='Лайков')
+    comments_count = models.IntegerField(default=0, editable=False, verbose_name='Комментариев')
+
+    objects = EngagementQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Пост"
@@ -43,11 +52,11 @@ class Post(models.Model):
     
     def get_likes_count(self):
         """Получить количество лайков"""
-        return PostLike.objects.filter(post=self).count()
+        return self.likes_count
     
     def get_comments_count(self):
         """Получить количество комментариев"""
-        return PostComment.objects.filter(post=self).count()
+        return self.comments_count
     
     def get_total_engagement(self):
         """Получить общую активность (лайки + комментарии)"""
@@ -81,6 +90,9 @@ class PostComment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='post_comments', verbose_name='Автор')
     content = models.TextField(verbose_name='Содержание')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    likes_count = models.IntegerField(default=0, editable=False, verbose_name='Лайков')
+
+    objects = EngagementQuerySet.as_manager()
     
     class Meta:
         ordering = ['created']
@@ -96,7 +108,7 @@ class PostComment(models.Model):
     
     def get_likes_count(self):
         """Получить количество лайков"""
-        return PostCommentLike.objects.filter(comment=self).count()
+        return self.likes_count
     
     def is_liked_by(self, user):
         """Проверить, лайкнул ли пользователь комментарий"""
@@ -124,10 +136,14 @@ class PostCommentLike(models.Model):
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Варианты изображения')
     bio = models.TextField(max_length=500, blank=True, verbose_name='Описание профиля')
     first_name = models.CharField(max_length=100, blank=True, verbose_name='Имя')
     last_name = models.CharField(max_length=100, blank=True, verbose_name='Фамилия')
     birth_date = models.DateField(null=True, blank=True, verbose_name='Дата рождения')
+    unread_notifications_count = models.IntegerField(default=0, editable=False, verbose_name='Непрочитанных уведомлений')
+    # Рекомендации друзей нужно пересчитать (см. main.recommendations)
+    recommendations_dirty = models.BooleanField(default=True, db_index=True, editable=False, verbose_name='Пересчитать рекомендации')
 
     def __str__(self):
         return f'Profile of {self.user.username}'
@@ -165,27 +181,29 @@ class Friendship(models.Model):
 # Добавь этот метод в модель User для удобства
 def get_friends(self):
     """Получить всех принятых друзей пользователя"""
-    sent = User.objects.filter(
-        friendship_requests_received__from_user=self,
-        friendship_requests_received__accepted=True
-    )
-    received = User.objects.filter(
-        friendship_requests_sent__to_user=self,
-        friendship_requests_sent__accepted=True
-    )
-    return sent.union(received)
+    from .friends import friend_ids
+
+    return User.objects.filter(id__in=friend_ids(self))
 
 User.add_to_class('get_friends', get_friends)
 
 
 class Chat(models.Model):
     """Модель чата между двумя пользователями"""
-    participants = models.ManyToManyField(User, related_name='chats')
+    participants = models.ManyToManyField(User, related_name='chats', through='ChatParticipant')
+    # Канонический ключ личного чата: (меньший id, больший id) участников
+    min_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    max_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+
+    objects = ChatQuerySet.as_manager()
     
     class Meta:
         ordering = ['-updated']
+        constraints = [
+            models.UniqueConstraint(fields=['min_user', 'max_user'], name='main_chat_unique_pair'),
+        ]
     
     def __str__(self):
         return f"Chat {self.id}"
@@ -198,13 +216,26 @@ class Chat(models.Model):
         """Получить последнее сообщение в чате"""
         return self.messages.order_by('-created').first()
 
+class ChatParticipant(models.Model):
+    """Участник чата и его отметка прочтения"""
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_memberships')
+    # Все сообщения с id <= last_read_id считаются прочитанными
+    last_read_id = models.BigIntegerField(default=0, verbose_name='Последнее прочитанное сообщение')
+
+    class Meta:
+        db_table = 'main_chat_participants'
+        unique_together = [('chat', 'user')]
+
+    def __str__(self):
+        return f"{self.user} в чате {self.chat_id}"
+
 class Message(models.Model):
     """Модель сообщения в чате"""
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
-    read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['created']
@@ -215,12 +246,18 @@ class Message(models.Model):
 # Добавляем метод к User для удобства
 def get_or_create_chat(self, other_user):
     """Получить или создать чат с другим пользователем"""
-    # Ищем чат, где оба пользователя являются участниками
-    chats = Chat.objects.filter(participants=self).filter(participants=other_user)
-    chat = chats.first()
-    if not chat:
-        chat = Chat.objects.create()
-        chat.participants.add(self, other_user)
+    # Один запрос по уникальному ключу пары участников
+    low, high = sorted((self.id, other_user.id))
+    chat = Chat.objects.filter(min_user_id=low, max_user_id=high).first()
+    if chat:
+        return chat
+    try:
+        with transaction.atomic():
+            chat = Chat.objects.create(min_user_id=low, max_user_id=high)
+            chat.participants.add(self, other_user)
+    except IntegrityError:
+        # Чат успели создать параллельным запросом
+        chat = Chat.objects.get(min_user_id=low, max_user_id=high)
     return chat
 
 User.add_to_class('get_or_create_chat', get_or_create_chat)
@@ -247,32 +284,171 @@ class Notification(models.Model):
     comment = models.ForeignKey(PostComment, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True, verbose_name='Комментарий')
     group_comment = models.ForeignKey('groups.GroupPostComment', on_delete=models.CASCADE, related_name='notifications', null=True, blank=True, verbose_name='Комментарий группы')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated = models.DateTimeField(default=timezone.now, verbose_name='Последнее событие')
     read = models.BooleanField(default=False, verbose_name='Прочитано')
-    
+    # Однотипные события по одному объекту схлопываются в одну строку:
+    # from_user — последний автор, last_actors — id последних авторов
+    actors_count = models.PositiveIntegerField(default=1, verbose_name='Количество авторов')
+    last_actors = models.JSONField(default=list, blank=True, verbose_name='Последние авторы')
+
+    # Текст уведомления: (один автор, несколько авторов)
+    MESSAGES = {
+        'like': ('поставил(а) лайк вашему посту', 'поставили лайк вашему посту'),
+        'comment': ('оставил(а) комментарий к вашему посту', 'оставили комментарии к вашему посту'),
+        'comment_like': ('поставил(а) лайк вашему комментарию', 'поставили лайк вашему комментарию'),
+        'group_like': ('поставил(а) лайк вашему посту в группе', 'поставили лайк вашему посту в группе'),
+        'group_comment': ('оставил(а) комментарий к вашему посту в группе', 'оставили комментарии к вашему посту в группе'),
+        'group_comment_like': ('поставил(а) лайк вашему комментарию в группе', 'поставили лайк вашему комментарию в группе'),
+        'friend_request': ('отправил(а) вам заявку в друзья', 'отправили вам заявку в друзья'),
+        'friend_accepted': ('принял(а) вашу заявку в друзья', 'приняли вашу заявку в друзья'),
+    }
+
     class Meta:
-        ordering = ['-created']
+        ordering = ['-updated']
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
+        indexes = [
+            models.Index(fields=['user', '-updated'], name='main_notif_user_updated_idx'),
+        ]
     
     def __str__(self):
         return f'{self.get_notification_type_display()} для {self.user.username}'
+
+    def get_actors_display(self):
+        """Авторы события: "Иван", "Иван и Пётр", "Иван, Пётр и ещё 22" """
+        actors = getattr(self, 'actors', None) or [self.from_user]
+        names = [actor.username for actor in actors if actor is not None]
+        if not names:
+            return ''
+        others = self.actors_count - len(names)
+        if others > 0:
+            return f'{", ".join(names)} и ещё {others}'
+        if len(names) > 1:
+            return f'{", ".join(names[:-1])} и {names[-1]}'
+        return names[0]
     
     def get_message(self):
         """Получить текст уведомления"""
-        if self.notification_type == 'like':
-            return f'{self.from_user.username} поставил(а) лайк вашему посту'
-        elif self.notification_type == 'comment':
-            return f'{self.from_user.username} оставил(а) комментарий к вашему посту'
-        elif self.notification_type == 'comment_like':
-            return f'{self.from_user.username} поставил(а) лайк вашему комментарию'
-        elif self.notification_type == 'group_like':
-            return f'{self.from_user.username} поставил(а) лайк вашему посту в группе'
-        elif self.notification_type == 'group_comment':
-            return f'{self.from_user.username} оставил(а) комментарий к вашему посту в группе'
-        elif self.notification_type == 'group_comment_like':
-            return f'{self.from_user.username} поставил(а) лайк вашему комментарию в группе'
-        elif self.notification_type == 'friend_request':
-            return f'{self.from_user.username} отправил(а) вам заявку в друзья'
-        elif self.notification_type == 'friend_accepted':
-            return f'{self.from_user.username} принял(а) вашу заявку в друзья'
-        return f'{self.get_notification_type_display()}'
\ No newline at end of file
+        if self.notification_type not in self.MESSAGES:
+            return f'{self.get_notification_type_display()}'
+        single, plural = self.MESSAGES[self.notification_type]
+        return f'{self.get_actors_display()} {plural if self.actors_count > 1 else single}'
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты пользователя (заполняется при публикации)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries', verbose_name='Пользователь')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries', null=True, blank=True, verbose_name='Пост')
+    group_post = models.ForeignKey('groups.GroupPost', on_delete=models.CASCADE, related_name='feed_entries', null=True, blank=True, verbose_name='Пост группы')
+    created = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-created', '-id']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(fields=['user', '-created'], name='main_feed_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='main_feed_unique_post'),
+            models.UniqueConstraint(fields=['user', 'group_post'], name='main_feed_unique_group_post'),
+        ]
+
+    def __str__(self):
+        return f'Feed entry for {self.user_id} at {self.created}'
+
+
+class NotificationOutbox(models.Model):
+    """Очередь событий для асинхронного создания уведомлений"""
+    ADD = 'add'
+    CANCEL = 'cancel'
+    ACTION_CHOICES = [
+        (ADD, 'Создать'),
+        (CANCEL, 'Отменить'),
+    ]
+
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=ADD, verbose_name='Действие')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='Пользователь')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES, verbose_name='Тип уведомления')
+    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True, blank=True, verbose_name='От пользователя')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', null=True, blank=True, verbose_name='Пост')
+    group_post = models.ForeignKey('groups.GroupPost', on_delete=models.CASCADE, related_name='+', null=True, blank=True, verbose_name='Пост группы')
+    comment = models.ForeignKey(PostComment, on_delete=models.CASCADE, related_name='+', null=True, blank=True, verbose_name='Комментарий')
+    group_comment = models.ForeignKey('groups.GroupPostComment', on_delete=models.CASCADE, related_name='+', null=True, blank=True, verbose_name='Комментарий группы')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='Обработать после')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    # Метка обработчика, который забрал событие (см. main.notifications.claim)
+    claimed_by = models.CharField(max_length=32, blank=True, db_index=True, verbose_name='Обработчик')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Событие уведомления'
+        verbose_name_plural = 'Очередь уведомлений'
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='main_outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.notification_type} для {self.user_id}'
+
+
+class RealtimeEvent(models.Model):
+    """Событие для доставки в реальном времени между процессами (DatabaseBroker)"""
+    channel = models.CharField(max_length=100, verbose_name='Канал')
+    payload = models.JSONField(verbose_name='Данные')
+    created = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Событие реального времени'
+        verbose_name_plural = 'События реального времени'
+        indexes = [
+            models.Index(fields=['channel', 'id'], name='main_realtime_channel_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.channel} #{self.id}'
+
+
+class FriendRecommendation(models.Model):
+    """Предрассчитанный кандидат в друзья (manage.py build_recommendations)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_recommendations', verbose_name='Пользователь')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='Кандидат')
+    score = models.FloatField(verbose_name='Оценка')
+    common_groups = models.JSONField(default=list, blank=True, verbose_name='Общие сообщества')
+    mutual_friends_count = models.PositiveIntegerField(default=0, verbose_name='Общих друзей')
+    updated = models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Рекомендация друга'
+        verbose_name_plural = 'Рекомендации друзей'
+        indexes = [
+            models.Index(fields=['user', '-score'], name='main_friendrec_user_score_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='main_friendrec_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.candidate_id} для {self.user_id} ({self.score})'
+
+
+class MediaBlob(models.Model):
+    """Файл в контентно-адресуемом хранилище (main.storage) и число ссылок на него"""
+    name = models.CharField(max_length=100, unique=True, verbose_name='Путь')
+    size = models.BigIntegerField(default=0, verbose_name='Размер')
+    refcount = models.IntegerField(default=0, verbose_name='Ссылок')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')
+    updated = models.DateTimeField(auto_now=True, verbose_name='Изменён')
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        indexes = [
+            models.Index(fields=['refcount', 'updated'], name='main_mediablob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
@@ -0,0 +1,248 @@
+"""
+Асинхронная доставка уведомлений через outbox.
+
+Обработчики запросов не создают Notification сами: notify() и
+cancel_notification() делают одну вставку в NotificationOutbox, а процесс
+``manage.py run_notification_worker`` пачками разбирает очередь,
+схлопывает повторные лайк/анлайк одного и того же события и создаёт
+уведомления через bulk_create. Обработчик забирает события своей меткой
+(claim()), поэтому обработчиков можно запускать несколько. Однотипные
+события по одному объекту в пределах AGGREGATE_WINDOW не создают новых
+строк, а дописываются в существующую (счётчик авторов и последние авторы). Если пачка не
+доставилась, события разбираются по одному, и только сбойные
+откладываются с экспоненциальной задержкой. Брокер не нужен — достаточно SQLite.
+"""
+import logging
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters
+from .models import Notification, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+TARGET_FIELDS = ('post', 'group_post', 'comment', 'group_comment')
+
+# После стольких неудачных попыток событие отбрасывается
+MAX_ATTEMPTS = 5
+
+# Через столько забранное, но не обработанное событие снова доступно
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Типы уведомлений, которые схлопываются по объекту ("Иван и ещё 24 ...")
+AGGREGATED_TYPES = {
+    'like', 'comment', 'comment_like',
+    'group_like', 'group_comment', 'group_comment_like',
+}
+# Окно, в пределах которого события дописываются в одну строку
+AGGREGATE_WINDOW = timedelta(hours=24)
+# Сколько последних авторов хранится в строке
+LAST_ACTORS = 3
+
+
+def _enqueue(action, user, notification_type, from_user, targets):
+    if from_user is not None and user.pk == from_user.pk:
+        # О собственных действиях не уведомляем
+        return None
+    event = NotificationOutbox(
+        action=action,
+        user=user,
+        notification_type=notification_type,
+        from_user=from_user,
+        **targets,
+    )
+    if not getattr(settings, 'NOTIFICATION_OUTBOX', True):
+        # Синхронный режим (без отдельного процесса-обработчика)
+        if action == NotificationOutbox.ADD:
+            _deliver([event])
+        return None
+    event.save()
+    return event
+
+
+def notify(user, notification_type, from_user=None, **targets):
+    """Поставить в очередь уведомление для user"""
+    return _enqueue(NotificationOutbox.ADD, user, notification_type, from_user, targets)
+
+
+def cancel_notification(user, notification_type, from_user=None, **targets):
+    """Отменить ещё не доставленное уведомление (например, лайк сразу сняли)"""
+    return _enqueue(NotificationOutbox.CANCEL, user, notification_type, from_user, targets)
+
+
+def _event_key(event):
+    return (
+        event.user_id,
+        event.notification_type,
+        event.from_user_id,
+    ) + tuple(getattr(event, f'{field}_id') for field in TARGET_FIELDS)
+
+
+def collapse(events):
+    """Оставить по каждому событию только последнее действие (add/cancel)"""
+    final = {}
+    for event in events:
+        key = _event_key(event)
+        final.pop(key, None)
+        final[key] = event
+    return [event for event in final.values() if event.action == NotificationOutbox.ADD]
+
+
+def _target_key(event):
+    return (event.user_id, event.notification_type) + tuple(
+        getattr(event, f'{field}_id') for field in TARGET_FIELDS
+    )
+
+
+def _add_actor(notification, actor_id):
+    """Сделать actor_id последним автором уведомления"""
+    actors = [i for i in notification.last_actors if i != actor_id]
+    if len(actors) == len(notification.last_actors):
+        # Новый автор; повторный лайк того же автора счётчик не увеличивает
+        notification.actors_count += 1
+    notification.last_actors = [actor_id] + actors[:LAST_ACTORS - 1]
+    notification.from_user_id = actor_id
+
+
+def _deliver(events):
+    """
+    Создать или дополнить уведомления и увеличить счётчики непрочитанных.
+    События одного типа по одному объекту в пределах AGGREGATE_WINDOW
+    дописываются в уже существующую строку.
+    """
+    now = timezone.now()
+    existing = {}
+    aggregated = [e for e in events if e.notification_type in AGGREGATED_TYPES]
+    if aggregated:
+        candidates = Notification.objects.filter(
+            user_id__in={e.user_id for e in aggregated},
+            notification_type__in={e.notification_type for e in aggregated},
+            updated__gte=now - AGGREGATE_WINDOW,
+        ).order_by('updated')
+        # Если строк несколько, побеждает самая свежая
+        existing = {_target_key(n): n for n in candidates}
+
+    created, changed, reopened = [], {}, Counter()
+    for event in events:
+        key = _target_key(event)
+        notification = existing.get(key) if event.notification_type in AGGREGATED_TYPES else None
+        if notification is None:
+            notification = Notification(
+                user_id=event.user_id,
+                notification_type=event.notification_type,
+                from_user_id=event.from_user_id,
+                updated=now,
+                actors_count=1,
+                last_actors=[event.from_user_id] if event.from_user_id else [],
+                **{f'{field}_id': getattr(event, f'{field}_id') for field in TARGET_FIELDS},
+            )
+            created.append(notification)
+            existing[key] = notification
+            continue
+        if event.from_user_id:
+            _add_actor(notification, event.from_user_id)
+        notification.updated = now
+        if notification.pk:
+            if notification.read:
+                notification.read = False
+                reopened[notification.user_id] += 1
+            changed[notification.pk] = notification
+
+    with transaction.atomic():
+        Notification.objects.bulk_create(created)
+        if changed:
+            Notification.objects.bulk_update(
+                changed.values(),
+                ['from_user', 'updated', 'read', 'actors_count', 'last_actors'],
+            )
+        # bulk_create не отправляет сигналы, поэтому счётчики обновляем сами
+        per_user = Counter(n.user_id for n in created) + reopened
+        for user_id, count in per_user.items():
+            counters.bump_unread(user_id, count)
+    return len(created) + len(changed)
+
+
+def claim(batch_size=500):
+    """
+    Забрать пачку готовых событий для этого обработчика.
+    Один UPDATE помечает события меткой и откладывает их на CLAIM_TIMEOUT,
+    поэтому два обработчика не получат одно событие дважды, а события
+    упавшего обработчика после таймаута заберёт другой.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ready = NotificationOutbox.objects.filter(available_at__lte=now).order_by('id').values('id')
+    NotificationOutbox.objects.filter(id__in=ready[:batch_size], available_at__lte=now).update(
+        claimed_by=token, available_at=now + CLAIM_TIMEOUT
+    )
+    return list(NotificationOutbox.objects.filter(claimed_by=token).order_by('id'))
+
+
+def _process(events):
+    with transaction.atomic():
+        _deliver(collapse(events))
+        NotificationOutbox.objects.filter(id__in=[event.id for event in events]).delete()
+
+
+def process_outbox(batch_size=500):
+    """
+    Разобрать одну пачку очереди.
+    Возвращает количество обработанных событий (0 — очередь пуста).
+    Если пачка целиком не доставилась, события разбираются по одному
+    (вместе с действиями над тем же уведомлением), и повторяются или
+    отбрасываются только сбойные.
+    """
+    batch = claim(batch_size)
+    if not batch:
+        return 0
+    try:
+        _process(batch)
+    except Exception as exc:
+        logger.warning('Не удалось доставить пачку из %d уведомлений: %s', len(batch), exc)
+        groups = {}
+        for event in batch:
+            groups.setdefault(_event_key(event), []).append(event)
+        for events in groups.values():
+            try:
+                _process(events)
+            except Exception as exc:
+                logger.exception('Не удалось доставить уведомление')
+                _retry_later(events, exc)
+    return len(batch)
+
+
+def _retry_later(events, exc):
+    now = timezone.now()
+    dropped = []
+    for event in events:
+        event.attempts += 1
+        if event.attempts >= MAX_ATTEMPTS:
+            dropped.append(event.id)
+            continue
+        event.available_at = now + timedelta(seconds=2 ** event.attempts)
+        event.last_error = str(exc)[:500]
+        event.claimed_by = ''
+    NotificationOutbox.objects.bulk_update(
+        [event for event in events if event.id not in dropped],
+        ['attempts', 'available_at', 'last_error', 'claimed_by'],
+    )
+    if dropped:
+        logger.error('Отброшено %d уведомлений после %d попыток', len(dropped), MAX_ATTEMPTS)
+        NotificationOutbox.objects.filter(id__in=dropped).delete()
+
+
+def attach_actors(notifications):
+    """Подгрузить последних авторов уведомлений одним запросом (notification.actors)"""
+    from django.contrib.auth.models import User
+
+    notifications = list(notifications)
+    ids = {actor_id for n in notifications for actor_id in n.last_actors}
+    users = User.objects.select_related('profile').in_bulk(ids)
+    for n in notifications:
+        n.actors = [users[actor_id] for actor_id in n.last_actors if actor_id in users]
+    return notifications
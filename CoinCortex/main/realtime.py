@@ -0,0 +1,166 @@
+"""
+Доставка событий чата в реальном времени (Server-Sent Events).
+
+Страница чата держит одно долгоживущее соединение с ``chat_stream``,
+который обслуживается ASGI-приложением из CoinCortex/asgi.py. Новые
+сообщения и изменения отметок прочтения публикуются в канал чата через
+брокер, заданный настройкой REALTIME_BROKER:
+
+* InProcessBroker — очереди asyncio внутри одного процесса;
+* DatabaseBroker — общая таблица RealtimeEvent, позволяет запускать
+  несколько процессов (например, ``uvicorn --workers 2``) без Redis.
+
+Под WSGI (``runserver``) поток недоступен, и страница чата
+откатывается к опросу ``chat_messages?after=<id>``.
+"""
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд тишины отправлять keep-alive
+KEEPALIVE_INTERVAL = 15
+
+# Максимальная длительность одного соединения. Django 4.2 не сообщает
+# потоку об отключении клиента, поэтому соединение периодически
+# закрывается сервером, а EventSource сразу переподключается.
+STREAM_MAX_AGE = 300
+
+
+def chat_channel(chat_id):
+    return f'chat:{chat_id}'
+
+
+class InProcessBroker:
+    """Брокер в памяти процесса: по очереди asyncio на каждого подписчика"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, event):
+        # publish вызывается из синхронного кода (в другом потоке),
+        # поэтому событие передаётся в цикл подписчика потокобезопасно
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def listen(self, channel, timeout=KEEPALIVE_INTERVAL):
+        """Асинхронный генератор событий канала; None — прошло timeout секунд без событий"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel, [])
+                subscribers.remove(subscriber)
+                if not subscribers:
+                    self._subscribers.pop(channel, None)
+
+
+class DatabaseBroker:
+    """Брокер поверх таблицы RealtimeEvent для нескольких процессов"""
+
+    # Как часто подписчик проверяет новые события
+    poll_interval = 0.5
+    # Сколько хранятся события
+    retention = timedelta(minutes=5)
+
+    def publish(self, channel, event):
+        from .models import RealtimeEvent
+
+        row = RealtimeEvent.objects.create(channel=channel, payload=event)
+        if row.id % 100 == 0:
+            RealtimeEvent.objects.filter(created__lt=timezone.now() - self.retention).delete()
+
+    def _fetch(self, channel, after_id):
+        from .models import RealtimeEvent
+
+        return list(
+            RealtimeEvent.objects.filter(channel=channel, id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'payload')[:100]
+        )
+
+    def _last_id(self, channel):
+        from .models import RealtimeEvent
+
+        return (
+            RealtimeEvent.objects.filter(channel=channel)
+            .order_by('-id')
+            .values_list('id', flat=True)
+            .first()
+        ) or 0
+
+    async def listen(self, channel, timeout=KEEPALIVE_INTERVAL):
+        """Асинхронный генератор событий канала; None — прошло timeout секунд без событий"""
+        last_id = await sync_to_async(self._last_id)(channel)
+        idle = 0.0
+        while True:
+            rows = await sync_to_async(self._fetch)(channel, last_id)
+            for last_id, payload in rows:
+                yield payload
+            if rows:
+                idle = 0.0
+                continue
+            await asyncio.sleep(self.poll_interval)
+            idle += self.poll_interval
+            if idle >= timeout:
+                idle = 0.0
+                yield None
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Брокер из настройки REALTIME_BROKER (один на процесс)"""
+    path = getattr(settings, 'REALTIME_BROKER', 'main.realtime.InProcessBroker')
+    return import_string(path)()
+
+
+def publish(channel, event):
+    """Опубликовать событие после фиксации текущей транзакции"""
+    def send():
+        try:
+            get_broker().publish(channel, event)
+        except Exception:
+            # Ошибка доставки не должна ломать запрос: клиент догонит опросом
+            logger.exception('Не удалось опубликовать событие в %s', channel)
+
+    transaction.on_commit(send)
+
+
+def publish_message(message):
+    publish(chat_channel(message.chat_id), {
+        'type': 'message',
+        'message': {
+            'id': message.id,
+            'text': message.text,
+            'created': message.created.isoformat(),
+            'time': timezone.localtime(message.created).strftime('%H:%M'),
+            'sender_id': message.sender_id,
+        },
+    })
+
+
+def publish_read(chat_id, user_id, read_id):
+    publish(chat_channel(chat_id), {
+        'type': 'read',
+        'user_id': user_id,
+        'read_id': read_id,
+    })
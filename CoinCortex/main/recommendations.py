@@ -0,0 +1,208 @@
+"""
+Офлайн-рекомендации друзей.
+
+``manage.py build_recommendations`` оценивает кандидатов по общим
+сообществам и общим друзьям пересечением разреженных множеств (участники
+сообществ пользователя и друзья его друзей) и сохраняет TOP_K лучших в
+FriendRecommendation. Изменения подписок и дружбы помечают затронутых
+пользователей флагом Profile.recommendations_dirty, и следующий запуск
+пересчитывает только их. Страница друзей читает готовые строки, а если
+рекомендации зрителя помечены (новый пользователь, изменились друзья),
+пересчитывает их в фоне через refresh_later(), не дожидаясь команды.
+"""
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from . import friends
+from .models import FriendRecommendation, Friendship, Profile
+
+TOP_K = 20
+
+# Вес общего сообщества и общего друга в оценке кандидата
+GROUP_WEIGHT = 1.0
+MUTUAL_FRIEND_WEIGHT = 2.0
+
+# Участники сообществ крупнее этого не порождают кандидатов
+# (но общие сообщества с кандидатами из других источников учитываются)
+LARGE_GROUP_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+# Пользователи, пересчёт которых уже поставлен в очередь
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def mark_dirty(user_ids):
+    """Пометить рекомендации пользователей устаревшими"""
+    user_ids = list(user_ids)
+    if user_ids:
+        Profile.objects.filter(user_id__in=user_ids, recommendations_dirty=False).update(
+            recommendations_dirty=True
+        )
+
+
+def mark_group_dirty(group_id):
+    """
+    Подписка изменилась: устарели рекомендации всех участников сообщества.
+    Крупные сообщества (больше LARGE_GROUP_SIZE) пропускаются: кандидатов
+    они не порождают, а массовое обновление профилей на каждую подписку
+    слишком дорого. Сам подписчик помечается отдельно (см. main.signals).
+    """
+    from groups.models import GroupSubscription
+
+    members = GroupSubscription.objects.filter(group_id=group_id, is_subscribed=True).values('user_id')
+    if members[:LARGE_GROUP_SIZE + 1].count() > LARGE_GROUP_SIZE:
+        return
+    Profile.objects.filter(user_id__in=members, recommendations_dirty=False).update(
+        recommendations_dirty=True
+    )
+
+
+def _pending_ids(user_ids):
+    """{пользователь: id пользователей с неподтверждёнными заявками в обе стороны}"""
+    result = {user_id: set() for user_id in user_ids}
+    pairs = Friendship.objects.filter(
+        Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids), accepted=False
+    ).values_list('from_user_id', 'to_user_id')
+    for a, b in pairs:
+        if a in result:
+            result[a].add(b)
+        if b in result:
+            result[b].add(a)
+    return result
+
+
+def compute(user_ids):
+    """
+    Рассчитать рекомендации для user_ids.
+    Возвращает {пользователь: [FriendRecommendation, ...]} (не сохраняя).
+    """
+    from groups.models import GroupSubscription
+
+    subscriptions = GroupSubscription.objects.filter(is_subscribed=True)
+    user_groups = {user_id: set() for user_id in user_ids}
+    for user_id, group_id in subscriptions.filter(user_id__in=user_ids).values_list('user_id', 'group_id'):
+        user_groups[user_id].add(group_id)
+
+    # Инвертированный индекс: сообщество -> участники
+    group_ids = set().union(*user_groups.values()) if user_groups else set()
+    members = {group_id: set() for group_id in group_ids}
+    for group_id, user_id in subscriptions.filter(group_id__in=group_ids).values_list('group_id', 'user_id'):
+        members[group_id].add(user_id)
+
+    friend_sets = friends.friend_ids_many(user_ids)
+    pending = _pending_ids(user_ids)
+
+    result = {}
+    for user_id in user_ids:
+        groups = user_groups[user_id]
+        common = {}
+        for group_id in groups:
+            if len(members[group_id]) > LARGE_GROUP_SIZE:
+                continue
+            for candidate in members[group_id]:
+                common.setdefault(candidate, []).append(group_id)
+        mutual = friends.friends_of_friends(user_id)
+
+        excluded = friend_sets[user_id] | pending[user_id] | {user_id}
+        scores = {}
+        for candidate in set(common) | set(mutual):
+            if candidate in excluded:
+                continue
+            if candidate not in common:
+                # Кандидат из друзей друзей: общие сообщества по индексу
+                common[candidate] = [g for g in groups if candidate in members[g]]
+            scores[candidate] = (
+                GROUP_WEIGHT * len(common[candidate])
+                + MUTUAL_FRIEND_WEIGHT * mutual.get(candidate, 0)
+            )
+
+        best = heapq.nlargest(TOP_K, scores.items(), key=lambda item: (item[1], -item[0]))
+        result[user_id] = [
+            FriendRecommendation(
+                user_id=user_id,
+                candidate_id=candidate,
+                score=score,
+                common_groups=sorted(common[candidate]),
+                mutual_friends_count=mutual.get(candidate, 0),
+            )
+            for candidate, score in best
+        ]
+    return result
+
+
+def build(user_ids):
+    """Пересчитать и сохранить рекомендации для user_ids"""
+    user_ids = list(user_ids)
+    # Флаг снимается до расчёта: изменения во время расчёта снова
+    # пометят пользователя, и он попадёт в следующий запуск
+    Profile.objects.filter(user_id__in=user_ids).update(recommendations_dirty=False)
+    rows = compute(user_ids)
+    with transaction.atomic():
+        FriendRecommendation.objects.filter(user_id__in=user_ids).delete()
+        FriendRecommendation.objects.bulk_create(
+            [row for user_rows in rows.values() for row in user_rows]
+        )
+    return len(user_ids)
+
+
+def build_dirty(chunk_size=500):
+    """Пересчитать рекомендации помеченных пользователей пачками"""
+    total = 0
+    while True:
+        batch = list(
+            Profile.objects.filter(recommendations_dirty=True)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)[:chunk_size]
+        )
+        if not batch:
+            return total
+        total += build(batch)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECOMMENDATION_WORKERS, thread_name_prefix='recommendations'
+        )
+    return _executor
+
+
+def _build_in_worker(user_id):
+    close_old_connections()
+    try:
+        build([user_id])
+    except Exception:
+        logger.exception('Не удалось пересчитать рекомендации пользователя %s', user_id)
+    finally:
+        with _scheduled_lock:
+            _scheduled.discard(user_id)
+        close_old_connections()
+
+
+def refresh_later(user_id):
+    """
+    Пересчитать рекомендации пользователя после коммита (в пуле или сразу,
+    если RECOMMENDATION_WORKERS = 0). Повторные вызовы, пока пересчёт в
+    очереди, ничего не делают.
+    """
+    def submit():
+        if not settings.RECOMMENDATION_WORKERS:
+            build([user_id])
+            return
+        with _scheduled_lock:
+            if user_id in _scheduled:
+                return
+            _scheduled.add(user_id)
+        _get_executor().submit(_build_in_worker, user_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,246 @@
+"""
+Полнотекстовый поиск пользователей, групп, сообществ и постов.
+
+Все документы лежат в одной виртуальной таблице SQLite FTS5
+(``main_search_index``) с колонками title и body. Вид документа и id
+объекта закодированы в rowid (``object_id * KIND_SLOTS + код вида``),
+поэтому переиндексация одного объекта — это удаление и вставка по rowid.
+Индекс поддерживается сигналами (main.signals), а
+``manage.py rebuild_search_index`` пересобирает его с нуля.
+
+Представления вызывают только ``search.filter(queryset, query)``: на
+SQLite с FTS5 результаты ранжируются по bm25 (совпадение в title весит
+больше, чем в body), на остальных базах выполняется прежний поиск через
+icontains по тем же полям.
+"""
+import re
+
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Q, When
+
+TABLE = 'main_search_index'
+
+# Сколько видов документов помещается в rowid
+KIND_SLOTS = 8
+
+# Больше стольких лучших совпадений поиск не возвращает
+MAX_RESULTS = 200
+
+# Веса колонок title и body для bm25
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+CREATE_TABLE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+    'title, body, tokenize = "unicode61 remove_diacritics 2")'
+)
+
+_WORD_RE = re.compile(r'\w+')
+
+
+class SearchIndex:
+    """Описание индексируемой модели: поля заголовка и текста документа"""
+
+    def __init__(self, kind, code, model, title, body=(), select_related=()):
+        self.kind = kind
+        self.code = code
+        self.model_label = model
+        self.title = title
+        self.body = body
+        self.select_related = select_related
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def queryset(self):
+        return self.model._default_manager.select_related(*self.select_related).order_by('pk')
+
+    def document(self, instance):
+        """(title, body) для объекта"""
+        return (
+            ' '.join(_values(instance, self.title)),
+            ' '.join(_values(instance, self.body)),
+        )
+
+    def fallback_filter(self, query):
+        """Прежний поиск: icontains по всем полям документа"""
+        condition = Q()
+        for path in (*self.title, *self.body):
+            condition |= Q(**{f"{path.replace('.', '__')}__icontains": query})
+        return condition
+
+
+INDEXES = [
+    SearchIndex(
+        'user', 0, 'auth.User',
+        title=('username', 'profile.first_name', 'profile.last_name'),
+        select_related=('profile',),
+    ),
+    SearchIndex('group', 1, 'groups.Group', title=('name',), body=('description',)),
+    SearchIndex('community', 2, 'main.Community', title=('name',), body=('description',)),
+    SearchIndex('post', 3, 'main.Post', title=(), body=('content',)),
+    SearchIndex('group_post', 4, 'groups.GroupPost', title=(), body=('content',)),
+]
+
+
+def _values(instance, paths):
+    for path in paths:
+        value = instance
+        try:
+            for attr in path.split('.'):
+                value = getattr(value, attr)
+        except ObjectDoesNotExist:
+            continue
+        if value:
+            yield _normalize(str(value))
+
+
+def _normalize(text):
+    # unicode61 не считает "ё" вариантом "е"
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def index_for(model):
+    """SearchIndex для модели или None, если модель не индексируется"""
+    label = model._meta.label
+    for index in INDEXES:
+        if index.model_label == label:
+            return index
+    return None
+
+
+def _rowid(index, object_id):
+    return object_id * KIND_SLOTS + index.code
+
+
+_available = {}
+
+
+def fts_available(using='default'):
+    """Есть ли на базе using таблица FTS5 (результат кэшируется на процесс)"""
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = (
+            connection.vendor == 'sqlite' and TABLE in connection.introspection.table_names()
+        )
+    return _available[using]
+
+
+def create_table(using='default'):
+    """Создать таблицу FTS5, если её нет; False, если база её не поддерживает"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+    _available.pop(using, None)
+    return fts_available(using)
+
+
+def match_expression(query):
+    """
+    Запрос FTS5 из пользовательского ввода: каждое слово — префикс,
+    все слова обязательны. Пустая строка, если слов нет.
+    """
+    words = _WORD_RE.findall(_normalize(query))
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+# --- Поддержка индекса ---
+
+def index_object(instance):
+    """Добавить или обновить документ объекта"""
+    index = index_for(type(instance))
+    using = router.db_for_write(type(instance), instance=instance)
+    if index is None or not fts_available(using):
+        return
+    title, body = index.document(instance)
+    rowid = _rowid(index, instance.pk)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+            [rowid, title, body],
+        )
+
+
+def remove_object(model, object_id):
+    """Удалить документ объекта из индекса"""
+    index = index_for(model)
+    using = router.db_for_write(model)
+    if index is None or not fts_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [_rowid(index, object_id)])
+
+
+def rebuild(index, chunk_size=1000, using='default'):
+    """Пересобрать документы одного вида; возвращает количество документов"""
+    total = 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid %% %s = %s', [KIND_SLOTS, index.code]
+        )
+        batch = []
+        for instance in index.queryset().using(using).iterator(chunk_size=chunk_size):
+            batch.append((_rowid(index, instance.pk), *index.document(instance)))
+            if len(batch) >= chunk_size:
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)', batch
+                )
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)', batch
+            )
+            total += len(batch)
+    return total
+
+
+# --- Поиск ---
+
+def ranked_ids(index, query, limit=MAX_RESULTS, using='default', within=None):
+    """
+    id объектов вида index, подходящих под query, от лучшего к худшему.
+    within — queryset, которым ограничиваются совпадения ещё до LIMIT
+    (иначе лучшие MAX_RESULTS по всему индексу могут не пересечься с ним).
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    sql = (
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid %% %s = %s'
+    )
+    params = [expression, KIND_SLOTS, index.code]
+    if within is not None:
+        within_sql, within_params = within.order_by().values('pk').query.sql_with_params()
+        sql += f' AND rowid / %s IN ({within_sql})'
+        params += [KIND_SLOTS, *within_params]
+    sql += f' ORDER BY bm25({TABLE}, %s, %s) LIMIT %s'
+    params += [TITLE_WEIGHT, BODY_WEIGHT, limit]
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [rowid // KIND_SLOTS for (rowid,) in cursor.fetchall()]
+
+
+def filter(queryset, query):
+    """
+    Отфильтровать queryset по поисковому запросу.
+    С FTS5 результат упорядочен по релевантности (не больше MAX_RESULTS
+    объектов из queryset), без FTS — icontains с исходной сортировкой queryset.
+    """
+    index = index_for(queryset.model)
+    if not fts_available(queryset.db):
+        return queryset.filter(index.fallback_filter(query)).distinct()
+    ids = ranked_ids(index, query, using=queryset.db, within=queryset)
+    if not ids:
+        return queryset.none()
+    relevance = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(relevance)
@@ -0,0 +1,264 @@
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import autocomplete, counters, feed, fragments, friends, images, realtime, recommendations, search, storage
+from .models import Post, Friendship, Notification, Message, Profile
+
+
+# --- Граф друзей (подключается раньше ленты, которая его читает) ---
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friends(sender, instance, **kwargs):
+    friends.invalidate(instance.from_user_id, instance.to_user_id)
+
+
+# --- Рекомендации друзей ---
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def friendship_recommendations_dirty(sender, instance, **kwargs):
+    # Меняются исключения обоих пользователей и общие друзья их друзей
+    users = {instance.from_user_id, instance.to_user_id}
+    users |= friends.friend_ids(instance.from_user_id) | friends.friend_ids(instance.to_user_id)
+    recommendations.mark_dirty(users)
+
+
+@receiver(post_save, sender='groups.GroupSubscription')
+@receiver(post_delete, sender='groups.GroupSubscription')
+def subscription_recommendations_dirty(sender, instance, **kwargs):
+    recommendations.mark_dirty([instance.user_id])
+    recommendations.mark_group_dirty(instance.group_id)
+
+
+# --- Материализованная лента ---
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender='groups.GroupPost')
+def fan_out_group_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_group_post(instance)
+
+
+@receiver(post_save, sender=Friendship)
+def backfill_friendship(sender, instance, **kwargs):
+    if instance.accepted:
+        feed.backfill_friend(instance.from_user_id, instance.to_user_id)
+        feed.backfill_friend(instance.to_user_id, instance.from_user_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def cleanup_friendship(sender, instance, **kwargs):
+    if instance.accepted:
+        feed.remove_friend(instance.from_user_id, instance.to_user_id)
+        feed.remove_friend(instance.to_user_id, instance.from_user_id)
+
+
+@receiver(post_save, sender='groups.GroupSubscription')
+def sync_subscription(sender, instance, **kwargs):
+    if instance.is_subscribed:
+        feed.backfill_group(instance.user_id, instance.group_id)
+    else:
+        feed.remove_group(instance.user_id, instance.group_id)
+
+
+@receiver(post_delete, sender='groups.GroupSubscription')
+def cleanup_subscription(sender, instance, **kwargs):
+    feed.remove_group(instance.user_id, instance.group_id)
+
+
+# --- Денормализованные счётчики лайков и комментариев ---
+
+def _connect_counter(sender, fk_name, field):
+    parent_attr = f'{fk_name}_id'
+
+    def increment(sender, instance, created, **kwargs):
+        if created:
+            parent = instance._meta.get_field(fk_name).related_model
+            counters.bump(parent, getattr(instance, parent_attr), field, 1)
+
+    def decrement(sender, instance, **kwargs):
+        parent = instance._meta.get_field(fk_name).related_model
+        counters.bump(parent, getattr(instance, parent_attr), field, -1)
+
+    uid = f'counter:{sender}:{field}'
+    post_save.connect(increment, sender=sender, weak=False, dispatch_uid=uid)
+    post_delete.connect(decrement, sender=sender, weak=False, dispatch_uid=uid)
+
+
+for _sender, _fk_name, _field in counters.COUNTERS:
+    _connect_counter(_sender, _fk_name, _field)
+
+
+# --- Счётчик непрочитанных уведомлений ---
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.read:
+        counters.bump_unread(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    if not instance.read:
+        counters.bump_unread(instance.user_id, -1)
+
+
+# --- Доставка сообщений чата в реальном времени ---
+
+@receiver(post_save, sender=Message)
+def push_message(sender, instance, created, **kwargs):
+    if created:
+        realtime.publish_message(instance)
+
+
+# --- Поисковый индекс ---
+
+def _connect_search(sender):
+    def reindex(sender, instance, raw=False, **kwargs):
+        if not raw:
+            search.index_object(instance)
+
+    def unindex(sender, instance, **kwargs):
+        search.remove_object(sender, instance.pk)
+
+    uid = f'search:{sender}'
+    post_save.connect(reindex, sender=sender, weak=False, dispatch_uid=uid)
+    post_delete.connect(unindex, sender=sender, weak=False, dispatch_uid=uid)
+
+
+for _index in search.INDEXES:
+    _connect_search(_index.model_label)
+
+
+@receiver(post_save, sender=Profile)
+def reindex_profile_user(sender, instance, raw=False, **kwargs):
+    # Имя и фамилия пользователя хранятся в профиле
+    if not raw:
+        search.index_object(instance.user)
+
+
+# --- Автодополнение ---
+
+def _connect_autocomplete(sender, fields):
+    def remember(sender, instance, **kwargs):
+        # __dict__: отложенные (deferred) поля не подгружаются запросом
+        instance._autocomplete_values = tuple(instance.__dict__.get(name) for name in fields)
+
+    def invalidate_changed(sender, instance, created=False, update_fields=None, **kwargs):
+        if update_fields is not None and not set(fields) & set(update_fields):
+            return
+        values = tuple(instance.__dict__.get(name) for name in fields)
+        if created or values != getattr(instance, '_autocomplete_values', None):
+            autocomplete.invalidate()
+        instance._autocomplete_values = values
+
+    def invalidate_deleted(sender, **kwargs):
+        autocomplete.invalidate()
+
+    uid = f'autocomplete:{sender}'
+    post_init.connect(remember, sender=sender, weak=False, dispatch_uid=uid)
+    post_save.connect(invalidate_changed, sender=sender, weak=False, dispatch_uid=uid)
+    post_delete.connect(invalidate_deleted, sender=sender, weak=False, dispatch_uid=uid)
+
+
+for _label, _fields in autocomplete.INDEXED_FIELDS.items():
+    _connect_autocomplete(_label, _fields)
+
+
+# --- Кеш фрагментов страниц ---
+
+def _connect_fragments(sender):
+    def bump(sender, instance, raw=False, **kwargs):
+        # После коммита: иначе параллельный запрос успеет закешировать
+        # старые данные под новой версией
+        if not raw:
+            transaction.on_commit(lambda: fragments.bump_for(instance))
+
+    uid = f'fragments:{sender}'
+    post_save.connect(bump, sender=sender, weak=False, dispatch_uid=uid)
+    post_delete.connect(bump, sender=sender, weak=False, dispatch_uid=uid)
+
+
+for _label in fragments.DEPENDENCIES:
+    _connect_fragments(_label)
+
+
+# --- Варианты изображений ---
+
+def _connect_images(sender):
+    def schedule_variants(sender, instance, raw=False, **kwargs):
+        if not raw and images.needs_processing(instance):
+            images.schedule(instance)
+
+    def delete_variants(sender, instance, **kwargs):
+        field_name, _ = images.spec_for(sender)
+        storage = getattr(instance, field_name).storage
+        # Варианты записываются обработчиком через update(), поэтому у
+        # объекта в памяти они могут быть устаревшими — берём из базы
+        variants = (
+            sender._default_manager.filter(pk=instance.pk)
+            .values_list('image_variants', flat=True)
+            .first()
+        )
+        transaction.on_commit(lambda: images.delete_variants(storage, variants))
+
+    uid = f'images:{sender}'
+    post_save.connect(schedule_variants, sender=sender, weak=False, dispatch_uid=uid)
+    pre_delete.connect(delete_variants, sender=sender, weak=False, dispatch_uid=uid)
+
+
+for _label in images.VARIANTS:
+    _connect_images(_label)
+
+
+# --- Ссылки на файлы в контентно-адресуемом хранилище ---
+
+def _file_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def _connect_files(model, field_names):
+    def remember(sender, instance, **kwargs):
+        # Отложенные поля (only()/defer()) не запоминаем: их старое имя неизвестно
+        instance._loaded_files = {
+            name: _file_name(instance.__dict__[name])
+            for name in field_names if name in instance.__dict__
+        }
+
+    def follow_files(sender, instance, created=False, **kwargs):
+        # Ссылку держит строка: берём её на новое имя и отпускаем старое
+        # внутри транзакции сохранения, так что откат отменяет и то, и другое.
+        # Та же загрузка с тем же содержимым даёт то же имя — ссылка не меняется
+        loaded = dict.fromkeys(field_names, '') if created else getattr(instance, '_loaded_files', {})
+        for name in field_names:
+            field_file = getattr(instance, name)
+            old, new = loaded.get(name), field_file.name or ''
+            if old is not None and old != new:
+                storage.acquire(field_file.storage, new)
+                storage.release(field_file.storage, old)
+            loaded[name] = new
+        instance._loaded_files = loaded
+
+    def release_deleted(sender, instance, **kwargs):
+        for name in field_names:
+            field_file = getattr(instance, name)
+            storage.release(field_file.storage, field_file.name)
+
+    uid = f'files:{model._meta.label}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(follow_files, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(release_deleted, sender=model, weak=False, dispatch_uid=uid)
+
+
+_file_fields = {}
+for _model, _field_name in storage.file_fields():
+    _file_fields.setdefault(_model, []).append(_field_name)
+for _model, _field_names in _file_fields.items():
+    _connect_files(_model, _field_names)
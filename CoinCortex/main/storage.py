@@ -0,0 +1,213 @@
+"""
+Контентно-адресуемое хранилище медиафайлов.
+
+Загрузка хэшируется (sha256) прямо во время записи во временный файл,
+после чего файл переносится в ``blobs/<2 символа>/<digest><расширение>``.
+Одинаковое содержимое хранится один раз, а число ссылок на него — в
+MediaBlob.refcount. ``save()`` только регистрирует блоб, ссылку берёт и
+отпускает строка, которая на него ссылается: сигналы (main.signals)
+вызывают acquire()/release() при сохранении и удалении объекта, в той же
+транзакции, поэтому откат запроса откатывает и ссылку. Сами файлы
+удаляет только ``manage.py collect_media``: он убирает блобы без ссылок
+(и файлы, чья строка MediaBlob откатилась), которые не менялись дольше
+грейс-периода.
+
+Содержимое по одному имени никогда не меняется, поэтому ``/media/blobs/``
+можно отдавать с ``Cache-Control: immutable`` (см. IMMUTABLE_CACHE_CONTROL).
+"""
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .images import variant_paths
+
+BLOB_PREFIX = 'blobs/'
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Блобы без ссылок удаляются не раньше, чем через столько после последнего изменения
+GC_GRACE_PERIOD = timedelta(hours=24)
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который раскладывает файлы по sha256 содержимого"""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save(), совпадение — это дедупликация
+        return name
+
+    def _save(self, name, content):
+        MediaBlob = apps.get_model('main', 'MediaBlob')
+        tmp_dir = self.path('tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            ext = os.path.splitext(name)[1].lower()
+            hexdigest = digest.hexdigest()
+            blob_name = f'{BLOB_PREFIX}{hexdigest[:2]}/{hexdigest}{ext}'
+
+            # Сначала строка, потом файл. Ссылку берёт объект, который сохранит
+            # это имя (acquire()), а до тех пор блоб защищает свежий updated:
+            # collect_media не трогает его грейс-период
+            blob, created = MediaBlob.objects.get_or_create(
+                name=blob_name, defaults={'size': size}
+            )
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(updated=timezone.now())
+
+            full_path = self.path(blob_name)
+            if os.path.exists(full_path):
+                os.remove(tmp_path)
+                # Свежий mtime защищает файл от уборки файлов без строки
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_name
+
+    def acquire(self, name):
+        """Взять ссылку на блоб"""
+        MediaBlob = apps.get_model('main', 'MediaBlob')
+        MediaBlob.objects.filter(name=name).update(
+            refcount=F('refcount') + 1, updated=timezone.now()
+        )
+
+    def delete(self, name):
+        """Отпустить ссылку на блоб; файлы вне blobs/ удаляются сразу"""
+        if not is_blob(name):
+            return super().delete(name)
+        MediaBlob = apps.get_model('main', 'MediaBlob')
+        MediaBlob.objects.filter(name=name).update(
+            refcount=F('refcount') - 1, updated=timezone.now()
+        )
+
+    def collect_garbage(self, grace=GC_GRACE_PERIOD, dry_run=False):
+        """Удалить блобы без ссылок; возвращает (количество, освобождено байт)"""
+        MediaBlob = apps.get_model('main', 'MediaBlob')
+        cutoff = timezone.now() - grace
+        candidates = MediaBlob.objects.filter(refcount__lte=0, updated__lt=cutoff).values_list(
+            'pk', 'name', 'size'
+        )
+        count = freed = 0
+        for pk, name, size in candidates.iterator():
+            if dry_run:
+                count, freed = count + 1, freed + size
+                continue
+            with transaction.atomic():
+                # Ссылку могли взять заново, пока шёл обход
+                deleted, _ = MediaBlob.objects.filter(pk=pk, refcount__lte=0).delete()
+                if deleted:
+                    super().delete(name)
+                    count, freed = count + 1, freed + size
+        orphans, orphans_size = self._collect_orphans(cutoff, dry_run)
+        return count + orphans, freed + orphans_size
+
+    def _collect_orphans(self, cutoff, dry_run):
+        """
+        Файлы blobs/ без строки MediaBlob: строка откатилась вместе с
+        транзакцией, в которой файл загрузили.
+        """
+        MediaBlob = apps.get_model('main', 'MediaBlob')
+        root = self.path(BLOB_PREFIX)
+        if not os.path.isdir(root):
+            return 0, 0
+        cutoff = cutoff.timestamp()
+        count = freed = 0
+        for prefix in sorted(os.listdir(root)):
+            directory = os.path.join(root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            known = set(
+                MediaBlob.objects.filter(name__startswith=f'{BLOB_PREFIX}{prefix}/')
+                .values_list('name', flat=True)
+            )
+            for filename in os.listdir(directory):
+                name = f'{BLOB_PREFIX}{prefix}/{filename}'
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name in known or stat.st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    super().delete(name)
+                count, freed = count + 1, freed + stat.st_size
+        return count, freed
+
+
+def file_fields():
+    """(модель, имя поля) для всех FileField проекта"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def acquire(storage, name):
+    """Взять ссылку на файл, если он лежит в контентно-адресуемом хранилище"""
+    if name and isinstance(storage, ContentAddressedStorage) and is_blob(name):
+        storage.acquire(name)
+
+
+def release(storage, name):
+    """Отпустить ссылку на файл, если он лежит в контентно-адресуемом хранилище"""
+    if name and isinstance(storage, ContentAddressedStorage) and is_blob(name):
+        storage.delete(name)
+
+
+def recount():
+    """
+    Пересчитать ссылки по всем FileField и вариантам изображений.
+    Возвращает количество исправленных блобов.
+    """
+    MediaBlob = apps.get_model('main', 'MediaBlob')
+    actual = Counter()
+    models_with_files = set()
+    for model, field_name in file_fields():
+        models_with_files.add(model)
+        names = model._default_manager.exclude(**{field_name: ''}).values_list(field_name, flat=True)
+        actual.update(name for name in names.iterator() if is_blob(name))
+    for model in models_with_files:
+        if any(f.name == 'image_variants' for f in model._meta.concrete_fields):
+            for variants in model._default_manager.values_list('image_variants', flat=True).iterator():
+                actual.update(name for name in variant_paths(variants) if is_blob(name))
+
+    stale = []
+    for blob in MediaBlob.objects.only('pk', 'name', 'refcount').iterator():
+        expected = actual.get(blob.name, 0)
+        if blob.refcount != expected:
+            blob.refcount = expected
+            stale.append(blob)
+    MediaBlob.objects.bulk_update(stale, ['refcount'], batch_size=500)
+    return len(stale)
@@ -0,0 +1,45 @@
+from django import template
+from django.core.cache import cache
+
+from main import fragments
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, objects):
+        self.nodelist = nodelist
+        self.name = name
+        self.objects = objects
+
+    def render(self, context):
+        if not fragments.timeout():
+            return self.nodelist.render(context)
+        name = self.name.resolve(context)
+        # Отсутствующий объект (пост без комментариев) шаблон отдаёт как ''
+        objects = [obj.resolve(context) or None for obj in self.objects]
+        key = fragments.fragment_key(name, objects)
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, fragments.timeout())
+        return content
+
+
+@register.tag('fragment')
+def do_fragment(parser, token):
+    """
+    Общий для всех пользователей кешированный фрагмент:
+    ``{% fragment "post_card" item.post item.top_comment %}...{% endfragment %}``.
+    Фрагмент перерисовывается, когда сигналы (main.fragments) меняют версию
+    любого из перечисленных объектов. Внутри не должно быть ничего, что
+    зависит от зрителя.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' требует имя фрагмента и хотя бы один объект")
+    name = parser.compile_filter(bits[1])
+    objects = [parser.compile_filter(bit) for bit in bits[2:]]
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, name, objects)
@@ -0,0 +1,18 @@
+from django import template
+
+from main.images import variant_url
+
+register = template.Library()
+
+
+@register.filter
+def variant(instance, name):
+    """
+    URL варианта картинки объекта: ``{{ post|variant:"feed" }}`` (WebP),
+    ``{{ post|variant:"feed.jpeg" }}`` (JPEG). Пока варианты не готовы —
+    URL оригинала, без картинки — пустая строка.
+    """
+    if not instance:
+        return ''
+    name, _, fmt = name.partition('.')
+    return variant_url(instance, name, fmt or 'webp')
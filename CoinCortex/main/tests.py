@@ -1,3 +1,261 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from groups.models import Group, GroupPost
+from main import autocomplete, benchmarks, images, interactions, notifications, search
+from main.models import MediaBlob, Notification, NotificationOutbox, Post, PostComment
+from PIL import Image
+
+MAIN_VIEWS = ['index', 'profile', 'user_profile', 'chat', 'chat_detail', 'friends', 'notifications']
+
+
+class RegressionsTests(SimpleTestCase):
+    def stats(self, queries=5, repeated=0, p95=10.0):
+        return {'queries': queries, 'repeated': repeated, 'p50_ms': p95, 'p95_ms': p95}
+
+    def test_repeated_queries_growing_with_data(self):
+        results = {'60': {'index': self.stats(repeated=1)}, '240': {'index': self.stats(repeated=4)}}
+        problems = benchmarks.regressions(results)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('index', problems[0])
+
+    def test_query_count_above_baseline(self):
+        baseline = {'60': {'index': self.stats(queries=5)}}
+        results = {'60': {'index': self.stats(queries=6)}}
+        self.assertEqual(len(benchmarks.regressions(results, baseline)), 1)
+
+    def test_latency_threshold(self):
+        baseline = {'60': {'index': self.stats(p95=100.0)}}
+        within = {'60': {'index': self.stats(p95=100.0 * 2 + benchmarks.LATENCY_SLACK_MS)}}
+        slower = {'60': {'index': self.stats(p95=100.0 * 2 + benchmarks.LATENCY_SLACK_MS + 1)}}
+        self.assertEqual(benchmarks.regressions(within, baseline, threshold=1.0), [])
+        self.assertEqual(len(benchmarks.regressions(slower, baseline, threshold=1.0)), 1)
+        self.assertEqual(benchmarks.regressions(slower, baseline, threshold=None), [])
+
+
+class SearchFilterTests(TestCase):
+    def test_narrowed_queryset_beyond_max_results(self):
+        # Лучшие MAX_RESULTS совпадений по всему индексу не входят в queryset
+        User.objects.bulk_create(
+            User(username=f'anna{i:04d}') for i in range(search.MAX_RESULTS + 50)
+        )
+        friend = User.objects.create(username='anna_friend')
+        search.rebuild(search.index_for(User))
+        found = search.filter(User.objects.filter(id__in=[friend.id]), 'anna')
+        self.assertEqual(list(found), [friend])
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.actor = User.objects.create_user('actor', password='x')
+        self.users = [User.objects.create_user(f'user{i}', password='x') for i in range(3)]
+        for user in self.users:
+            notifications.notify(user, 'friend_request', self.actor)
+
+    def test_claimed_events_are_not_handed_out_twice(self):
+        first = notifications.claim(batch_size=2)
+        second = notifications.claim(batch_size=2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({e.id for e in first} & {e.id for e in second})
+
+    def test_failing_event_does_not_block_batch(self):
+        poison = self.users[1]
+        deliver = notifications._deliver
+
+        def failing_deliver(events):
+            if any(event.user_id == poison.id for event in events):
+                raise ValueError('сбой')
+            return deliver(events)
+
+        with mock.patch.object(notifications, '_deliver', failing_deliver), \
+                self.assertLogs('main.notifications', level='WARNING'):
+            self.assertEqual(notifications.process_outbox(), 3)
+
+        delivered = set(Notification.objects.values_list('user_id', flat=True))
+        self.assertEqual(delivered, {self.users[0].id, self.users[2].id})
+        event = NotificationOutbox.objects.get()
+        self.assertEqual((event.user_id, event.attempts, event.claimed_by), (poison.id, 1, ''))
+
+
+class AutocompleteInvalidationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('anna', password='x')
+
+    def version(self):
+        return cache.get(autocomplete.VERSION_KEY, 0)
+
+    def test_login_does_not_invalidate(self):
+        before = self.version()
+        self.assertTrue(self.client.login(username='anna', password='x'))
+        profile = User.objects.get(pk=self.user.pk).profile
+        profile.bio = 'О себе'
+        profile.save()
+        self.assertEqual(self.version(), before)
+
+    def test_name_change_invalidates(self):
+        before = self.version()
+        profile = User.objects.get(pk=self.user.pk).profile
+        profile.first_name = 'Анна'
+        profile.save()
+        self.assertGreater(self.version(), before)
+
+
+class MediaRefcountTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create_user('author', password='x')
+
+    def test_reupload_of_identical_content(self):
+        post = Post.objects.create(author=self.author, content='Пост', wall_owner=self.author)
+        for _ in range(3):
+            post.image = SimpleUploadedFile('photo.png', b'same bytes')
+            post.save()
+        self.assertEqual(MediaBlob.objects.get(name=post.image.name).refcount, 1)
+
+        post.delete()
+        self.assertEqual(MediaBlob.objects.get().refcount, 0)
+
+    def test_rolled_back_save_takes_no_reference(self):
+        post = Post.objects.create(author=self.author, content='Пост', wall_owner=self.author)
+        post.image = SimpleUploadedFile('photo.png', b'kept')
+        post.save()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(
+                author=self.author, content='Откат', wall_owner=self.author,
+                image=SimpleUploadedFile('photo.png', b'kept'),
+            )
+            post.image = SimpleUploadedFile('photo.png', b'rolled back')
+            post.save()
+            rolled_back = post.image.name
+            raise RuntimeError
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+        # Строку блоба откатили вместе с транзакцией — файл убирает collect_media
+        path = default_storage.path(rolled_back)
+        self.assertTrue(os.path.exists(path))
+        default_storage.collect_garbage(grace=timedelta(0))
+        self.assertFalse(os.path.exists(path))
+
+    def test_deferred_field_keeps_reference(self):
+        post = Post.objects.create(
+            author=self.author, content='Пост', wall_owner=self.author,
+            image=SimpleUploadedFile('photo.png', b'bytes'),
+        )
+        Post.objects.only('id', 'content').get(pk=post.pk).save()
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+    def test_variants_take_references(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        post = Post.objects.create(
+            author=self.author, content='Пост', wall_owner=self.author,
+            image=SimpleUploadedFile('photo.png', buffer.getvalue()),
+        )
+        images.process('main.Post', post.pk)
+        post.refresh_from_db()
+        paths = images.variant_paths(post.image_variants)
+        self.assertTrue(paths)
+        refcounts = dict(MediaBlob.objects.values_list('name', 'refcount'))
+        self.assertEqual(sum(refcounts.values()), 1 + len(paths))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(MediaBlob.objects.filter(refcount__gt=0).exists())
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class ViewBenchmarkTests(TestCase):
+    """Горячие страницы на синтетических данных: N+1 и бюджеты запросов"""
+
+    def test_hot_views(self):
+        # Время зависит от машины — здесь проверяются только запросы
+        results = benchmarks.run(views=MAIN_VIEWS, repeat=1)
+        problems = benchmarks.regressions(results, benchmarks.load_baseline(), threshold=None)
+        self.assertEqual(problems, [], '\n' + benchmarks.format_table(results))
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class InteractionTests(TestCase):
+    """Лайки и комментарии через main.interactions и JSON-эндпоинт"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='x')
+        self.user = User.objects.create_user('reader', password='x')
+        self.post = Post.objects.create(author=self.author, content='Пост', wall_owner=self.author)
+        self.group = Group.objects.create(name='Группа', creator=self.author)
+        self.group_post = GroupPost.objects.create(group=self.group, author=self.author, content='Пост группы')
+        self.client.force_login(self.user)
+
+    def interact(self, *operations):
+        response = self.client.post(
+            reverse('interactions'),
+            json.dumps({'operations': list(operations)}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_batch_returns_counters(self):
+        results = self.interact(
+            {'op': 'like', 'target': 'post', 'id': self.post.id},
+            {'op': 'like', 'target': 'group_post', 'id': self.group_post.id},
+            {'op': 'comment', 'target': 'group_post', 'id': self.group_post.id, 'text': 'Привет'},
+            {'op': 'like', 'target': 'post', 'id': 0},
+        )
+        self.assertEqual(results[0]['likes_count'], 1)
+        self.assertTrue(results[1]['is_liked'])
+        self.assertEqual(results[2]['comments_count'], 1)
+        self.assertFalse(results[3]['ok'])
+
+        results = self.interact({'op': 'like', 'target': 'post', 'id': self.post.id})
+        self.assertEqual(results[0], {'target': 'post', 'id': self.post.id, 'ok': True, 'is_liked': False, 'likes_count': 0})
+
+    def test_malformed_operations_do_not_break_batch(self):
+        results = self.interact(
+            {'op': 'comment', 'target': 'post', 'id': self.post.id, 'text': 5},
+            {'op': 'like', 'target': ['post'], 'id': self.post.id},
+            {'op': 'like', 'target': 'post', 'id': 1.9},
+            {'op': ['like'], 'target': 'post', 'id': self.post.id},
+            {'op': 'like', 'target': 'post', 'id': self.post.id},
+        )
+        self.assertEqual([result['ok'] for result in results], [False, False, False, False, True])
+
+    def test_full_batch_within_budget(self):
+        comments = [
+            PostComment.objects.create(post=self.post, author=self.author, content=str(i))
+            for i in range(interactions.MAX_OPERATIONS)
+        ]
+        results = self.interact(*[{'op': 'like', 'target': 'comment', 'id': c.id} for c in comments])
+        self.assertTrue(all(result['ok'] for result in results))
+
+    def test_form_fallback(self):
+        self.client.post(reverse('index'), {'like_post': f'group_{self.group_post.id}'})
+        self.client.post(reverse('group_detail', args=[self.group.id]), {
+            'comment_group_post': self.group_post.id, 'comment_text': 'Комментарий',
+        })
+        self.group_post.refresh_from_db()
+        self.assertEqual((self.group_post.likes_count, self.group_post.comments_count), (1, 1))
+
+    def test_group_scope(self):
+        other = Group.objects.create(name='Другая', creator=self.author)
+        with self.assertRaises(interactions.InteractionError):
+            interactions.perform(self.user, {'op': 'like', 'target': 'group_post', 'id': self.group_post.id}, other)
+        with self.assertRaises(interactions.InteractionError):
+            interactions.perform(self.user, {'op': 'like', 'target': 'post', 'id': self.post.id}, self.group)
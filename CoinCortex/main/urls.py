@@ -14,7 +14,11 @@ urlpatterns = [
     path('loginout/', views.logout_view, name='loginout'),
     path('profile/<str:username>/', views.user_profile, name='user_profile'),
     path('chat/<int:chat_id>/', views.chat_detail, name='chat_detail'),
+    path('chat/<int:chat_id>/messages/', views.chat_messages, name='chat_messages'),
+    path('chat/<int:chat_id>/stream/', views.chat_stream, name='chat_stream'),
     path('chat/start/<str:username>/', views.start_chat, name='start_chat'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
+    path('interactions/', views.interactions_view, name='interactions'),
     path('communities/', views.communities, name='communities'),
     path('communities/<int:community_id>/', views.community_detail, name='community_detail'),
     path('communities/join/<int:community_id>/', views.join_community, name='join_community'),
@@ -1,313 +1,77 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.views.static import serve as static_serve
 from .models import (
     Post,
-    PostLike,
-    PostComment,
-    PostCommentLike,
     Friendship,
     Chat,
     Message,
     Notification,
     Community,
+    Profile,
+    FriendRecommendation,
 )
 from .forms import CustomUserCreationForm
+from .chats import (
+    inbox_items,
+    history_page,
+    messages_after,
+    mark_read,
+    read_up_to,
+    message_dict,
+)
+from .engagement import post_item
+from .recommendations import refresh_later as refresh_recommendations_later
+from .notifications import notify, attach_actors
+from . import autocomplete, feed, friends, interactions, realtime, search
+from .storage import IMMUTABLE_CACHE_CONTROL, is_blob
 
 
 def index(request):
     """Главная страница с лентой постов от популярных групп"""
-    # Обработка POST запросов (лайки и комментарии)
+    # Лайки и комментарии из обычных форм (JavaScript использует interactions_view)
     if request.method == "POST" and request.user.is_authenticated:
-        # Лайк поста
-        if "like_post" in request.POST:
-            post_id = request.POST.get("like_post")
-            try:
-                if post_id.startswith("group_"):
-                    # Лайк поста группы
-                    from groups.models import GroupPost, GroupPostLike
-
-                    post_id = post_id.replace("group_", "")
-                    post = GroupPost.objects.get(id=post_id)
-                    like, created = GroupPostLike.objects.get_or_create(
-                        post=post, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                        is_liked = False
-                    else:
-                        is_liked = True
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="group_like",
-                                from_user=request.user,
-                                group_post=post,
-                            )
-                    likes_count = post.get_likes_count()
-                else:
-                    # Лайк обычного поста
-                    post = Post.objects.get(id=post_id)
-                    like, created = PostLike.objects.get_or_create(
-                        post=post, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                        is_liked = False
-                    else:
-                        is_liked = True
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="like",
-                                from_user=request.user,
-                                post=post,
-                            )
-                    likes_count = post.get_likes_count()
-                
-                # Если это AJAX запрос, возвращаем JSON
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    from django.http import JsonResponse
-                    return JsonResponse({
-                        'success': True,
-                        'is_liked': is_liked,
-                        'likes_count': likes_count
-                    })
-            except (Post.DoesNotExist, Exception):
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    from django.http import JsonResponse
-                    return JsonResponse({'success': False, 'error': 'Пост не найден'}, status=404)
-                messages.error(request, "Пост не найден")
-            return redirect("index")
-
-        # Комментарий к посту
-        elif "comment_post" in request.POST:
-            post_id = request.POST.get("comment_post")
-            comment_text = request.POST.get("comment_text", "").strip()
-            if comment_text:
-                try:
-                    if post_id.startswith("group_"):
-                        # Комментарий к посту группы
-                        from groups.models import GroupPost, GroupPostComment
-
-                        post_id = post_id.replace("group_", "")
-                        post = GroupPost.objects.get(id=post_id)
-                        GroupPostComment.objects.create(
-                            post=post, author=request.user, content=comment_text
-                        )
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="group_comment",
-                                from_user=request.user,
-                                group_post=post,
-                            )
-                    else:
-                        # Комментарий к обычному посту
-                        post = Post.objects.get(id=post_id)
-                        comment = PostComment.objects.create(
-                            post=post, author=request.user, content=comment_text
-                        )
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="comment",
-                                from_user=request.user,
-                                post=post,
-                            )
-                except (Post.DoesNotExist, Exception):
-                    messages.error(request, "Пост не найден")
-            return redirect("index")
-
-        # Лайк комментария
-        elif "like_comment" in request.POST:
-            comment_id = request.POST.get("like_comment")
-            try:
-                if comment_id.startswith("group_"):
-                    # Лайк комментария группы
-                    from groups.models import GroupPostComment, GroupPostCommentLike
-
-                    comment_id = comment_id.replace("group_", "")
-                    comment = GroupPostComment.objects.get(id=comment_id)
-                    like, created = GroupPostCommentLike.objects.get_or_create(
-                        comment=comment, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if comment.author != request.user:
-                            Notification.objects.create(
-                                user=comment.author,
-                                notification_type="group_comment_like",
-                                from_user=request.user,
-                                group_comment=comment,
-                            )
-                else:
-                    # Лайк обычного комментария
-                    comment = PostComment.objects.get(id=comment_id)
-                    like, created = PostCommentLike.objects.get_or_create(
-                        comment=comment, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if comment.author != request.user:
-                            Notification.objects.create(
-                                user=comment.author,
-                                notification_type="comment_like",
-                                from_user=request.user,
-                                comment=comment,
-                            )
-            except (PostComment.DoesNotExist, Exception):
-                messages.error(request, "Комментарий не найден")
-            return redirect("index")
+        interactions.handle_form(request)
+        return redirect("index")
 
-    # Получаем посты для авторизованных пользователей
-    all_posts = []
+    cursor = feed.decode_cursor(request.GET.get("cursor"))
 
     if request.user.is_authenticated:
-        from groups.models import Group, GroupPost, GroupSubscription
-
-        # Получаем друзей пользователя
-        sent_friends = User.objects.filter(
-            friendship_requests_received__from_user=request.user,
-            friendship_requests_received__accepted=True,
-        )
-        received_friends = User.objects.filter(
-            friendship_requests_sent__to_user=request.user,
-            friendship_requests_sent__accepted=True,
-        )
-        friends_list = list(sent_friends.union(received_friends))
-        friends_ids = [f.id for f in friends_list]
-
-        # Получаем ID сообществ, на которые подписан пользователь
-        subscribed_groups = GroupSubscription.objects.filter(
-            user=request.user, is_subscribed=True
-        ).values_list("group_id", flat=True)
-
-        # Получаем посты от друзей и свои посты
-        friends_posts = (
-            Post.objects.filter(
-                Q(author__in=friends_ids) | Q(wall_owner__in=friends_ids) | Q(author=request.user)
-            )
-            .select_related("author", "wall_owner")
-            .order_by("-created")
-        )
-
-        # Получаем посты из подписанных сообществ
-        group_posts = (
-            GroupPost.objects.filter(group_id__in=subscribed_groups)
-            .select_related("group", "author")
-            .order_by("-created")
-        )
-
-        # Добавляем посты друзей
-        for post in friends_posts:
-            is_liked = post.is_liked_by(request.user)
-            comments = post.comments.select_related("author").all()
-            # Добавляем информацию о лайках для каждого комментария
-            comments_with_likes = []
-            for comment in comments[:5]:
-                comments_with_likes.append({
-                    'comment': comment,
-                    'is_liked': comment.is_liked_by(request.user),
-                    'likes_count': comment.get_likes_count(),
-                })
-            # Самый популярный комментарий (первый по дате, если нет лайков)
-            top_comment = comments.first() if comments.exists() else None
-            all_posts.append(
-                {
-                    "post": post,
-                    "type": "user",
-                    "is_liked": is_liked,
-                    "likes_count": post.get_likes_count(),
-                    "comments_count": post.get_comments_count(),
-                    "comments": comments_with_likes,
-                    "top_comment": top_comment,
-                }
-            )
-
-        # Добавляем посты из групп
-        for post in group_posts:
-            is_liked = post.is_liked_by(request.user)
-            comments = post.comments.select_related("author").all()
-            # Добавляем информацию о лайках для каждого комментария
-            comments_with_likes = []
-            for comment in comments[:5]:
-                comments_with_likes.append({
-                    'comment': comment,
-                    'is_liked': comment.is_liked_by(request.user),
-                    'likes_count': comment.get_likes_count(),
-                })
-            # Самый популярный комментарий (первый по дате, если нет лайков)
-            top_comment = comments.first() if comments.exists() else None
-            all_posts.append(
-                {
-                    "post": post,
-                    "type": "group",
-                    "is_liked": is_liked,
-                    "likes_count": post.get_likes_count(),
-                    "comments_count": post.get_comments_count(),
-                    "comments": comments_with_likes,
-                    "top_comment": top_comment,
-                }
-            )
+        # Посты друзей и сообществ из материализованной ленты пользователя
+        sources = feed.timeline_sources(request.user)
     else:
         # Для неавторизованных - показываем посты из популярных групп
-        from groups.models import Group, GroupPost
+        from groups.models import Group
 
         popular_groups = (
-            Group.objects.annotate(
-                subscribers_count=Count(
-                    "subscriptions", filter=Q(subscriptions__is_subscribed=True)
-                )
-            )
-            .filter(subscribers_count__gt=0)
-            .order_by("-subscribers_count", "-created")[:10]
-        )
-
-        group_posts = (
-            GroupPost.objects.filter(group__in=popular_groups)
-            .select_related("group", "author")
-            .order_by("-created")
+            Group.objects.filter(stats__subscribers_count__gt=0)
+            .order_by("-stats__subscribers_count", "-created")
+            .values_list("id", flat=True)[:10]
         )
+        sources = feed.group_sources(popular_groups)
 
-        for post in group_posts:
-            comments = post.comments.select_related("author").all()
-            top_comment = comments.first() if comments.exists() else None
-            all_posts.append(
-                {
-                    "post": post,
-                    "type": "group",
-                    "is_liked": False,
-                    "likes_count": post.get_likes_count(),
-                    "comments_count": post.get_comments_count(),
-                    "comments": comments[:5],
-                    "top_comment": top_comment,
-                }
-            )
-
-    # Сортируем по дате создания (новые сначала)
-    all_posts.sort(key=lambda x: x["post"].created, reverse=True)
-    all_posts = all_posts[:50]
-
-    # Получаем количество непрочитанных уведомлений
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = Notification.objects.filter(
-            user=request.user, read=False
-        ).count()
+    # Лениво сливаем потоки по дате и читаем ровно одну страницу
+    all_posts, next_cursor = feed.build_page(sources, request.user, cursor)
 
     return render(
         request,
         "index.html",
         {
             "all_posts": all_posts,
-            "unread_notifications": unread_notifications,
+            "next_cursor": next_cursor,
         },
     )
 
@@ -366,11 +130,7 @@ def profile(request):
                             from_user=request.user, to_user=friend_user, accepted=False
                         )
                         # Создаем уведомление о заявке в друзья
-                        Notification.objects.create(
-                            user=friend_user,
-                            notification_type="friend_request",
-                            from_user=request.user,
-                        )
+                        notify(friend_user, "friend_request", request.user)
 
             except User.DoesNotExist:
                 messages.error(request, "Пользователь не найден")
@@ -389,11 +149,7 @@ def profile(request):
                 friendship.accepted = True
                 friendship.save()
                 # Создаем уведомление о принятии заявки
-                Notification.objects.create(
-                    user=friendship.from_user,
-                    notification_type="friend_accepted",
-                    from_user=request.user,
-                )
+                notify(friendship.from_user, "friend_accepted", request.user)
             except Friendship.DoesNotExist:
                 messages.error(request, "Заявка не найдена")
 
@@ -416,216 +172,18 @@ def profile(request):
                 messages.error(request, "Пользователь не найден")
             return redirect("profile")
 
-        # Лайк поста
-        elif "like_post" in request.POST:
-            post_id = request.POST.get("like_post")
-            try:
-                if post_id.startswith("group_"):
-                    # Лайк поста группы
-                    from groups.models import GroupPost, GroupPostLike
-
-                    post_id = post_id.replace("group_", "")
-                    post = GroupPost.objects.get(id=post_id)
-                    like, created = GroupPostLike.objects.get_or_create(
-                        post=post, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="group_like",
-                                from_user=request.user,
-                                group_post=post,
-                            )
-                else:
-                    # Лайк обычного поста
-                    post = Post.objects.get(id=post_id)
-                    like, created = PostLike.objects.get_or_create(
-                        post=post, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="like",
-                                from_user=request.user,
-                                post=post,
-                            )
-            except (Post.DoesNotExist, GroupPost.DoesNotExist):
-                messages.error(request, "Пост не найден")
-            referer = request.META.get("HTTP_REFERER", "index")
-            return redirect(referer)
-
-        # Комментарий к посту
-        elif "comment_post" in request.POST:
-            post_id = request.POST.get("comment_post")
-            comment_text = request.POST.get("comment_text", "").strip()
-            if comment_text:
-                try:
-                    if post_id.startswith("group_"):
-                        # Комментарий к посту группы
-                        from groups.models import GroupPost, GroupPostComment
-
-                        post_id = post_id.replace("group_", "")
-                        post = GroupPost.objects.get(id=post_id)
-                        GroupPostComment.objects.create(
-                            post=post, author=request.user, content=comment_text
-                        )
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="group_comment",
-                                from_user=request.user,
-                                group_post=post,
-                            )
-                    else:
-                        # Комментарий к обычному посту
-                        post = Post.objects.get(id=post_id)
-                        comment = PostComment.objects.create(
-                            post=post, author=request.user, content=comment_text
-                        )
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="comment",
-                                from_user=request.user,
-                                post=post,
-                            )
-                except (Post.DoesNotExist, GroupPost.DoesNotExist):
-                    messages.error(request, "Пост не найден")
-            referer = request.META.get("HTTP_REFERER", "index")
-            return redirect(referer)
-
-        # Лайк комментария
-        elif "like_comment" in request.POST:
-            comment_id = request.POST.get("like_comment")
-            try:
-                if comment_id.startswith("group_"):
-                    # Лайк комментария группы
-                    from groups.models import GroupPostComment, GroupPostCommentLike
-
-                    comment_id = comment_id.replace("group_", "")
-                    comment = GroupPostComment.objects.get(id=comment_id)
-                    like, created = GroupPostCommentLike.objects.get_or_create(
-                        comment=comment, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if comment.author != request.user:
-                            Notification.objects.create(
-                                user=comment.author,
-                                notification_type="group_comment_like",
-                                from_user=request.user,
-                                group_comment=comment,
-                            )
-                else:
-                    # Лайк обычного комментария
-                    comment = PostComment.objects.get(id=comment_id)
-                    like, created = PostCommentLike.objects.get_or_create(
-                        comment=comment, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if comment.author != request.user:
-                            Notification.objects.create(
-                                user=comment.author,
-                                notification_type="comment_like",
-                                from_user=request.user,
-                                comment=comment,
-                            )
-            except (PostComment.DoesNotExist, Exception):
-                messages.error(request, "Комментарий не найден")
-            referer = request.META.get("HTTP_REFERER", "index")
-            return redirect(referer)
-
-        # Лайк комментария
-        elif "like_comment" in request.POST:
-            comment_id = request.POST.get("like_comment")
-            try:
-                if comment_id.startswith("group_"):
-                    # Лайк комментария группы
-                    from groups.models import GroupPostComment, GroupPostCommentLike
-
-                    comment_id = comment_id.replace("group_", "")
-                    comment = GroupPostComment.objects.get(id=comment_id)
-                    like, created = GroupPostCommentLike.objects.get_or_create(
-                        comment=comment, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if comment.author != request.user:
-                            Notification.objects.create(
-                                user=comment.author,
-                                notification_type="group_comment_like",
-                                from_user=request.user,
-                                group_comment=comment,
-                            )
-                else:
-                    # Лайк обычного комментария
-                    comment = PostComment.objects.get(id=comment_id)
-                    like, created = PostCommentLike.objects.get_or_create(
-                        comment=comment, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if comment.author != request.user:
-                            Notification.objects.create(
-                                user=comment.author,
-                                notification_type="comment_like",
-                                from_user=request.user,
-                                comment=comment,
-                            )
-            except (PostComment.DoesNotExist, Exception):
-                messages.error(request, "Комментарий не найден")
-            referer = request.META.get("HTTP_REFERER", "index")
-            return redirect(referer)
+        # Лайки и комментарии
+        elif interactions.handle_form(request):
+            return redirect(request.META.get("HTTP_REFERER", "index"))
 
-    # Получаем последние посты текущего пользователя с оптимизацией
+    # Получаем последние посты текущего пользователя вместе с лайками и комментариями
     user_posts = (
         Post.objects.filter(author=request.user)
-        .select_related("author", "wall_owner")
-        .order_by("-created")[:10]
+        .select_related("author__profile", "wall_owner")
+        .order_by("-created")
+        .with_engagement(request.user)[:10]
     )
-
-    # Добавляем информацию о лайках для каждого поста
-    posts_with_info = []
-    for post in user_posts:
-        comments = post.comments.select_related("author").all()[:5]
-        comments_with_likes = []
-        for comment in comments:
-            comments_with_likes.append({
-                'comment': comment,
-                'is_liked': comment.is_liked_by(request.user),
-                'likes_count': comment.get_likes_count(),
-            })
-        posts_with_info.append(
-            {
-                "post": post,
-                "is_liked": post.is_liked_by(request.user),
-                "likes_count": post.get_likes_count(),
-                "comments_count": post.get_comments_count(),
-                "comments": comments_with_likes,
-            }
-        )
-
-    # Получаем друзей пользователя с оптимизацией
-    sent_friends = User.objects.filter(
-        friendship_requests_received__from_user=request.user,
-        friendship_requests_received__accepted=True,
-    ).select_related("profile")
-    received_friends = User.objects.filter(
-        friendship_requests_sent__to_user=request.user,
-        friendship_requests_sent__accepted=True,
-    ).select_related("profile")
-    friends_list = list(sent_friends.union(received_friends))
+    posts_with_info = [post_item(post) for post in user_posts]
 
     # Получаем сообщества, на которые подписан пользователь
     from groups.models import Group, GroupSubscription
@@ -708,85 +266,22 @@ def user_profile(request, username):
                         post.save()
                     return redirect("user_profile", username=username)
 
-            # Лайк поста
-            elif "like_post" in request.POST:
-                post_id = request.POST.get("like_post")
-                try:
-                    post = Post.objects.get(id=post_id)
-                    like, created = PostLike.objects.get_or_create(
-                        post=post, user=request.user
-                    )
-                    if not created:
-                        like.delete()
-                    else:
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="like",
-                                from_user=request.user,
-                                post=post,
-                            )
-                except Post.DoesNotExist:
-                    messages.error(request, "Пост не найден")
+            # Лайки и комментарии
+            elif interactions.handle_form(request):
                 return redirect("user_profile", username=username)
 
-            # Комментарий к посту
-            elif "comment_post" in request.POST:
-                post_id = request.POST.get("comment_post")
-                comment_text = request.POST.get("comment_text", "").strip()
-                if comment_text:
-                    try:
-                        post = Post.objects.get(id=post_id)
-                        comment = PostComment.objects.create(
-                            post=post, author=request.user, content=comment_text
-                        )
-                        if post.author != request.user:
-                            Notification.objects.create(
-                                user=post.author,
-                                notification_type="comment",
-                                from_user=request.user,
-                                post=post,
-                            )
-                    except Post.DoesNotExist:
-                        messages.error(request, "Пост не найден")
-                return redirect("user_profile", username=username)
-
-        # Проверяем, является ли пользователь другом
-        is_friend = Friendship.objects.filter(
-            (
-                Q(from_user=request.user, to_user=profile_user)
-                | Q(from_user=profile_user, to_user=request.user)
-            ),
-            accepted=True,
-        ).exists()
+        # Проверяем, является ли пользователь другом (из кеша графа друзей)
+        is_friend = friends.are_friends(request.user, profile_user)
 
         # Получаем посты на стене пользователя (все посты, где wall_owner = profile_user)
+        # вместе с лайками и комментариями
         user_posts = (
             Post.objects.filter(wall_owner=profile_user)
-            .select_related("author", "wall_owner")
-            .order_by("-created")[:20]
+            .select_related("author__profile", "wall_owner")
+            .order_by("-created")
+            .with_engagement(request.user)[:20]
         )
-
-        # Добавляем информацию о лайках и комментариях
-        posts_with_info = []
-        for post in user_posts:
-            comments = post.comments.select_related("author").all()[:5]
-            comments_with_likes = []
-            for comment in comments:
-                comments_with_likes.append({
-                    'comment': comment,
-                    'is_liked': comment.is_liked_by(request.user),
-                    'likes_count': comment.get_likes_count(),
-                })
-            posts_with_info.append(
-                {
-                    "post": post,
-                    "is_liked": post.is_liked_by(request.user),
-                    "likes_count": post.get_likes_count(),
-                    "comments_count": post.get_comments_count(),
-                    "comments": comments_with_likes,
-                }
-            )
+        posts_with_info = [post_item(post) for post in user_posts]
 
         # Проверяем, отправил ли текущий пользователь заявку в друзья
         friend_request_sent = Friendship.objects.filter(
@@ -816,55 +311,22 @@ def user_profile(request, username):
 @login_required
 def chat(request):
     """Страница со списком чатов"""
-    # Получаем все чаты пользователя с оптимизацией
-    chats = (
-        Chat.objects.filter(participants=request.user)
-        .prefetch_related("participants", "messages__sender")
-        .order_by("-updated")
-    )
-
-    # Добавляем информацию о непрочитанных сообщениях для каждого чата
-    chats_with_info = []
-    total_unread = 0
-    for chat in chats:
-        other_user = chat.get_other_participant(request.user)
-        unread_count = chat.messages.filter(sender=other_user, read=False).count()
-        total_unread += unread_count
-        last_message = chat.get_last_message()
-
-        chats_with_info.append(
-            {
-                "chat": chat,
-                "other_user": other_user,
-                "unread_count": unread_count,
-                "last_message": last_message,
-            }
-        )
+    # Последнее сообщение, непрочитанные и собеседник — без запросов на каждый чат
+    chats_with_info = inbox_items(request.user)
+    total_unread = sum(item["unread_count"] for item in chats_with_info)
 
     # Поиск друзей для нового чата (по имени, фамилии и нику)
     search_query = request.GET.get("search", "").strip()
     search_results = []
     if search_query:
-        # Ищем среди друзей - преобразуем union в список перед фильтрацией
-        sent_friends = User.objects.filter(
-            friendship_requests_received__from_user=request.user,
-            friendship_requests_received__accepted=True,
-        )
-        received_friends = User.objects.filter(
-            friendship_requests_sent__to_user=request.user,
-            friendship_requests_sent__accepted=True,
-        )
-        friends_list = list(sent_friends.union(received_friends))
-        friends_ids = [f.id for f in friends_list]
-        
+        # Ищем среди друзей
+        friends_ids = friends.friend_ids(request.user)
+
         # Теперь фильтруем по поисковому запросу (по имени, фамилии и нику)
-        search_results = User.objects.filter(
-            id__in=friends_ids
-        ).filter(
-            Q(username__icontains=search_query) |
-            Q(profile__first_name__icontains=search_query) |
-            Q(profile__last_name__icontains=search_query)
-        ).select_related("profile")[:10]
+        search_results = search.filter(
+            User.objects.filter(id__in=friends_ids).select_related("profile"),
+            search_query,
+        )[:10]
 
     return render(
         request,
@@ -893,16 +355,23 @@ def chat_detail(request, chat_id):
                 chat.save()  # Это обновит поле updated
                 return redirect("chat_detail", chat_id=chat.id)
 
-        # Получаем сообщения чата с оптимизацией
-        messages = chat.messages.select_related("sender").all()
+        # Только последние сообщения; более ранние подгружаются по курсору
+        chat_messages, has_more = history_page(chat, _int_param(request.GET, "before"))
 
-        # Помечаем сообщения как прочитанные
-        chat.messages.filter(sender=other_user, read=False).update(read=True)
+        # Отмечаем чат прочитанным до последнего сообщения (одна строка)
+        if chat_messages and not request.GET.get("before"):
+            mark_read(chat, request.user, chat_messages[-1].id)
 
         return render(
             request,
             "chat_detail.html",
-            {"chat": chat, "other_user": other_user, "messages": messages},
+            {
+                "chat": chat,
+                "other_user": other_user,
+                "messages": chat_messages,
+                "has_more": has_more,
+                "read_id": read_up_to(chat, request.user),
+            },
         )
 
     except Chat.DoesNotExist:
@@ -910,15 +379,95 @@ def chat_detail(request, chat_id):
         return redirect("chat")
 
 
+def _int_param(params, name):
+    """Целочисленный параметр запроса или None"""
+    try:
+        return int(params.get(name, ""))
+    except ValueError:
+        return None
+
+
+@login_required
+def chat_messages(request, chat_id):
+    """
+    JSON с сообщениями чата: ?before=<id> — более ранние,
+    ?after=<id> — новые (для обновления страницы без перезагрузки).
+    POST read=<id> сдвигает отметку прочтения.
+    """
+    chat = get_object_or_404(Chat, id=chat_id, participants=request.user)
+    if request.method == "POST":
+        # Отметка прочтения сообщения, полученного через поток событий
+        read = _int_param(request.POST, "read")
+        last_id = chat.messages.order_by("-id").values_list("id", flat=True).first()
+        if read and last_id:
+            mark_read(chat, request.user, min(read, last_id))
+        return JsonResponse({"success": True})
+
+    after = _int_param(request.GET, "after")
+    if after is not None:
+        rows = messages_after(chat, after)
+        has_more = False
+        # Новые сообщения собеседника пользователь видит сразу
+        if rows:
+            mark_read(chat, request.user, rows[-1].id)
+    else:
+        rows, has_more = history_page(chat, _int_param(request.GET, "before"))
+    read_id = read_up_to(chat, request.user)
+    return JsonResponse(
+        {
+            "messages": [message_dict(m, request.user, read_id) for m in rows],
+            "has_more": has_more,
+            "read_id": read_id,
+        }
+    )
+
+
+async def chat_stream(request, chat_id):
+    """
+    Поток событий чата (Server-Sent Events): новые сообщения и отметки
+    прочтения. Работает только под ASGI; под WSGI возвращает 204, и
+    страница переходит на опрос chat_messages.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    def is_participant():
+        user = request.user
+        return user.is_authenticated and Chat.objects.filter(
+            id=chat_id, participants=user
+        ).exists()
+
+    if not await sync_to_async(is_participant)():
+        return HttpResponse(status=403)
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + realtime.STREAM_MAX_AGE
+        yield "retry: 3000\n\n"
+        async for event in realtime.get_broker().listen(realtime.chat_channel(chat_id)):
+            if loop.time() > deadline:
+                break
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @login_required
 def start_chat(request, username):
     """Начать новый чат с пользователем по нику"""
     try:
-        # Ищем пользователя по нику (точное совпадение или частичное)
-        other_user = User.objects.filter(username__iexact=username).first()
+        # Ищем пользователя по нику: точное совпадение по индексу базы,
+        # иначе — по префиксу в индексе автодополнения
+        other_user = User.objects.filter(username=username).first()
         if not other_user:
-            # Если точного совпадения нет, ищем частичное
-            other_user = User.objects.filter(username__icontains=username).first()
+            user_id = autocomplete.find_user_id(username)
+            other_user = User.objects.filter(id=user_id).first() if user_id else None
 
         if not other_user:
             messages.error(request, f"Пользователь '{username}' не найден")
@@ -937,6 +486,69 @@ def start_chat(request, username):
         return redirect("chat")
 
 
+def serve_media(request, path, document_root=None):
+    """Медиафайлы для разработки; блобы кэшируются навсегда (их содержимое не меняется)"""
+    response = static_serve(request, path, document_root=document_root)
+    if is_blob(path):
+        response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+@login_required
+def autocomplete_view(request):
+    """Подсказки по префиксу (JSON): ?q=...&type=user|group&friends=1"""
+    query = request.GET.get("q", "").strip()
+    types = {t for t in request.GET.getlist("type") if t in ("user", "group")} or None
+    allowed = None
+    if request.GET.get("friends"):
+        # Только друзья (например, для нового чата)
+        friend_ids = friends.friend_ids(request.user)
+
+        def allowed(entry):
+            return entry.type != "user" or entry.id in friend_ids
+    entries = autocomplete.lookup(query, types=types, allowed=allowed) if query else []
+
+    results = []
+    for entry in entries:
+        if entry.type == "user":
+            url = reverse("user_profile", args=[entry.label])
+            chat_url = reverse("start_chat", args=[entry.label])
+        else:
+            url = reverse("group_detail", args=[entry.id])
+            chat_url = None
+        results.append({
+            "type": entry.type,
+            "id": entry.id,
+            "label": entry.label,
+            "detail": entry.detail,
+            "url": url,
+            "chat_url": chat_url,
+        })
+    return JsonResponse({"results": results})
+
+
+@login_required
+def interactions_view(request):
+    """
+    Лайки и комментарии пачкой (JSON, POST):
+    {"operations": [{"op": "like", "target": "group_post", "id": 5}, ...]}.
+    Возвращает только новые счётчики — см. main.interactions.
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Нужен POST"}, status=405)
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Некорректный JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"success": False, "error": "Некорректный JSON"}, status=400)
+    try:
+        results = interactions.apply(request.user, payload.get("operations"))
+    except interactions.InteractionError as exc:
+        return JsonResponse({"success": False, "error": str(exc)}, status=400)
+    return JsonResponse({"success": True, "results": results})
+
+
 @login_required
 def edit_profile(request):
     """Редактирование профиля"""
@@ -996,11 +608,7 @@ def friends_page(request):
                             from_user=request.user, to_user=friend_user, accepted=False
                         )
                         # Создаем уведомление о заявке в друзья
-                        Notification.objects.create(
-                            user=friend_user,
-                            notification_type="friend_request",
-                            from_user=request.user,
-                        )
+                        notify(friend_user, "friend_request", request.user)
             except User.DoesNotExist:
                 messages.error(request, "Пользователь не найден")
             return redirect("friends")
@@ -1015,11 +623,7 @@ def friends_page(request):
                 friendship.accepted = True
                 friendship.save()
                 # Создаем уведомление о принятии заявки
-                Notification.objects.create(
-                    user=friendship.from_user,
-                    notification_type="friend_accepted",
-                    from_user=request.user,
-                )
+                notify(friendship.from_user, "friend_accepted", request.user)
             except Friendship.DoesNotExist:
                 messages.error(request, "Заявка не найдена")
             return redirect("friends")
@@ -1039,16 +643,8 @@ def friends_page(request):
             return redirect("friends")
 
     # Получаем всех друзей
-    sent_friends = User.objects.filter(
-        friendship_requests_received__from_user=request.user,
-        friendship_requests_received__accepted=True,
-    ).select_related("profile")
-    received_friends = User.objects.filter(
-        friendship_requests_sent__to_user=request.user,
-        friendship_requests_sent__accepted=True,
-    ).select_related("profile")
-    friends_list = list(sent_friends.union(received_friends))
-    friends_ids = [f.id for f in friends_list]
+    friends_ids = friends.friend_ids(request.user)
+    friends_list = User.objects.filter(id__in=friends_ids).select_related("profile")
 
     # Получаем входящие заявки
     incoming_requests = Friendship.objects.filter(
@@ -1067,74 +663,43 @@ def friends_page(request):
     for req in outgoing_requests:
         pending_ids.add(req.to_user.id)
 
-    # Получаем возможных друзей на основе общих сообществ
-    from groups.models import GroupSubscription, Group
-
-    # Получаем ID сообществ, на которые подписан текущий пользователь
-    user_subscribed_groups = GroupSubscription.objects.filter(
-        user=request.user, is_subscribed=True
-    ).values_list("group_id", flat=True)
-
-    possible_friends = []
-    if user_subscribed_groups:
-        # Получаем пользователей, которые подписаны на те же сообщества
-        recommended_users = (
-            User.objects.filter(
-                group_subscriptions__group_id__in=user_subscribed_groups,
-                group_subscriptions__is_subscribed=True,
-            )
-            .exclude(id=request.user.id)
-            .exclude(id__in=friends_ids)
-            .exclude(id__in=pending_ids)
-            .annotate(
-                common_groups_count=Count(
-                    "group_subscriptions",
-                    filter=Q(
-                        group_subscriptions__group_id__in=user_subscribed_groups,
-                        group_subscriptions__is_subscribed=True,
-                    ),
-                )
-            )
-            .filter(common_groups_count__gt=0)
-            .select_related("profile")
-            .order_by("-common_groups_count", "-date_joined")[:20]
-        )
+    # Возможные друзья: предрассчитанные рекомендации (manage.py build_recommendations).
+    # Устаревшие пересчитываются в фоне, новые появятся при следующем открытии
+    from groups.models import Group
 
-        # Преобразуем в список с информацией о количестве общих сообществ и их названиях
-        for user in recommended_users:
-            # Получаем общие сообщества
-            user_groups = GroupSubscription.objects.filter(
-                user=user, is_subscribed=True, group_id__in=user_subscribed_groups
-            ).values_list("group_id", flat=True)
-            common_groups = Group.objects.filter(id__in=user_groups)
-
-            possible_friends.append(
-                {
-                    "user": user,
-                    "common_groups_count": user.common_groups_count,
-                    "common_groups": common_groups,
-                }
-            )
+    if request.user.profile.recommendations_dirty:
+        refresh_recommendations_later(request.user.id)
+
+    recommendations = list(
+        FriendRecommendation.objects.filter(user=request.user)
+        .exclude(candidate_id__in=friends_ids)
+        .exclude(candidate_id__in=pending_ids)
+        .select_related("candidate__profile")
+        .order_by("-score")[:20]
+    )
+    groups_by_id = Group.objects.in_bulk(
+        {group_id for rec in recommendations for group_id in rec.common_groups}
+    )
+    possible_friends = [
+        {
+            "user": rec.candidate,
+            "common_groups_count": len(rec.common_groups),
+            "mutual_friends_count": rec.mutual_friends_count,
+            "common_groups": [
+                groups_by_id[group_id] for group_id in rec.common_groups if group_id in groups_by_id
+            ],
+        }
+        for rec in recommendations
+    ]
 
     # Поиск пользователей (по имени, фамилии и нику)
     search_query = request.GET.get("search", "").strip()
     search_results = []
     if search_query:
-        search_results = (
-            User.objects.filter(
-                Q(username__icontains=search_query) |
-                Q(profile__first_name__icontains=search_query) |
-                Q(profile__last_name__icontains=search_query)
-            )
-            .exclude(id=request.user.id)
-            .distinct()
-            .select_related("profile")[:10]
-        )
-
-    # Получаем количество непрочитанных уведомлений
-    unread_notifications = Notification.objects.filter(
-        user=request.user, read=False
-    ).count()
+        search_results = search.filter(
+            User.objects.exclude(id=request.user.id).select_related("profile"),
+            search_query,
+        )[:10]
 
     return render(
         request,
@@ -1146,7 +711,6 @@ def friends_page(request):
             "possible_friends": possible_friends,
             "search_results": search_results,
             "search_query": search_query,
-            "unread_notifications": unread_notifications,
         },
     )
 
@@ -1154,15 +718,16 @@ def friends_page(request):
 @login_required
 def notifications(request):
     """Страница уведомлений"""
-    user_notifications = (
+    user_notifications = attach_actors(
         Notification.objects.filter(user=request.user)
-        .select_related("from_user", "post", "group_post")
-        .prefetch_related("from_user__friendship_requests_sent")
-        .order_by("-created")[:50]
+        .select_related("from_user__profile", "post", "group_post__group")
+        .order_by("-updated")[:50]
     )
 
-    # Помечаем уведомления как прочитанные
-    Notification.objects.filter(user=request.user, read=False).update(read=True)
+    # Помечаем уведомления как прочитанные и обнуляем счётчик
+    with transaction.atomic():
+        Notification.objects.filter(user=request.user, read=False).update(read=True)
+        Profile.objects.filter(user=request.user).update(unread_notifications_count=0)
 
     return render(request, "notifications.html", {"notifications": user_notifications})
 
@@ -1180,9 +745,7 @@ def communities(request):
     # Поиск
     search_query = request.GET.get("search", "").strip()
     if search_query:
-        communities_list = communities_list.filter(
-            Q(name__icontains=search_query) | Q(description__icontains=search_query)
-        )
+        communities_list = search.filter(communities_list, search_query)
 
     return render(
         request,